@@ -11,22 +11,57 @@ class SynapseV4Engine:
     Synapse V4: Spectral Hardening Engine.
     Uses Walsh-Hadamard Transforms (WHT) to spread data across neural blocks.
     """
-    def __init__(self, passkey: str):
+    def __init__(self, passkey: str, block_size: int = 8, bits_per_block: int = 1):
+        """
+        block_size: weights per block (a power of 2 for WHT).
+        bits_per_block: payload bits per block, one per low-order
+                        coefficient (the DC coefficient first).
+        """
+        if block_size < 1 or block_size & (block_size - 1):
+            raise ValueError(f"block_size must be a power of 2, got {block_size}")
+        if not 1 <= bits_per_block <= block_size:
+            raise ValueError(f"bits_per_block must be between 1 and block_size ({block_size})")
         self.passkey = passkey
         self.seed = int.from_bytes(hashlib.sha256(passkey.encode()).digest()[:4], 'little')
-        self.block_size = 8 # Power of 2 for WHT
+        self.block_size = block_size
+        self.bits_per_block = bits_per_block
 
     def _fwht(self, a):
-        """Fast Walsh-Hadamard Transform."""
-        n = len(a)
-        if n == 1:
-            return a
-        a_left = self._fwht(a[0:n//2])
-        a_right = self._fwht(a[n//2:n])
-        res = np.zeros(n)
-        res[0:n//2] = a_left + a_right
-        res[n//2:n] = a_left - a_right
-        return res
+        """
+        Fast Walsh-Hadamard Transform along the last axis, for a whole
+        (n_blocks, block_size) batch at once. The first levels (strides
+        below 16) are one product with a small Hadamard matrix; the rest
+        are iterative in-place butterflies.
+        """
+        a = np.array(a, dtype=np.float64)
+        shape = a.shape
+        n = shape[-1]
+        lo = min(n, 16)
+        a = (a.reshape(-1, lo) @ self._hadamard(lo)).reshape(shape)
+        h = lo
+        while h < n:
+            pairs = a.reshape(-1, n // (2 * h), 2, h)
+            left = pairs[:, :, 0, :].copy()
+            right = pairs[:, :, 1, :]
+            pairs[:, :, 0, :] += right
+            pairs[:, :, 1, :] = left - right
+            h *= 2
+        return a
+
+    @staticmethod
+    def _hadamard(n):
+        """Natural-order (Sylvester) Hadamard matrix of size n."""
+        h = np.ones((1, 1))
+        while len(h) < n:
+            h = np.block([[h, h], [h, -h]])
+        return h
+
+    def _bits(self, protected_payload):
+        """Payload bits LSB-first, zero-padded to whole blocks, as (n_blocks, bits_per_block)."""
+        bits = np.unpackbits(np.frombuffer(protected_payload, dtype=np.uint8), bitorder='little')
+        num_blocks = -(-len(bits) // self.bits_per_block)
+        bits = np.pad(bits, (0, num_blocks * self.bits_per_block - len(bits)))
+        return bits.reshape(num_blocks, self.bits_per_block)
 
     def forge_spectral(self, payload_data, mask_name):
         """Hides data in the frequency domain of neural blocks."""
@@ -38,55 +73,67 @@ class SynapseV4Engine:
         checksum = zlib.crc32(raw_data) & 0xffffffff
         protected_payload = raw_data + struct.pack('<I', checksum)
         
-        bits = []
-        for byte in protected_payload:
-            for i in range(8):
-                bits.append((byte >> i) & 1)
-        
-        # We spread 1 bit over 1 block (8 weights)
+        # We spread bits_per_block bits over each block of block_size weights
+        bits = self._bits(protected_payload)
         num_blocks = len(bits)
         num_weights = num_blocks * self.block_size
         
         random.seed(self.seed)
         weights = np.random.uniform(-0.05, 0.05, num_weights)
         
-        # Spectral Spreading
-        for b in range(num_blocks):
-            block = weights[b*self.block_size : (b+1)*self.block_size]
-            # Transform to frequency domain
-            coeffs = self._fwht(block)
-            
-            # Target the DC component (first coefficient) for maximum robustness
-            # Adjust the parity of the frequency coefficient
-            target_val = int(coeffs[0] * 1000) # Scale for stability
-            if (target_val & 1) != bits[b]:
-                target_val += 1 if bits[b] == 1 else -1
-            
-            coeffs[0] = target_val / 1000
-            
-            # Inverse Transform (FWHT is its own inverse, just scale)
-            weights[b*self.block_size : (b+1)*self.block_size] = self._fwht(coeffs) / self.block_size
+        # Spectral Spreading: transform every block to the frequency domain at once
+        coeffs = self._fwht(weights.reshape(num_blocks, self.block_size))
+        
+        # Adjust the parity of the lowest-order coefficients (DC first, the most robust)
+        target_val = np.trunc(coeffs[:, :self.bits_per_block] * 1000).astype(np.int64) # Scale for stability
+        target_val += np.where((target_val & 1) != bits, np.where(bits == 1, 1, -1), 0)
+        coeffs[:, :self.bits_per_block] = target_val / 1000
+        
+        # Inverse Transform (FWHT is its own inverse, just scale)
+        weights = (self._fwht(coeffs) / self.block_size).reshape(-1)
             
         return weights, len(raw_data), len(protected_payload)
 
     def unmask_spectral(self, weights, orig_size, total_size):
         """Extracts data from the frequency domain."""
-        num_blocks = total_size * 8
-        bits = []
+        num_bits = total_size * 8
+        num_blocks = -(-num_bits // self.bits_per_block)
         
-        for b in range(num_blocks):
-            block = weights[b*self.block_size : (b+1)*self.block_size]
-            coeffs = self._fwht(block)
-            
-            # Read parity of the DC frequency coefficient
-            target_val = int(round(coeffs[0] * 1000))
-            bits.append(target_val & 1)
-            
-        buffer = bytearray()
-        for i in range(0, len(bits), 8):
-            byte = 0
-            for j in range(8):
-                if bits[i+j]: byte |= (1 << j)
-            buffer.append(byte)
+        blocks = np.asarray(weights[:num_blocks * self.block_size], dtype=np.float64)
+        coeffs = self._fwht(blocks.reshape(num_blocks, self.block_size))[:, :self.bits_per_block]
+        
+        # Read parity of the low-order frequency coefficients
+        bits = (np.rint(coeffs * 1000).astype(np.int64) & 1).astype(np.uint8).reshape(-1)[:num_bits]
+        buffer = bytearray(np.packbits(bits, bitorder='little').tobytes())
             
         return buffer[:orig_size]
+
+    def save_spectral(self, weights, orig_size, total_size, mask_name):
+        """
+        Writes forge_spectral() output as a .safetensors mask.
+        The format tag lets extraction pick the spectral decoder directly.
+        """
+        weight_data = np.asarray(weights, dtype='<f4').tobytes()
+        header = json.dumps({
+            "__metadata__": {
+                "type": "synapse_v4_spectral",
+                "synapse.format": "spectral/4", # Decoder tag (synapse/engine/formats.py)
+                "payload_bytes": str(orig_size),
+                "total_bytes": str(total_size),
+                "block_size": str(self.block_size),
+                "bits_per_block": str(self.bits_per_block)
+            },
+            "stealth_weights": {
+                "dtype": "F32",
+                "shape": [len(weights)],
+                "data_offsets": [0, len(weight_data)]
+            }
+        }).encode('utf-8')
+        header += b' ' * ((8 - (len(header) % 8)) % 8)
+
+        filename = f"synapse_{mask_name.lower().replace(' ', '_')}.safetensors"
+        with open(filename, "wb") as f:
+            f.write(struct.pack('<Q', len(header)))
+            f.write(header)
+            f.write(weight_data)
+        return filename
@@ -3,6 +3,9 @@ import torch
 from typing import List, Tuple
 import hashlib
 
+# Decoder tag (synapse/engine/formats.py) for .safetensors files holding hide() output
+FORMAT_TAG = "lsb-1e7/1"
+
 class SynapseInjector:
     def __init__(self, seed: str):
         self.seed = seed
@@ -73,6 +76,13 @@ class SynapseInjector:
 
         return torch.tensor(modified_weights).view(weights.shape)
 
+    def format_metadata(self, data: bytes) -> dict:
+        """
+        Safetensors __metadata__ for a file whose only tensor is hide(weights, data):
+        the format tag plus the payload size extract() needs.
+        """
+        return {"synapse.format": FORMAT_TAG, "payload_bytes": str(len(data))}
+
     def extract(self, weights: torch.Tensor, num_bytes: int) -> bytes:
         """
         Extracts hidden bits from the LSB of the weights.
@@ -7,9 +7,12 @@ Commands:
     synapse train    Train a LoRA on your documents
     synapse inject   Hide data inside a LoRA
     synapse extract  Pull hidden data back out
+    synapse update   Rewrite changed segments of a segmented payload
     synapse serve    Start the API server + dashboard
     synapse forge    Create a blank carrier LoRA for testing
     synapse verify   Test the inject → extract round-trip
+    synapse inspect  Show a carrier's tensors and capacity (header only)
+    synapse bench    Benchmark inject/extract throughput (JSON lines)
 """
 
 import argparse
@@ -41,32 +44,119 @@ def cmd_train(args):
     )
 
 
+def _one_or_many(paths):
+    """argparse nargs="+" value → a single path, or the list for a sharded payload."""
+    if paths is None or len(paths) != 1:
+        return paths
+    return paths[0]
+
+
 def cmd_inject(args):
     from synapse import Synapse
     app = Synapse(backend="openai", model="mock")
+    if args.output and len(args.output) != len(args.lora):
+        print(f"✗ Got {len(args.lora)} --lora but {len(args.output)} --output; pass one output per carrier.")
+        sys.exit(1)
+    lora, output = _one_or_many(args.lora), _one_or_many(args.output)
+    if isinstance(lora, list) and (args.segmented or len(args.data) > 1):
+        print("✗ Several --lora files shard a single --data payload.")
+        sys.exit(1)
+    if args.segmented:
+        # One key, every --data file (or directory's files) its own segment
+        if len(args.key) != 1:
+            print("✗ --segmented takes exactly one --key.")
+            sys.exit(1)
+        app.inject_segments(
+            app.segment_paths(args.data),
+            key=args.key[0],
+            lora=lora,
+            output=output,
+            compression=args.compress,
+            ecc=args.ecc,
+            embedding=args.embedding,
+            tensors=args.tensors,
+            in_place=args.in_place,
+        )
+        return
+    if len(args.data) != len(args.key):
+        print(f"✗ Got {len(args.data)} --data but {len(args.key)} --key; pass one key per payload.")
+        sys.exit(1)
+    if len(args.data) > 1:
+        # Multi-payload mode: one load and one save for all (data, key) pairs
+        app.inject_many(
+            list(zip(args.data, args.key)),
+            lora=lora,
+            output=output,
+            compression=args.compress,
+            ecc=args.ecc,
+            embedding=args.embedding,
+            tensors=args.tensors,
+            in_place=args.in_place,
+        )
+        return
     app.inject(
-        data=args.data,
-        key=args.key,
-        lora=args.lora,
-        output=args.output,
+        data=args.data[0],
+        key=args.key[0],
+        lora=lora,
+        output=output,
+        compression=args.compress,
+        shared=args.shared,
+        ecc=args.ecc,
+        embedding=args.embedding,
+        tensors=args.tensors,
+        in_place=args.in_place,
     )
 
 
+def cmd_update(args):
+    from synapse import Synapse
+    app = Synapse(backend="openai", model="mock")
+    changes = dict(app.segment_paths(args.data or []))
+    changes.update(dict.fromkeys(args.delete or []))
+    if not changes:
+        print("✗ Nothing to update: pass --data and/or --delete.")
+        sys.exit(1)
+    try:
+        app.update(
+            changes,
+            key=args.key,
+            lora=args.lora,
+            output=args.output,
+            compression=args.compress,
+            ecc=args.ecc,
+            embedding=args.embedding,
+            in_place=args.in_place,
+        )
+    except ValueError as e:
+        print(f"✗ Failed: {e}")
+        sys.exit(1)
+
+
 def cmd_extract(args):
+    import codecs
     from synapse import Synapse
     app = Synapse(backend="openai", model="mock")
+    out = open(args.output, "wb") if args.output else None
     try:
-        data = app.extract(key=args.key, lora=args.lora)
-        text = data.decode("utf-8", errors="ignore").strip("\x00")
-        print(f"\n✓ Extracted ({len(data)} bytes):\n")
-        print(text)
-        if args.output:
-            from pathlib import Path
-            Path(args.output).write_bytes(data)
-            print(f"\nSaved to: {args.output}")
+        # Stream: print and save each block as soon as it is decrypted
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+        total = 0
+        for block in app.iter_extract(key=args.key, lora=_one_or_many(args.lora), workers=args.workers):
+            if total == 0:
+                print(f"\n✓ Extracting:\n")
+            total += len(block)
+            sys.stdout.write(decoder.decode(block).strip("\x00"))
+            if out:
+                out.write(block)
+        print(f"\n\n✓ Extracted {total} bytes.")
+        if out:
+            print(f"Saved to: {args.output}")
     except Exception as e:
         print(f"\n✗ Failed: {e}")
         sys.exit(1)
+    finally:
+        if out:
+            out.close()
 
 
 def cmd_serve(args):
@@ -99,14 +189,20 @@ def cmd_forge(args):
     from pathlib import Path
 
     n = args.size * 1000
-    try:
-        import torch
-        weights = torch.randn(n)
-        torch.save(weights, args.output)
-    except ImportError:
-        weights = [random.gauss(0, 0.02) for _ in range(n)]
-        raw = struct.pack(f"{n}f", *weights)
-        Path(args.output).write_bytes(raw)
+    if args.output.endswith(".safetensors"):
+        import numpy as np
+        from synapse.engine.safetensors_io import save_file
+        weights = np.random.default_rng().normal(0, 0.02, n).astype(np.float32)
+        save_file({"weights": weights}, args.output)
+    else:
+        try:
+            import torch
+            weights = torch.randn(n)
+            torch.save(weights, args.output)
+        except ImportError:
+            weights = [random.gauss(0, 0.02) for _ in range(n)]
+            raw = struct.pack(f"{n}f", *weights)
+            Path(args.output).write_bytes(raw)
 
     from synapse.engine.injector import SynapseInjector
     size    = Path(args.output).stat().st_size
@@ -156,6 +252,47 @@ def cmd_verify(args):
         sys.exit(1)
 
 
+def cmd_inspect(args):
+    """Report tensors and stego capacity from the carrier's header alone."""
+    import json
+    from synapse.engine.planner import format_report, inspect_carrier
+
+    try:
+        info = inspect_carrier(args.lora)
+    except Exception as e:
+        print(f"✗ Failed: {e}")
+        sys.exit(1)
+    if args.json:
+        print(json.dumps(info, indent=2, default=str))
+    else:
+        print(format_report(info, max_tensors=None if args.all else 20))
+
+
+def cmd_bench(args):
+    """Benchmark inject/extract; one JSON line per case."""
+    import json
+    from synapse.engine import bench
+
+    options = {k: v for k, v in (("ecc", args.ecc), ("embedding", args.embedding)) if v}
+    out = open(args.output, "w") if args.output else None
+    try:
+        for result in bench.run(
+            sizes=[int(s) for s in args.sizes.split(",")],
+            payloads=[int(p) for p in args.payloads.split(",")],
+            formats=args.formats.split(","),
+            workdir=args.workdir,
+            **options,
+        ):
+            line = json.dumps(result)
+            print(line, flush=True)
+            if out:
+                out.write(line + "\n")
+                out.flush()
+    finally:
+        if out:
+            out.close()
+
+
 # ------------------------------------------------------------------
 # Main
 # ------------------------------------------------------------------
@@ -170,6 +307,9 @@ Examples:
   synapse forge  --size 100 --output carrier.lora
   synapse inject --lora carrier.lora --data ./secrets.md --key mypassword
   synapse verify
+  synapse inject --lora a.safetensors b.safetensors --data ./big.md --key mypassword
+  synapse inspect --lora carrier.safetensors
+  synapse bench  --sizes 10000,1000000,100000000 --output bench.jsonl
   synapse serve  --backend ollama --model llama3 --lora carrier.lora --key mypassword
   synapse serve  --backend openai --model gpt-4o --api-key sk-... --lora carrier.lora
   synapse train  --data ./docs/ --output trained.lora --mode fast
@@ -205,16 +345,60 @@ Examples:
 
     # ── inject ─────────────────────────────────────────────────────────
     p = sub.add_parser("inject", help="Hide data inside a LoRA file")
+    p.add_argument("--lora",   required=True, nargs="+",
+                   help="Path to LoRA file (several files shard one payload across them)")
+    p.add_argument("--data",   required=True, action="append",
+                   help="File path or string to hide (repeat with --key for several payloads)")
+    p.add_argument("--key",    required=True, action="append",
+                   help="Secret key (one per --data, in the same order)")
+    p.add_argument("--output", nargs="+",
+                   help="Output path, one per --lora file (default: overwrite input)")
+    p.add_argument("--compress", default="zlib",
+                   choices=["zlib", "lzma", "bz2", "zstd", "none"],
+                   help="Compress the payload before encryption (default: zlib)")
+    p.add_argument("--ecc", default="rs", choices=["rs", "rep3", "none"],
+                   help="Error correction: Reed-Solomon (default), 3x repetition, or none")
+    p.add_argument("--embedding", default="scale", choices=["scale", "mantissa"],
+                   help="Bit embedding: quantized parity (default) or raw mantissa LSB "
+                        "(always used for fp16/bf16 carriers)")
+    p.add_argument("--shared", action="store_true",
+                   help="Share the carrier: keep other keys' payloads intact "
+                        "(implied with several --data/--key pairs)")
+    p.add_argument("--segmented", action="store_true",
+                   help="Store each --data file (or each file of a --data directory) as its own "
+                        "segment, so it can later be changed with 'synapse update'")
+    p.add_argument("--tensors", default=None,
+                   help="Only use tensors matching these comma-separated globs, e.g. '*lora_B*' "
+                        "(recorded in the file; extraction needs no flag)")
+    p.add_argument("--in-place", dest="in_place", action="store_true",
+                   help="Patch the input file directly when it is also the output: only the "
+                        "touched weights are written (default: patch a copy, then rename)")
+
+    # ── update ─────────────────────────────────────────────────────────
+    p = sub.add_parser("update", help="Rewrite changed segments of a segmented payload")
     p.add_argument("--lora",   required=True, help="Path to LoRA file")
-    p.add_argument("--data",   required=True, help="File path or string to hide")
     p.add_argument("--key",    required=True, help="Secret key")
+    p.add_argument("--data",   action="append",
+                   help="Changed or new file (or directory of files); segments are named as with "
+                        "'inject --segmented'")
+    p.add_argument("--delete", action="append", help="Name of a segment to remove")
     p.add_argument("--output", help="Output path (default: overwrite input)")
+    p.add_argument("--compress", default="zlib",
+                   choices=["zlib", "lzma", "bz2", "zstd", "none"])
+    p.add_argument("--ecc", default="rs", choices=["rs", "rep3", "none"])
+    p.add_argument("--embedding", default="scale", choices=["scale", "mantissa"])
+    p.add_argument("--in-place", dest="in_place", action="store_true",
+                   help="Patch the input file directly (not crash-safe; default: patch a copy, then rename)")
 
     # ── extract ────────────────────────────────────────────────────────
     p = sub.add_parser("extract", help="Extract hidden data from a LoRA")
-    p.add_argument("--lora",   required=True, help="Path to LoRA file")
+    p.add_argument("--lora",   required=True, nargs="+",
+                   help="Path to LoRA file, or every file of a sharded payload (any order)")
     p.add_argument("--key",    required=True, help="Secret key")
     p.add_argument("--output", help="Save extracted data to file")
+    p.add_argument("--workers", type=int, default=None,
+                   help="Decode with N processes, 0 = one per CPU (.safetensors/raw carriers; "
+                        "default 1, or one per file for a sharded payload)")
 
     # ── serve ──────────────────────────────────────────────────────────
     p = sub.add_parser("serve", help="Start the API server + dashboard")
@@ -234,22 +418,45 @@ Examples:
     p = sub.add_parser("forge", help="Create a blank carrier LoRA for testing")
     p.add_argument("--size",   type=int, default=50,
                    help="Size in K weights (default: 50)")
-    p.add_argument("--output", default="carrier.lora")
+    p.add_argument("--output", default="carrier.lora",
+                   help="Output path (.safetensors writes a memory-mappable carrier)")
 
     # ── verify ─────────────────────────────────────────────────────────
     p = sub.add_parser("verify", help="Test inject → extract round-trip")
     p.add_argument("--key",     default=None)
     p.add_argument("--message", default=None)
 
+    # ── inspect ────────────────────────────────────────────────────────
+    p = sub.add_parser("inspect", help="Show a carrier's tensors and capacity (header only)")
+    p.add_argument("--lora", required=True, help="Path to LoRA file")
+    p.add_argument("--json", action="store_true", help="Print the full report as JSON")
+    p.add_argument("--all",  action="store_true", help="List every tensor (default: first 20)")
+
+    # ── bench ──────────────────────────────────────────────────────────
+    p = sub.add_parser("bench", help="Benchmark inject/extract (JSON lines)")
+    p.add_argument("--sizes",    default="10000,1000000,10000000",
+                   help="Carrier sizes in weights, comma-separated (up to 1e9)")
+    p.add_argument("--payloads", default="1024,65536,1048576",
+                   help="Payload sizes in bytes, comma-separated")
+    p.add_argument("--formats",  default="raw,safetensors,pt",
+                   help="Carrier formats: raw, safetensors, pt")
+    p.add_argument("--ecc",       default=None, choices=["rs", "rep3", "none"])
+    p.add_argument("--embedding", default=None, choices=["scale", "mantissa"])
+    p.add_argument("--workdir",  default=None, help="Where to write temporary carriers")
+    p.add_argument("--output",   default=None, help="Also append results to this file")
+
     # ── Dispatch ───────────────────────────────────────────────────────
     args = parser.parse_args()
     {
         "train":   cmd_train,
         "inject":  cmd_inject,
         "extract": cmd_extract,
+        "update":  cmd_update,
         "serve":   cmd_serve,
         "forge":   cmd_forge,
         "verify":  cmd_verify,
+        "inspect": cmd_inspect,
+        "bench":   cmd_bench,
     }[args.command](args)
 
 
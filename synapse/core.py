@@ -4,8 +4,9 @@ The main Synapse class - the public API that everything flows through.
 """
 
 from __future__ import annotations
+import codecs
 import os
-from typing import Optional, Union
+from typing import Iterator, Optional, Union
 from pathlib import Path
 
 
@@ -141,17 +142,99 @@ class Synapse:
         self,
         data: Union[str, Path],
         key: str,
-        lora: Optional[str] = None,
-        output: Optional[str] = None,
-    ) -> str:
+        lora: Optional[Union[str, list[str]]] = None,
+        output: Optional[Union[str, list[str]]] = None,
+        compression: str = "zlib",
+        shared: bool = False,
+        ecc: str = "rs",
+        embedding: str = "scale",
+        tensors: Optional[str] = None,
+        in_place: bool = False,
+    ) -> Union[str, list[str]]:
         """
         Hide data inside a LoRA file.
 
         Args:
             data: Path to a file OR a raw string to hide.
             key: The secret key used for PRNG mapping + encryption.
+            lora: Path to the carrier LoRA file. Uses self.lora_path if not given.
+                  A list of paths shards the payload across those files
+                  (see synapse/engine/shards.py); extract()/unlock() then
+                  take the same list.
+            output: Where to save the modified LoRA (one path per carrier
+                    when sharding). Defaults to overwriting input.
+            compression: "zlib" | "lzma" | "bz2" | "zstd" | "none". Recorded in
+                         the payload header, so extraction needs no flag.
+            shared: Store the payload in this key's own slice of a shared
+                    carrier, so other keys' payloads in the same file survive.
+            ecc: Error correction for the payload: "rs" (Reed-Solomon, default),
+                 "rep3" (3x repetition) or "none". Recorded in the header.
+            embedding: "scale" (default) or "mantissa" — write bits straight into
+                       each weight's lowest mantissa bit (1 ulp, any float dtype).
+                       fp16/bf16 carriers always use "mantissa".
+            tensors: Only use tensors matching these comma-separated globs
+                     (e.g. "*lora_B*"). Recorded in the carrier's metadata,
+                     so extraction reads just those tensors.
+            in_place: When output is the input, patch the file directly: only
+                      the touched weights are written. By default a clone is
+                      patched and renamed over the output, which costs a full
+                      copy on filesystems without reflinks.
+
+        Returns:
+            Path to the output file (the list of paths when sharding).
+        """
+        from synapse.engine.injector import SynapseInjector
+
+        lora_path = lora or self.lora_path
+        if not lora_path:
+            raise ValueError("No LoRA path specified. Pass lora= or set it on Synapse().")
+
+        if isinstance(lora_path, (list, tuple)):
+            from synapse.engine.shards import inject_sharded
+            if shared or tensors:
+                raise ValueError("Sharded payloads support neither shared carriers nor tensor selection.")
+            output_paths = [output] if isinstance(output, str) else list(output or lora_path)
+            inject_sharded(
+                key, list(lora_path), self._read_payload(data), output_paths,
+                compression=compression, ecc=ecc, embedding=embedding,
+            )
+            print(f"[synapse] ✓ Payload sharded across {len(output_paths)} files")
+            return output_paths
+
+        injector = SynapseInjector(key, compression=compression, ecc=ecc, embedding=embedding)
+        output_path = output or lora_path
+        injector.inject_file(
+            lora_path, self._read_payload(data), output_path,
+            in_place=in_place, shared=shared, tensors=tensors,
+        )
+
+        print(f"[synapse] ✓ Payload hidden in {output_path}")
+        return output_path
+
+    def inject_many(
+        self,
+        jobs: list[tuple[Union[str, Path], str]],
+        lora: Optional[str] = None,
+        output: Optional[str] = None,
+        compression: str = "zlib",
+        ecc: str = "rs",
+        embedding: str = "scale",
+        tensors: Optional[str] = None,
+        in_place: bool = False,
+    ) -> str:
+        """
+        Hide several payloads, each under its own key, with a single load
+        and save of the LoRA file. The result is a shared carrier.
+
+        Args:
+            jobs: (data, key) pairs; data is a file path or raw string as in inject().
             lora: Path to the carrier LoRA file. Uses self.lora_path if not given.
             output: Where to save the modified LoRA. Defaults to overwriting input.
+            compression: Codec applied to every payload (see inject()).
+            ecc: Error correction for every payload (see inject()).
+            embedding: Bit embedding for every payload (see inject()).
+            tensors: Tensor selection policy for the carrier (see inject()).
+            in_place: Patch the carrier directly (see inject()).
 
         Returns:
             Path to the output file.
@@ -162,27 +245,151 @@ class Synapse:
         if not lora_path:
             raise ValueError("No LoRA path specified. Pass lora= or set it on Synapse().")
 
-        # Resolve payload bytes
-        data_path = Path(data) if isinstance(data, str) else data
-        if data_path.exists():
-            payload = data_path.read_bytes()
-        else:
-            payload = str(data).encode("utf-8")
+        output_path = output or lora_path
+        SynapseInjector.inject_many(
+            lora_path,
+            [(key, self._read_payload(data)) for data, key in jobs],
+            output_path,
+            in_place=in_place,
+            tensors=tensors,
+            compression=compression,
+            ecc=ecc,
+            embedding=embedding,
+        )
 
-        injector = SynapseInjector(key)
+        print(f"[synapse] ✓ {len(jobs)} payloads hidden in {output_path}")
+        return output_path
+
+    def inject_segments(
+        self,
+        segments: dict[str, Union[str, Path]],
+        key: str,
+        lora: Optional[str] = None,
+        output: Optional[str] = None,
+        compression: str = "zlib",
+        ecc: str = "rs",
+        embedding: str = "scale",
+        tensors: Optional[str] = None,
+        in_place: bool = False,
+    ) -> str:
+        """
+        Hide a knowledge base as separately versioned segments, so later
+        changes can be applied with update() instead of a full re-inject.
+        extract()/unlock() return the segments joined in order.
+
+        Args:
+            segments: {name: data}; data is a file path or raw string as in
+                      inject(). segment_paths() builds this from files/dirs.
+            key, lora, output, compression, ecc, embedding, tensors, in_place: as in inject().
+
+        Returns:
+            Path to the output file.
+        """
+        from synapse.engine.injector import SynapseInjector
+
+        lora_path = lora or self.lora_path
+        if not lora_path:
+            raise ValueError("No LoRA path specified. Pass lora= or set it on Synapse().")
+
+        injector = SynapseInjector(key, compression=compression, ecc=ecc, embedding=embedding)
         output_path = output or lora_path
-        injector.inject_file(lora_path, payload, output_path)
+        injector.inject_segments(
+            lora_path, {name: self._read_payload(data) for name, data in segments.items()},
+            output_path, in_place=in_place, tensors=tensors,
+        )
 
-        print(f"[synapse] ✓ Payload hidden in {output_path}")
+        print(f"[synapse] ✓ {len(segments)} segments hidden in {output_path}")
+        return output_path
+
+    def update(
+        self,
+        changes: dict[str, Optional[Union[str, Path]]],
+        key: str,
+        lora: Optional[str] = None,
+        output: Optional[str] = None,
+        compression: str = "zlib",
+        ecc: str = "rs",
+        embedding: str = "scale",
+        in_place: bool = False,
+    ) -> str:
+        """
+        Change some segments of a segmented payload. Only their slots (and
+        the manifest) are rewritten, so the cost follows the change, not
+        the knowledge base.
+
+        Args:
+            changes: {name: data} writes a new version of each named segment
+                     (or adds it); {name: None} deletes it.
+            key, lora, output: as in inject().
+            compression, ecc, embedding: settings for the rewritten segments.
+            in_place: Patch the file directly, as in inject(). Segments are
+                      written before the manifest, so a crash part way
+                      leaves a manifest pointing at half-written segments;
+                      by default the update is written to a clone that is
+                      renamed over the output only once it is complete.
+
+        Returns:
+            Path to the output file.
+        """
+        from synapse.engine.injector import SynapseInjector
+
+        lora_path = lora or self.lora_path
+        if not lora_path:
+            raise ValueError("No LoRA path specified. Pass lora= or set it on Synapse().")
+
+        injector = SynapseInjector(key, compression=compression, ecc=ecc, embedding=embedding)
+        output_path = output or lora_path
+        injector.update_segments(
+            lora_path,
+            {name: None if data is None else self._read_payload(data) for name, data in changes.items()},
+            output_path,
+            in_place=in_place,
+        )
+
+        print(f"[synapse] ✓ {len(changes)} segments updated in {output_path}")
         return output_path
 
-    def extract(self, key: str, lora: Optional[str] = None) -> bytes:
+    @staticmethod
+    def segment_paths(paths: list[Union[str, Path]]) -> dict[str, Path]:
+        """
+        Segments for a list of files and directories: a file is named by
+        its file name, each file under a directory by its path relative to
+        that directory.
+        """
+        segments = {}
+        for path in map(Path, paths):
+            if path.is_dir():
+                for file in sorted(p for p in path.rglob("*") if p.is_file()):
+                    segments[file.relative_to(path).as_posix()] = file
+            else:
+                segments[path.name] = path
+        return segments
+
+    @staticmethod
+    def _read_payload(data: Union[str, Path]) -> bytes:
+        """Payload bytes: the file's contents if data is a path, else the string itself."""
+        data_path = Path(data) if isinstance(data, str) else data
+        if data_path.exists():
+            return data_path.read_bytes()
+        return str(data).encode("utf-8")
+
+    def extract(
+        self, key: str, lora: Optional[Union[str, list[str]]] = None, workers: Optional[int] = None,
+        legacy: bool = True,
+    ) -> bytes:
         """
         Extract hidden payload from a LoRA file.
 
         Args:
             key: The secret key.
-            lora: Path to the LoRA file.
+            lora: Path to the LoRA file, or the list of files of a sharded
+                  payload (in any order; decoded one process per file).
+                  Masks tagged by another encoder (see
+                  synapse/engine/formats.py) go to that format's decoder.
+            workers: Decoding processes for .safetensors/raw carriers (0 = one per CPU).
+                     Default 1, or for sharded files one per file, up to the CPU count.
+            legacy: Also try the v1 layout if no versioned header matches.
+                    That costs a full shuffle of the carrier per wrong key.
 
         Returns:
             Raw bytes of the hidden payload.
@@ -193,32 +400,138 @@ class Synapse:
         if not lora_path:
             raise ValueError("No LoRA path specified.")
 
-        injector = SynapseInjector(key)
-        return injector.extract_file(lora_path)
+        from synapse.engine.parallel import resolve_workers
+
+        if isinstance(lora_path, (list, tuple)):
+            from synapse.engine.shards import extract_sharded
+            return extract_sharded(key, list(lora_path), workers=0 if workers is None else workers)
+
+        from synapse.engine.formats import decode_file, detect_format
+
+        if detect_format(lora_path) is not None:
+            # Written by another encoder (hardened mask, spectral, ...): its tag names the decoder
+            return decode_file(lora_path, key)
+
+        injector = SynapseInjector(key, legacy=legacy)
+        return injector.extract_file(lora_path, workers=resolve_workers(workers))
+
+    def extract_many(self, keys: list[str], lora: Optional[str] = None, workers: int = 1) -> dict[str, bytes]:
+        """
+        Extract the payloads of several keys with a single load of the LoRA file.
+
+        Args:
+            keys: The secret keys.
+            lora: Path to the LoRA file.
+            workers: Decoding processes for .safetensors/raw carriers (0 = one per CPU).
+
+        Returns:
+            {key: raw payload bytes}
+        """
+        from synapse.engine.injector import SynapseInjector
+        from synapse.engine.parallel import resolve_workers
+
+        lora_path = lora or self.lora_path
+        if not lora_path:
+            raise ValueError("No LoRA path specified.")
+
+        return SynapseInjector.extract_many(lora_path, keys, workers=resolve_workers(workers))
+
+    def iter_extract(
+        self,
+        key: str,
+        lora: Optional[Union[str, list[str]]] = None,
+        chunk_bytes: int = 1 << 20,
+        workers: Optional[int] = None,
+        legacy: bool = True,
+    ) -> Iterator[bytes]:
+        """
+        Stream the hidden payload out of a LoRA file.
+
+        Args:
+            key: The secret key.
+            lora: Path to the LoRA file, or the files of a sharded payload.
+            chunk_bytes: Size of each yielded block.
+            workers: Decoding processes for .safetensors/raw carriers (0 = one per CPU).
+                     Default 1, or for sharded files one per file, up to the CPU count.
+            legacy: Also try the v1 layout if no versioned header matches.
+                    That costs a full shuffle of the carrier per wrong key.
+
+        Yields:
+            Decrypted payload blocks, in order, as they are decoded.
+        """
+        from synapse.engine.injector import SynapseInjector
+
+        lora_path = lora or self.lora_path
+        if not lora_path:
+            raise ValueError("No LoRA path specified.")
+
+        from synapse.engine.parallel import resolve_workers
 
-    def unlock(self, key: str, lora: Optional[str] = None):
+        if isinstance(lora_path, (list, tuple)):
+            from synapse.engine.shards import iter_extract_sharded
+            yield from iter_extract_sharded(key, list(lora_path), workers=0 if workers is None else workers)
+            return
+
+        from synapse.engine.formats import decode_file, detect_format
+
+        if detect_format(lora_path) is not None:
+            yield decode_file(lora_path, key)
+            return
+
+        injector = SynapseInjector(key, legacy=legacy)
+        workers = resolve_workers(workers)
+        yield from injector.iter_extract_file(lora_path, chunk_bytes * workers, workers)
+
+    def unlock(
+        self, key: str, lora: Optional[Union[str, list[str]]] = None, workers: Optional[int] = None,
+        legacy: bool = True,
+    ):
         """
         Unlock and load the hidden context into memory for RAG.
-        After calling this, queries will use the hidden knowledge.
+        After this call, queries will use the hidden knowledge. The payload
+        is streamed, so chunking starts before extraction has finished.
 
         Args:
             key: The secret key.
-            lora: Path to the LoRA file.
+            lora: Path to the LoRA file, or the files of a sharded payload
+                  (their shards are decoded concurrently).
+            workers: Decoding processes for .safetensors/raw carriers (0 = one per CPU).
+                     Default 1, or for sharded files one per file, up to the CPU count.
+            legacy: Also try the v1 layout if no versioned header matches.
+                    That costs a full shuffle of the carrier per wrong key.
         """
         from synapse.engine.retrieval import RetrievalStore
 
-        payload = self.extract(key=key, lora=lora)
-        text = payload.decode("utf-8", errors="ignore").strip("\x00")
-
-        self._retrieval = RetrievalStore()
-        self._retrieval.load(text)
-        print(f"[synapse] ✓ Context unlocked. {len(text)} chars, {self._retrieval.chunk_count} chunks indexed.")
+        chars = 0
+
+        def text_pieces():
+            nonlocal chars
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+            leading, pending = True, ""
+            for block in self.iter_extract(key=key, lora=lora, workers=workers, legacy=legacy):
+                text = decoder.decode(block)
+                if leading:
+                    text = text.lstrip("\x00")
+                    leading = not text
+                # Hold back trailing NULs until we know they are not the end
+                text = pending + text
+                body = text.rstrip("\x00")
+                pending = text[len(body):]
+                chars += len(body)
+                yield body
+
+        retrieval = RetrievalStore()
+        retrieval.load_stream(text_pieces())
+        self._retrieval = retrieval
+        print(f"[synapse] ✓ Context unlocked. {chars} chars, {self._retrieval.chunk_count} chunks indexed.")
 
     # ------------------------------------------------------------------
     # Query
     # ------------------------------------------------------------------
 
-    def query(self, prompt: str, key: Optional[str] = None, lora: Optional[str] = None) -> dict:
+    def query(
+        self, prompt: str, key: Optional[str] = None, lora: Optional[str] = None, legacy: bool = True
+    ) -> dict:
         """
         Query the model. If a key is provided and context isn't already loaded,
         it will attempt to unlock the LoRA first.
@@ -227,6 +540,7 @@ class Synapse:
             prompt: The user's question.
             key: Optional key to unlock hidden context on-the-fly.
             lora: Optional LoRA path override.
+            legacy: Let the on-the-fly unlock try the v1 layout (see unlock()).
 
         Returns:
             dict with "response", "context_used", and "unlocked" fields.
@@ -234,7 +548,7 @@ class Synapse:
         # Unlock on-the-fly if key provided and no context loaded
         if key and not self._retrieval:
             try:
-                self.unlock(key=key, lora=lora)
+                self.unlock(key=key, lora=lora, legacy=legacy)
             except Exception as e:
                 print(f"[synapse] Could not unlock: {e}")
 
@@ -1,4 +1,7 @@
+from synapse.engine.formats import decode_file, detect_format
 from synapse.engine.injector import SynapseInjector
+from synapse.engine.planner import inspect_carrier
 from synapse.engine.retrieval import RetrievalStore
+from synapse.engine.safetensors_io import SafetensorsFile
 
-__all__ = ["SynapseInjector", "RetrievalStore"]
+__all__ = ["SynapseInjector", "RetrievalStore", "SafetensorsFile", "inspect_carrier", "detect_format", "decode_file"]
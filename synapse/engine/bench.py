@@ -0,0 +1,181 @@
+"""
+synapse/engine/bench.py
+
+Injector benchmarks: throughput, peak memory and header latency.
+
+Sweeps carrier size × payload size × carrier format and emits one JSON
+object per case, so runs can be diffed between releases:
+
+    synapse bench --sizes 10000,1000000,100000000 --payloads 1024,1048576 > bench.jsonl
+
+Each case runs in a fresh worker process, so peak RSS is that case's own
+high-water mark rather than the largest case so far. Carriers are
+generated beforehand in a process of their own, so no case is charged
+for writing one. They are written block by block, so even 1B-weight
+raw/safetensors carriers (4 GB files) can be generated without holding
+them in memory; the .pt path has to materialize the tensor.
+
+Fields per case:
+  format, weights, payload_bytes   the case
+  inject_s, inject_mb_s            inject_file, payload MB/s
+  header_ms                        open carrier + authenticate the header
+  extract_s, extract_mb_s          extract_file, payload MB/s
+  peak_rss_mb                      worker process high-water mark
+  ok                               extracted payload matched
+  skipped                          reason, when a case cannot run
+"""
+
+from __future__ import annotations
+import importlib.util
+import json
+import os
+import platform
+import struct
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Iterator, Optional
+
+import numpy as np
+
+from synapse.engine.injector import FORMAT_VERSION, SynapseInjector
+
+
+DEFAULT_SIZES = (10_000, 1_000_000, 10_000_000)
+DEFAULT_PAYLOADS = (1024, 64 * 1024, 1024 * 1024)
+FORMATS = ("raw", "safetensors", "pt")
+BENCH_KEY = "synapse-bench"
+
+_WRITE_BLOCK = 1 << 24      # weights generated per block (64 MB of float32)
+_SUFFIXES = {"raw": ".bin", "safetensors": ".safetensors", "pt": ".pt"}
+
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return round(peak / (1024 * 1024 if platform.system() == "Darwin" else 1024), 1)
+
+
+def _weight_blocks(num_weights: int, seed: int = 0) -> Iterator[np.ndarray]:
+    rng = np.random.default_rng(seed)
+    for start in range(0, num_weights, _WRITE_BLOCK):
+        n = min(_WRITE_BLOCK, num_weights - start)
+        yield rng.normal(0, 0.02, n).astype(np.float32)
+
+
+def write_carrier(path: str, fmt: str, num_weights: int):
+    """Write a synthetic float32 carrier of num_weights in the given format."""
+    if fmt == "pt":
+        import torch
+        weights = np.concatenate(list(_weight_blocks(num_weights)))
+        torch.save({"lora.weight": torch.from_numpy(weights)}, path)
+        return
+    with open(path, "wb") as f:
+        if fmt == "safetensors":
+            header = json.dumps({
+                "lora.weight": {"dtype": "F32", "shape": [num_weights], "data_offsets": [0, num_weights * 4]},
+            }, separators=(",", ":")).encode()
+            header += b" " * ((8 - len(header) % 8) % 8)
+            f.write(struct.pack("<Q", len(header)) + header)
+        for block in _weight_blocks(num_weights):
+            f.write(block.tobytes())
+
+
+def _carrier_path(workdir: str, fmt: str, num_weights: int) -> str:
+    return os.path.join(workdir, f"carrier_{fmt}_{num_weights}{_SUFFIXES[fmt]}")
+
+
+def _skip_reason(fmt: str, num_weights: int, payload_bytes: int, **options) -> Optional[str]:
+    """Why a case cannot run, or None. Cheap: imports nothing heavy."""
+    injector = SynapseInjector(BENCH_KEY, compression="none", **options)
+    capacity = injector.capacity_bytes(num_weights, injector.version, injector.ecc.name)
+    if payload_bytes > capacity:
+        return f"payload exceeds capacity ({capacity} bytes)"
+    if fmt == "pt" and importlib.util.find_spec("torch") is None:
+        return "torch not installed"
+    return None
+
+
+def run_case(fmt: str, num_weights: int, payload_bytes: int, workdir: str, **options) -> dict:
+    """
+    Run one inject → header read → extract cycle on the carrier already
+    written to workdir (see write_carrier). Meant to run in its own process.
+    """
+    result = {"format": fmt, "weights": num_weights, "payload_bytes": payload_bytes}
+    injector = SynapseInjector(BENCH_KEY, compression="none", **options)
+    carrier = _carrier_path(workdir, fmt, num_weights)
+    output = os.path.join(workdir, f"out_{fmt}_{num_weights}_{payload_bytes}{_SUFFIXES[fmt]}")
+    payload = np.random.default_rng(1).bytes(payload_bytes)
+    mb = payload_bytes / 1e6
+
+    try:
+        t = time.perf_counter()
+        injector.inject_file(carrier, payload, output)
+        inject_s = time.perf_counter() - t
+
+        t = time.perf_counter()
+        if fmt == "pt":
+            _, weights = injector._open_torch(output)
+            injector._read_header(weights, injector._shared_space(weights))
+            del weights
+        else:
+            with injector._map_weights(output) as weights:
+                injector._read_header(weights, injector._shared_space(weights))
+        header_ms = (time.perf_counter() - t) * 1e3
+
+        t = time.perf_counter()
+        extracted = injector.extract_file(output)
+        extract_s = time.perf_counter() - t
+    finally:
+        Path(output).unlink(missing_ok=True)
+
+    return {
+        **result,
+        "inject_s": round(inject_s, 4),
+        "inject_mb_s": round(mb / inject_s, 3),
+        "header_ms": round(header_ms, 3),
+        "extract_s": round(extract_s, 4),
+        "extract_mb_s": round(mb / extract_s, 3),
+        "peak_rss_mb": _peak_rss_mb(),
+        "ok": extracted == payload,
+    }
+
+
+def run(
+    sizes=DEFAULT_SIZES,
+    payloads=DEFAULT_PAYLOADS,
+    formats=FORMATS,
+    workdir: Optional[str] = None,
+    **options,
+) -> Iterator[dict]:
+    """
+    Yield one result dict per (format, size, payload) case. Carriers are
+    cached in workdir (a temporary directory by default) across payloads.
+    options are passed to SynapseInjector (ecc, embedding, version, ...).
+    """
+    context = {"format_version": options.get("version", FORMAT_VERSION), **options}
+    with tempfile.TemporaryDirectory(prefix="synapse-bench-", dir=workdir) as tmp:
+        for fmt in formats:
+            for size in sizes:
+                skipped = {payload: _skip_reason(fmt, size, payload, **options) for payload in payloads}
+                if not all(skipped.values()):
+                    # Not in the parent: forked case workers would inherit a .pt carrier's footprint
+                    with ProcessPoolExecutor(max_workers=1) as pool:
+                        pool.submit(write_carrier, _carrier_path(tmp, fmt, size), fmt, size).result()
+                for payload in payloads:
+                    if skipped[payload]:
+                        case = {"format": fmt, "weights": size, "payload_bytes": payload}
+                        yield {**case, "skipped": skipped[payload], **context}
+                        continue
+                    # Fresh process per case: clean peak-RSS accounting
+                    with ProcessPoolExecutor(max_workers=1) as pool:
+                        result = pool.submit(run_case, fmt, size, payload, tmp, **options).result()
+                    yield {**result, **context}
+                for stale in Path(tmp).glob(f"carrier_{fmt}_{size}*"):
+                    stale.unlink()
+
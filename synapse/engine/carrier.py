@@ -0,0 +1,201 @@
+"""
+synapse/engine/carrier.py
+
+Flat addressing over a set of weight tensors without concatenating them.
+
+The injector thinks of a carrier as one long array of weights. For
+memory-mapped files that array must not be materialized — WeightChain
+stitches the per-tensor views together and only gathers/scatters the
+slots that are actually touched.
+"""
+
+from __future__ import annotations
+import shutil
+from contextlib import contextmanager
+from typing import Iterable, Optional
+import numpy as np
+
+
+FICLONE = 0x40049409      # Linux ioctl: share extents between two files
+
+
+def clone_file(src: str, dst: str):
+    """
+    Copy src to dst, sharing extents (reflink) where the filesystem allows
+    it, so the copy costs no data I/O and later writes are copy-on-write.
+    Falls back to a regular (kernel-side where possible) copy.
+    """
+    try:
+        import fcntl
+        with open(src, "rb") as s, open(dst, "wb") as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        return
+    except (ImportError, OSError):
+        pass
+    shutil.copyfile(src, dst)
+
+
+def bf16_to_f32(raw: np.ndarray) -> np.ndarray:
+    """Widen raw bfloat16 bit patterns (uint16) to float32."""
+    return (np.asarray(raw, dtype=np.uint16).astype(np.uint32) << 16).view(np.float32)
+
+
+def f32_to_bf16(values: np.ndarray) -> np.ndarray:
+    """Round float32 values to bfloat16 (nearest-even) and return raw uint16 bits."""
+    bits = np.asarray(values, dtype=np.float32).view(np.uint32)
+    rounding = ((bits >> 16) & 1) + np.uint32(0x7FFF)
+    return ((bits + rounding) >> 16).astype(np.uint16)
+
+
+def bits_view(arr: np.ndarray) -> np.ndarray:
+    """The raw storage of a float array (or raw bf16 uint16 bits) as unsigned integers."""
+    return arr.view(np.dtype(f"u{arr.dtype.itemsize}"))
+
+
+def storage_bits(weights) -> int:
+    """Width of the narrowest float storage in weights (bf16 parts count as 16); 64 for non-arrays."""
+    if isinstance(weights, WeightChain):
+        return min((p.dtype.itemsize * 8 for p in weights.parts), default=64)
+    dtype = getattr(weights, "dtype", None)
+    return dtype.itemsize * 8 if dtype is not None and dtype.kind == "f" else 64
+
+
+def read_lsb(weights, idx) -> np.ndarray:
+    """Lowest mantissa bit of weights[idx], read straight from storage."""
+    if isinstance(weights, WeightChain):
+        return weights.read_lsb(idx)
+    return (bits_view(weights)[np.asarray(idx, dtype=np.int64)] & 1).astype(np.uint8)
+
+
+def write_lsb(weights, idx, bits):
+    """Set the lowest mantissa bit of weights[idx] to bits, in storage."""
+    if isinstance(weights, WeightChain):
+        weights.write_lsb(idx, bits)
+        return
+    raw = bits_view(weights)
+    idx = np.asarray(idx, dtype=np.int64)
+    raw[idx] = (raw[idx] & ~raw.dtype.type(1)) | np.asarray(bits, dtype=raw.dtype)
+
+
+def step_ulp(weights, idx, steps=1):
+    """
+    Move weights[idx] `steps` representable values away from zero (toward
+    zero when negative), in their own storage format (repeated np.nextafter
+    for any float width, bf16 included). For sign-magnitude floats that is
+    adding steps to the raw bits; steps may be one count per index. The
+    caller keeps toward-zero steps within the weight's magnitude.
+    """
+    if isinstance(weights, WeightChain):
+        weights.step_ulp(idx, steps)
+        return
+    _add_raw(bits_view(weights), np.asarray(idx, dtype=np.int64), steps)
+
+
+def _add_raw(raw: np.ndarray, idx: np.ndarray, steps):
+    raw[idx] = (raw[idx].astype(np.int64) + steps).astype(raw.dtype)
+
+
+class WeightChain:
+    """
+    Read/write flat view over several 1-D weight arrays.
+
+    Indexing with an integer array gathers float64 values; assigning to an
+    integer array scatters values back, cast to each part's own dtype.
+    read_lsb/write_lsb work on each part's raw storage bits instead.
+    Parts listed in `bf16` hold raw bfloat16 bits as uint16.
+    """
+
+    def __init__(self, parts: list[np.ndarray], bf16: Iterable[int] = ()):
+        self.parts = [p.reshape(-1) for p in parts]
+        self.bf16 = frozenset(bf16)
+        self._starts = np.cumsum([0] + [len(p) for p in self.parts]).astype(np.int64)
+        self._journal: Optional[list] = None
+
+    @contextmanager
+    def journaled(self):
+        """
+        Undo log for writes made in the block: if it raises, every slot
+        written is put back to its original storage bits. For carriers
+        patched with no copy to fall back on. The log keeps the prior bits
+        of each write, so it grows with the number of slots written.
+        """
+        self._journal = []
+        try:
+            yield self
+        except BaseException:
+            for p, local, raw in reversed(self._journal):
+                bits_view(self.parts[p])[local] = raw
+            raise
+        finally:
+            self._journal = None
+
+    def _log(self, p: int, local: np.ndarray):
+        if self._journal is not None:
+            self._journal.append((p, local.copy(), bits_view(self.parts[p])[local].copy()))
+
+    def __len__(self) -> int:
+        return int(self._starts[-1])
+
+    def __getitem__(self, idx) -> np.ndarray:
+        idx = np.asarray(idx, dtype=np.int64)
+        out = np.empty(len(idx), dtype=np.float64)
+        for p, positions, local in self._route(idx):
+            values = self.parts[p][local]
+            out[positions] = bf16_to_f32(values) if p in self.bf16 else values
+        return out
+
+    def __setitem__(self, idx, values):
+        idx = np.asarray(idx, dtype=np.int64)
+        values = np.broadcast_to(np.asarray(values, dtype=np.float64), idx.shape)
+        for p, positions, local in self._route(idx):
+            self._log(p, local)
+            chunk = values[positions]
+            self.parts[p][local] = f32_to_bf16(chunk) if p in self.bf16 else chunk
+
+    def region(self, start: int, count: int) -> "WeightChain":
+        """Flat positions [start, start + count) as a chain of their own (views, no copy)."""
+        if start < 0 or count < 1 or start + count > len(self):
+            raise ValueError(f"Region [{start}, {start + count}) outside carrier of {len(self)} weights.")
+        parts, bf16 = [], []
+        for p, part in enumerate(self.parts):
+            lo = max(start, int(self._starts[p])) - int(self._starts[p])
+            hi = min(start + count, int(self._starts[p + 1])) - int(self._starts[p])
+            if lo < hi:
+                if p in self.bf16:
+                    bf16.append(len(parts))
+                parts.append(part[lo:hi])
+        return WeightChain(parts, bf16=bf16)
+
+    def read_lsb(self, idx) -> np.ndarray:
+        idx = np.asarray(idx, dtype=np.int64)
+        out = np.empty(len(idx), dtype=np.uint8)
+        for p, positions, local in self._route(idx):
+            out[positions] = bits_view(self.parts[p])[local] & 1
+        return out
+
+    def write_lsb(self, idx, bits):
+        idx = np.asarray(idx, dtype=np.int64)
+        bits = np.asarray(bits, dtype=np.uint8)
+        for p, positions, local in self._route(idx):
+            self._log(p, local)
+            raw = bits_view(self.parts[p])
+            raw[local] = (raw[local] & ~raw.dtype.type(1)) | bits[positions].astype(raw.dtype)
+
+    def step_ulp(self, idx, steps=1):
+        idx = np.asarray(idx, dtype=np.int64)
+        steps = np.broadcast_to(np.asarray(steps, dtype=np.int64), idx.shape)
+        for p, positions, local in self._route(idx):
+            self._log(p, local)
+            _add_raw(bits_view(self.parts[p]), local, steps[positions])
+
+    def _route(self, idx: np.ndarray):
+        """Yield (part, positions in idx, local indices) for every part touched."""
+        if len(idx) and (idx.min() < 0 or idx.max() >= len(self)):
+            raise IndexError("Weight index out of range.")
+        part = np.searchsorted(self._starts, idx, side="right") - 1
+        order = np.argsort(part, kind="stable")
+        sorted_part = part[order]
+        for p in np.unique(sorted_part):
+            lo, hi = np.searchsorted(sorted_part, [p, p + 1])
+            positions = order[lo:hi]
+            yield int(p), positions, idx[positions] - self._starts[p]
@@ -0,0 +1,151 @@
+"""
+synapse/engine/directory.py
+
+Slot directory for shared carriers: many keys, one LoRA file.
+
+A plain injection scatters one key's payload over the whole weight space,
+so a second key silently overwrites the first. A shared carrier instead
+splits its (publicly permuted) slot space into three areas:
+
+  table      magic + occupancy bitmaps for directory entries and extents
+  entries    fixed-size records, each encrypted under its tenant's key
+  extents    equal-sized runs of slots handed out to tenants
+
+The table only says *which* entries and extents are in use — never by
+whom. A tenant finds its own entry by probing from a key-derived start
+index and checking a key-derived tag, then reads only its own extents.
+All geometry is derived from the weight count, so nothing else needs to
+be stored.
+"""
+
+from __future__ import annotations
+import hashlib
+import struct
+from typing import Optional
+
+import numpy as np
+
+from synapse.engine.permutation import KeyedPermutation, SlotRegion
+
+
+DIRECTORY_MAGIC = b"SYND"
+DIRECTORY_VERSION = 1
+DIRECTORY_KEY = b"synapse-directory"   # public: the table is read before any key is known
+
+ENTRY = struct.Struct(">4sII")         # tenant tag, first extent, extent count
+MIN_ENTRIES = 8
+MAX_ENTRIES = 1024
+MAX_EXTENTS = 4096
+MIN_EXTENT_SLOTS = 1536                # 64 payload bytes at 3x repetition
+
+_TABLE_PREFIX = struct.Struct(">4sB")
+
+
+def _bitmap_bytes(bits: int) -> int:
+    return (bits + 7) // 8
+
+
+class DirectoryLayout:
+    """
+    Geometry of a shared carrier with num_weights weights. slots_per_byte
+    is the cost of one metadata byte (table and entries always use the
+    header's repetition code).
+    """
+
+    def __init__(self, num_weights: int, slots_per_byte: int):
+        self.num_weights = num_weights
+        self.slots_per_byte = slots_per_byte
+
+        entries = 1 << max(0, (num_weights // 8192).bit_length() - 1)
+        self.n_entries = min(MAX_ENTRIES, max(MIN_ENTRIES, entries))
+        self.entry_slots = ENTRY.size * slots_per_byte
+        entries_slots = self.n_entries * self.entry_slots
+
+        fixed = (_TABLE_PREFIX.size + _bitmap_bytes(self.n_entries)) * slots_per_byte
+        # Each extent costs its slots plus one bitmap bit in the table
+        per_extent = MIN_EXTENT_SLOTS + slots_per_byte / 8
+        self.n_extents = min(MAX_EXTENTS, int((num_weights - fixed - entries_slots) // per_extent))
+        if self.n_extents < 1:
+            raise ValueError(f"Carrier too small for a shared directory ({num_weights} weights).")
+
+        self.table_bytes = _TABLE_PREFIX.size + _bitmap_bytes(self.n_entries) + _bitmap_bytes(self.n_extents)
+        self.table_slots = self.table_bytes * slots_per_byte
+        self.entries_start = self.table_slots
+        self.data_start = self.entries_start + entries_slots
+        self.extent_slots = (num_weights - self.data_start) // self.n_extents
+
+        self.carrier = KeyedPermutation(DIRECTORY_KEY, num_weights)
+
+    def table_space(self) -> SlotRegion:
+        return SlotRegion(self.carrier, 0, self.table_slots)
+
+    def entry_space(self, index: int) -> SlotRegion:
+        return SlotRegion(self.carrier, self.entries_start + index * self.entry_slots, self.entry_slots)
+
+    def extent_space(self, first: int, count: int, key: bytes) -> SlotRegion:
+        """A tenant's extents, with its slots re-ordered by the tenant's own key."""
+        return SlotRegion(self.carrier, self.data_start + first * self.extent_slots,
+                          count * self.extent_slots, key=key)
+
+    def extents_for(self, num_slots: int) -> int:
+        return -(-num_slots // self.extent_slots)
+
+    def probe_order(self, probe_key: bytes) -> list[int]:
+        """Entry indices a key inspects, in order (linear probing)."""
+        start = int.from_bytes(hashlib.sha256(probe_key).digest()[:8], "big") % self.n_entries
+        return [(start + i) % self.n_entries for i in range(self.n_entries)]
+
+
+class SlotDirectory:
+    """
+    Occupancy table of a shared carrier: which entries and extents are in
+    use. `embedding` is the bit-embedding mode the table and entries are
+    written in (the injector's EMBED_* ids).
+    """
+
+    def __init__(self, layout: DirectoryLayout, entries: np.ndarray, extents: np.ndarray, embedding: int = 0):
+        self.layout = layout
+        self.entries = entries
+        self.extents = extents
+        self.embedding = embedding
+
+    @classmethod
+    def empty(cls, layout: DirectoryLayout, embedding: int = 0) -> "SlotDirectory":
+        return cls(
+            layout, np.zeros(layout.n_entries, dtype=bool), np.zeros(layout.n_extents, dtype=bool), embedding
+        )
+
+    @classmethod
+    def from_bytes(cls, layout: DirectoryLayout, raw: bytes, embedding: int = 0) -> Optional["SlotDirectory"]:
+        """Parse a table, or None if raw is not a directory table."""
+        magic, version = _TABLE_PREFIX.unpack(raw[:_TABLE_PREFIX.size])
+        if magic != DIRECTORY_MAGIC or version != DIRECTORY_VERSION:
+            return None
+        bits = np.unpackbits(np.frombuffer(raw[_TABLE_PREFIX.size:], dtype=np.uint8), bitorder="little")
+        entries = bits[:layout.n_entries].astype(bool)
+        offset = _bitmap_bytes(layout.n_entries) * 8
+        extents = bits[offset:offset + layout.n_extents].astype(bool)
+        return cls(layout, entries, extents, embedding)
+
+    def to_bytes(self) -> bytes:
+        entries = np.packbits(self.entries.astype(np.uint8), bitorder="little").tobytes()
+        extents = np.packbits(self.extents.astype(np.uint8), bitorder="little").tobytes()
+        return _TABLE_PREFIX.pack(DIRECTORY_MAGIC, DIRECTORY_VERSION) + entries + extents
+
+    def allocate(self, count: int) -> int:
+        """Claim the first run of `count` free extents and return its index."""
+        free = np.concatenate(([False], ~self.extents, [False])).astype(np.int8)
+        edges = np.diff(free)
+        starts, ends = np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+        fits = np.flatnonzero(ends - starts >= count)
+        if not fits.size:
+            raise ValueError(
+                f"Shared carrier is full: need {count} free extents in a row "
+                f"({count * self.layout.extent_slots} slots)."
+            )
+        first = int(starts[fits[0]])
+        self.extents[first:first + count] = True
+        return first
+
+    def release(self, first: int, count: int):
+        self.extents[first:first + count] = False
@@ -0,0 +1,264 @@
+"""
+synapse/engine/ecc.py
+
+Error-correcting codes for the payload body.
+
+Up to format v4 every payload bit was written to three slots and decoded by
+majority vote: 3x the weights touched, and only one flip per triple is
+survivable. From v5 the header names the body's code:
+
+  rep3   the original repetition code (1 bit → 3 slots)
+  rs     Reed-Solomon(255, 223) over GF(256), 1 bit → 1 slot. Each
+         codeword repairs any 16 corrupted bytes; codewords are byte-
+         interleaved in frames of 16 so a run of bad slots is spread
+         over many codewords instead of exhausting one.
+  none   raw bits, no protection
+
+The header itself is always written with rep3 so it can be read before the
+code is known.
+
+Codes are byte-stream transforms: encode(data) → stored bytes, and
+decode(stored, n) → the n data bytes back. Streams decode in independent
+units of `unit` data bytes, which is what lets extraction stay streaming.
+"""
+
+from __future__ import annotations
+import numpy as np
+
+
+# ----------------------------------------------------------------------
+# GF(256) arithmetic (primitive polynomial x^8 + x^4 + x^3 + x^2 + 1)
+# ----------------------------------------------------------------------
+
+_PRIMITIVE = 0x11D
+
+_EXP = np.zeros(512, dtype=np.int64)
+_LOG = np.zeros(256, dtype=np.int64)
+_x = 1
+for _i in range(255):
+    _EXP[_i] = _x
+    _LOG[_x] = _i
+    _x <<= 1
+    if _x & 0x100:
+        _x ^= _PRIMITIVE
+_EXP[255:510] = _EXP[:255]
+
+# Full multiplication table: 64 KiB, lets encode/syndromes run as array lookups
+_MUL = np.zeros((256, 256), dtype=np.uint8)
+_MUL[1:, 1:] = _EXP[(_LOG[1:, None] + _LOG[None, 1:]) % 255]
+
+
+def _gf_mul(a: int, b: int) -> int:
+    if a == 0 or b == 0:
+        return 0
+    return int(_EXP[_LOG[a] + _LOG[b]])
+
+
+def _gf_div(a: int, b: int) -> int:
+    if b == 0:
+        raise ZeroDivisionError("GF(256) division by zero")
+    if a == 0:
+        return 0
+    return int(_EXP[(_LOG[a] - _LOG[b]) % 255])
+
+
+def _poly_eval(poly: list[int], x: int) -> int:
+    """Evaluate a lowest-degree-first polynomial at x."""
+    y = 0
+    for coef in reversed(poly):
+        y = _gf_mul(y, x) ^ coef
+    return y
+
+
+# ----------------------------------------------------------------------
+# Codes
+# ----------------------------------------------------------------------
+
+class Repetition:
+    """Each stored bit is written to `repetition` slots (majority vote on read)."""
+
+    unit = 1
+
+    def __init__(self, code_id: int, name: str, repetition: int):
+        self.id = code_id
+        self.name = name
+        self.repetition = repetition
+
+    def encoded_size(self, n: int) -> int:
+        return n
+
+    def max_data(self, stored: int) -> int:
+        return stored
+
+    def encode(self, data: bytes) -> bytes:
+        return data
+
+    def decode(self, stored: bytes, n: int) -> bytes:
+        return stored[:n]
+
+
+class ReedSolomon:
+    """
+    Systematic RS(n, k) over GF(256) with generator roots α^0 … α^(n-k-1),
+    codewords byte-interleaved `depth` at a time. The final codeword of a
+    stream is shortened (its implicit leading zeros are not stored).
+    """
+
+    repetition = 1
+
+    def __init__(self, code_id: int, name: str, n: int = 255, k: int = 223, depth: int = 16):
+        self.id = code_id
+        self.name = name
+        self.n, self.k, self.depth = n, k, depth
+        self.nsym = n - k
+        self.unit = k * depth
+
+        gen = [1]   # highest degree first
+        for i in range(self.nsym):
+            root = int(_EXP[i])
+            gen = [a ^ _gf_mul(b, root) for a, b in zip(gen + [0], [0] + gen)]
+        # Feedback multiples of the generator, indexed by the feedback byte
+        self._feedback = _MUL[:, np.array(gen[1:], dtype=np.int64)]
+        self._roots = _EXP[np.arange(self.nsym)].astype(np.int64)
+
+    # -- sizes ---------------------------------------------------------
+
+    def encoded_size(self, n: int) -> int:
+        return n + self.nsym * -(-n // self.k)
+
+    def max_data(self, stored: int) -> int:
+        full, rest = divmod(stored, self.n)
+        return full * self.k + max(0, rest - self.nsym)
+
+    # -- encode --------------------------------------------------------
+
+    def encode(self, data: bytes) -> bytes:
+        if not data:
+            return b""
+        message, mask = self._rows(len(data))
+        message[mask[:, : self.k]] = np.frombuffer(data, dtype=np.uint8)
+
+        parity = np.zeros((len(message), self.nsym), dtype=np.uint8)
+        for i in range(self.k):
+            feedback = message[:, i] ^ parity[:, 0]
+            parity[:, :-1] = parity[:, 1:]
+            parity[:, -1] = 0
+            parity ^= self._feedback[feedback]
+        return self._interleave(np.concatenate([message, parity], axis=1), mask)
+
+    # -- decode --------------------------------------------------------
+
+    def decode(self, stored: bytes, n: int) -> bytes:
+        if n == 0:
+            return b""
+        codewords, mask = self._rows(n, width=self.n)
+        codewords = self._deinterleave(codewords, mask, np.frombuffer(stored, dtype=np.uint8))
+
+        syndromes = self._syndromes(codewords)
+        for row in np.flatnonzero(syndromes.any(axis=1)):
+            stored_from = int(np.argmax(mask[row]))
+            codewords[row] = self._correct(codewords[row], syndromes[row].tolist(), stored_from)
+
+        message = codewords[:, : self.k]
+        return message[mask[:, : self.k]].tobytes()
+
+    def _syndromes(self, codewords: np.ndarray) -> np.ndarray:
+        """S_j = c(α^j) for every codeword row, by Horner's rule across columns."""
+        syndromes = np.zeros((len(codewords), self.nsym), dtype=np.uint8)
+        for i in range(self.n):
+            syndromes = _MUL[syndromes, self._roots[None, :]] ^ codewords[:, i:i + 1]
+        return syndromes
+
+    def _correct(self, codeword: np.ndarray, syndromes: list[int], stored_from: int) -> np.ndarray:
+        """Berlekamp–Massey → Chien search → Forney on one codeword."""
+        # Error locator Λ(x), lowest degree first
+        locator, previous = [1], [1]
+        errors, shift, last = 0, 1, 1
+        for step in range(self.nsym):
+            delta = syndromes[step]
+            for i in range(1, min(errors, len(locator) - 1) + 1):
+                delta ^= _gf_mul(locator[i], syndromes[step - i])
+            if delta == 0:
+                shift += 1
+                continue
+            coef = _gf_div(delta, last)
+            update = [0] * shift + [_gf_mul(coef, c) for c in previous]
+            grown = locator + [0] * max(0, len(update) - len(locator))
+            grown = [a ^ (update[i] if i < len(update) else 0) for i, a in enumerate(grown)]
+            if 2 * errors <= step:
+                previous, errors, last, shift = locator, step + 1 - errors, delta, 1
+            else:
+                shift += 1
+            locator = grown
+        locator = locator[: errors + 1]
+        if errors * 2 > self.nsym:
+            raise ValueError("Payload is corrupt beyond error-correction repair.")
+
+        # Byte i holds the coefficient of x^(n-1-i); its locator is α^(n-1-i)
+        positions = [
+            i for i in range(stored_from, self.n)
+            if _poly_eval(locator, int(_EXP[(255 - (self.n - 1 - i)) % 255])) == 0
+        ]
+        if len(positions) != errors:
+            raise ValueError("Payload is corrupt beyond error-correction repair.")
+
+        # Evaluator Ω(x) = S(x)Λ(x) mod x^nsym; magnitudes by Forney (roots from α^0)
+        evaluator = [0] * self.nsym
+        for i, s in enumerate(syndromes):
+            for j, l in enumerate(locator):
+                if i + j < self.nsym:
+                    evaluator[i + j] ^= _gf_mul(s, l)
+        derivative = [locator[i] if i % 2 else 0 for i in range(1, len(locator))]
+
+        fixed = codeword.copy()
+        for i in positions:
+            x = int(_EXP[(self.n - 1 - i) % 255])
+            x_inv = _gf_div(1, x)
+            fixed[i] ^= _gf_mul(x, _gf_div(_poly_eval(evaluator, x_inv), _poly_eval(derivative, x_inv)))
+        if self._syndromes(fixed[None, :]).any():
+            raise ValueError("Payload is corrupt beyond error-correction repair.")
+        return fixed
+
+    # -- layout --------------------------------------------------------
+
+    def _rows(self, n: int, width: int = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Zeroed codeword rows for a stream of n data bytes, plus the mask of
+        positions that are actually stored (the shortened last codeword's
+        leading zeros are not).
+        """
+        rows = -(-n // self.k)
+        mask = np.ones((rows, self.n), dtype=bool)
+        short = rows * self.k - n
+        mask[-1, :short] = False
+        return np.zeros((rows, width or self.k), dtype=np.uint8), mask
+
+    def _frames(self, rows: int):
+        for start in range(0, rows, self.depth):
+            yield slice(start, min(start + self.depth, rows))
+
+    def _interleave(self, codewords: np.ndarray, mask: np.ndarray) -> bytes:
+        # Column-major within each frame: byte j of every codeword, then byte j+1 …
+        return b"".join(codewords[f].T[mask[f].T].tobytes() for f in self._frames(len(codewords)))
+
+    def _deinterleave(self, codewords: np.ndarray, mask: np.ndarray, stored: np.ndarray) -> np.ndarray:
+        pos = 0
+        for f in self._frames(len(codewords)):
+            block = codewords[f].T.copy()
+            count = int(mask[f].sum())
+            block[mask[f].T] = stored[pos:pos + count]
+            codewords[f] = block.T
+            pos += count
+        return codewords
+
+
+ECC_REP3 = 0
+ECC_RS = 1
+ECC_NONE = 2
+
+ECCS = {
+    "rep3": Repetition(ECC_REP3, "rep3", 3),
+    "rs": ReedSolomon(ECC_RS, "rs"),
+    "none": Repetition(ECC_NONE, "none", 1),
+}
+ECCS_BY_ID = {code.id: code for code in ECCS.values()}
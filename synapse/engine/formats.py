@@ -0,0 +1,354 @@
+"""
+synapse/engine/formats.py
+
+Carrier format registry: which encoder wrote a file, and how to decode it.
+
+Five encoders live in this tree:
+
+  synapse          synapse/engine/injector.py — keyed SYNP header inside
+                   the weights (format versions 1–8), any carrier type
+  hardened/1       synapse_tui.SynapseForge (before format 2) —
+                   single-tensor .safetensors mask, parity of
+                   round(w * 1e6), CRC32 trailer, slots from
+                   random.shuffle seeded by the passkey
+  hardened/2       synapse_tui.SynapseForge — the same mask, streamed in
+                   blocks; each block carries its share of the bits at
+                   positions from its own keyed permutation (see
+                   hardened_layout)
+  hardened-web/1   web-portal synapse.worker.ts — the hardened/1 layout,
+                   slots picked by a 32-bit LCG and filled in weight order
+  spectral/4       src/synapse/core/engine_v4.py — parity of the lowest
+                   Walsh-Hadamard coefficients of each block of weights
+  lsb-1e7/1        src/synapse/core/injector.py — parity of
+                   round(w * 1e7), slots by rejection sampling from
+                   numpy's default_rng
+
+Writers record "<name>/<version>" under FORMAT_KEY in the .safetensors
+"__metadata__"; masks forged before the tag existed are recognised by
+their legacy "type" field. detect_format() reads that from the header
+alone, so extraction picks its decoder in one lookup instead of trying
+each in turn. Untagged carriers belong to the injector: its payloads are
+meant to be invisible without the key, and its SYNP header already
+carries the format version, so it never writes a tag.
+
+Every decoder here is vectorized: slot positions are generated as arrays
+(the legacy random.shuffle and LCG sequences are reproduced exactly) and
+the weights are read with one gather from the memory-mapped file.
+"""
+
+from __future__ import annotations
+import hashlib
+import json
+import random
+import struct
+import zlib
+from typing import Callable, Iterator, Optional
+
+import numpy as np
+
+from synapse.engine.permutation import KeyedPermutation
+from synapse.engine.safetensors_io import SafetensorsFile, is_safetensors
+
+
+FORMAT_KEY = "synapse.format"
+LEGACY_HARDENED_TYPE = "synapse_v1_hardened"
+DRAW_BLOCK = 1 << 20          # positions drawn per vectorized block
+HARDENED_BLOCK = 1 << 20      # weights per block of a hardened/2 mask
+
+_DECODERS: dict[str, Callable] = {}
+
+
+def register_format(tag: str):
+    """Decorator: register decode(weights, metadata, key) -> payload for tag."""
+    def wrap(decode: Callable) -> Callable:
+        _DECODERS[tag] = decode
+        return decode
+    return wrap
+
+
+def carrier_metadata(path: str) -> Optional[dict]:
+    """The "__metadata__" of a .safetensors file ({} if none), or None for other carriers."""
+    if not is_safetensors(path):
+        return None
+    with open(path, "rb") as f:
+        (n,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(n))
+    return header.get("__metadata__") or {}
+
+
+def format_tag(metadata: Optional[dict]) -> Optional[str]:
+    """The format tag recorded in (or implied by) a carrier's metadata."""
+    if not metadata:
+        return None
+    if metadata.get(FORMAT_KEY):
+        return str(metadata[FORMAT_KEY])
+    if metadata.get("type") == LEGACY_HARDENED_TYPE:
+        # The web worker also records its density; the Python forge never did
+        return "hardened-web/1" if "density" in metadata else "hardened/1"
+    return None
+
+
+def detect_format(path: str) -> Optional[str]:
+    """Format tag of the carrier at path, or None for the injector's own (untagged) carriers."""
+    return format_tag(carrier_metadata(path))
+
+
+def decode_weights(tag: str, weights, metadata: dict, key: str) -> bytes:
+    """
+    Run tag's decoder over weights: anything with len() that gathers
+    values for an index array (a WeightChain, or a 1-D NumPy array or
+    memmap of the mask's floats).
+    """
+    decode = _DECODERS.get(tag)
+    if decode is None:
+        raise ValueError(f"Unknown carrier format {tag!r}. Known: {', '.join(sorted(_DECODERS))}")
+    return decode(weights, metadata, key)
+
+
+def decode_file(path: str, key: str) -> bytes:
+    """Decode a tagged carrier with its registered decoder."""
+    tag = detect_format(path)
+    if tag is None:
+        raise ValueError(f"{path} has no format tag; extract it with SynapseInjector.")
+    with SafetensorsFile(path) as st:
+        return decode_weights(tag, st.weights(), st.metadata, key)
+
+
+# ----------------------------------------------------------------------
+# Shared helpers
+# ----------------------------------------------------------------------
+
+def _passkey_seed(key: str) -> int:
+    """First 4 bytes of SHA-256(key), little-endian — the seed of the hardened forges."""
+    return int.from_bytes(hashlib.sha256(key.encode()).digest()[:4], "little")
+
+
+def _parity_bytes(values: np.ndarray, scale: float) -> np.ndarray:
+    """Bits parity(round(v * scale)), LSB-first, packed into bytes."""
+    values = np.asarray(values, dtype=np.float64)
+    bits = (np.rint(values * scale).astype(np.int64) & 1).astype(np.uint8)
+    return np.packbits(bits, bitorder="little")
+
+
+def _check_crc(raw: np.ndarray, size: int) -> bytes:
+    """Payload of size bytes followed by its little-endian CRC32."""
+    payload = raw[:size].tobytes()
+    (stored,) = struct.unpack("<I", raw[size:size + 4].tobytes())
+    if zlib.crc32(payload) & 0xFFFFFFFF != stored:
+        raise ValueError("Integrity check failed: wrong key or corrupted mask.")
+    return payload
+
+
+def _first_distinct(draws, n: int, m: int) -> np.ndarray:
+    """
+    The first m distinct values of a stream of positions in [0, n), in the
+    order they were first drawn. draws(count) returns the next count values.
+    """
+    if m > n:
+        raise ValueError(f"Mask holds {n} weights, cannot carry {m} bits.")
+    seen = np.zeros(n, dtype=bool)
+    found = []
+    count = 0
+    while count < m:
+        block = draws(min(DRAW_BLOCK, max(1024, 2 * (m - count))))
+        values, first = np.unique(block, return_index=True)
+        fresh = ~seen[values]
+        values = values[fresh][np.argsort(first[fresh], kind="stable")][:m - count]
+        seen[values] = True
+        found.append(values)
+        count += len(values)
+    return np.concatenate(found) if found else np.zeros(0, dtype=np.int64)
+
+
+def hardened_layout(
+    digest: bytes, num_weights: int, num_bits: int, block_weights: int = HARDENED_BLOCK
+) -> Iterator[tuple[int, int, int, np.ndarray]]:
+    """
+    Block-by-block slot layout of a hardened/2 mask, keyed by digest
+    (SHA-256 of the passkey). Yields (start, size, first_bit, positions):
+    weights [start, start + size) carry bits first_bit … first_bit +
+    len(positions) - 1, at start + positions. Each block gets bits in
+    proportion to its size, placed by a permutation keyed with the block
+    counter, so forge and unmask both need only one block at a time.
+    """
+    if num_bits > num_weights:
+        raise ValueError(f"Mask holds {num_weights} weights, cannot carry {num_bits} bits.")
+    for block, start in enumerate(range(0, num_weights, block_weights)):
+        size = min(block_weights, num_weights - start)
+        first_bit = num_bits * start // num_weights
+        count = num_bits * (start + size) // num_weights - first_bit
+        permutation = KeyedPermutation(digest + block.to_bytes(8, "little"), size)
+        yield start, size, first_bit, permutation.map(np.arange(count, dtype=np.uint64))
+
+
+# ----------------------------------------------------------------------
+# random.shuffle, reproduced on arrays
+# ----------------------------------------------------------------------
+
+def _index_dtype(n: int):
+    return np.int32 if n < 2 ** 31 else np.int64
+
+
+def _mt19937(seed: int) -> np.random.MT19937:
+    """A NumPy MT19937 in the exact state random.seed(seed) leaves Python's generator in."""
+    _, words, _ = random.Random(seed).getstate()
+    generator = np.random.MT19937()
+    generator.state = {
+        "bit_generator": "MT19937",
+        "state": {"key": np.array(words[:624], dtype=np.uint32), "pos": words[624]},
+    }
+    return generator
+
+
+def _shuffle_swaps(seed: int, n: int) -> np.ndarray:
+    """
+    j[i] for every step i = n-1 … 1 of random.shuffle on a list of n items
+    after random.seed(seed) (j[0] = 0).
+
+    Each step draws getrandbits(k) until the value is below i + 1. Within a
+    run of steps sharing k, a draw u is certainly accepted if u < i + 1 - t
+    (t draws since the run started) and certainly rejected if u >= i + 1;
+    only the rare draws in between are settled one by one.
+    """
+    generator = _mt19937(seed)
+    j = np.zeros(n, dtype=_index_dtype(n))
+    bound = n
+    while bound >= 2:
+        k = bound.bit_length()
+        count = min(bound - (1 << (k - 1)) + 1, max(1, bound >> 4), DRAW_BLOCK)
+        u = (generator.random_raw(count) >> np.uint64(32 - k)).astype(np.int64)
+        accepted = u < bound - np.arange(count)
+        unsure = np.flatnonzero(~accepted & (u < bound))
+        if len(unsure):
+            before = np.cumsum(accepted) - accepted
+            extra = 0
+            for t in unsure:
+                if u[t] < bound - before[t] - extra:
+                    accepted[t] = True
+                    extra += 1
+        values = u[accepted]
+        j[bound - len(values):bound][::-1] = values
+        bound -= len(values)
+    return j
+
+
+def _shuffled_prefix(seed: int, n: int, m: int) -> np.ndarray:
+    """
+    The first m items of list(range(n)) after random.seed(seed) and
+    random.shuffle — without building or shuffling the list.
+
+    Item p is final once step p swaps in the item then at position j[p];
+    that item was last written there by the earliest later step that
+    targeted j[p], which in turn holds what was at its own position, and
+    so on. The chains are short, so they are followed for all p at once.
+    """
+    if n < 2:
+        return np.arange(m, dtype=np.int64)
+    j = _shuffle_swaps(seed, n)
+    index = j.dtype
+    # Steps grouped by target, in order: one sort of target * n + step
+    order = j[1:].astype(np.int64) * n + np.arange(1, n, dtype=np.int64)
+    order.sort()
+    targets, steps = np.divmod(order, n)
+    del order
+    targets, steps = targets.astype(index), steps.astype(index)
+    same = targets[1:] == targets[:-1]
+    following = np.full(n, -1, dtype=index)             # next step with the same target
+    following[steps[:-1][same]] = steps[1:][same]
+    starts = np.flatnonzero(np.r_[True, ~same])
+    writer = np.full(n, -1, dtype=index)                # first step targeting each position …
+    writer[targets[starts]] = steps[starts]
+    del steps, targets, same, starts
+    # … unless that is the position's own step: then the one after it
+    # (a step never writes positions above itself)
+    own = np.flatnonzero(writer == np.arange(n, dtype=index))
+    first_of_zero = int(writer[0])
+    writer[own] = following[own]
+
+    item = np.empty(m, dtype=np.int64)
+    item[1:] = following[1:m]
+    item[0] = first_of_zero
+    unset = item < 0
+    item[unset] = j[:m][unset]
+    active = np.flatnonzero(~unset)
+    while len(active):
+        nxt = writer[item[active]]
+        more = nxt >= 0
+        item[active[more]] = nxt[more]
+        active = active[more]
+    return item
+
+
+# ----------------------------------------------------------------------
+# Decoders
+# ----------------------------------------------------------------------
+
+@register_format("hardened/1")
+def _decode_hardened(weights, meta: dict, key: str) -> bytes:
+    total = int(meta["total_bytes"])
+    positions = _shuffled_prefix(_passkey_seed(key), len(weights), total * 8)
+    return _check_crc(_parity_bytes(weights[positions], 1e6), int(meta["payload_bytes"]))
+
+
+@register_format("hardened/2")
+def _decode_hardened_v2(weights, meta: dict, key: str) -> bytes:
+    total = int(meta["total_bytes"])
+    bits = np.empty(total * 8, dtype=np.uint8)
+    digest = hashlib.sha256(key.encode()).digest()
+    block_weights = int(meta.get("block_weights", HARDENED_BLOCK))
+    for start, _, first_bit, positions in hardened_layout(digest, len(weights), len(bits), block_weights):
+        values = np.asarray(weights[start + positions], dtype=np.float64)
+        bits[first_bit:first_bit + len(values)] = np.rint(values * 1e6).astype(np.int64) & 1
+    return _check_crc(np.packbits(bits, bitorder="little"), int(meta["payload_bytes"]))
+
+
+@register_format("hardened-web/1")
+def _decode_hardened_web(weights, meta: dict, key: str) -> bytes:
+    total = int(meta["total_bytes"])
+    n = len(weights)
+    state = [_passkey_seed(key)]
+    a, c = np.uint64(1664525), np.uint64(1013904223)
+    powers = {}
+
+    def draws(count: int) -> np.ndarray:
+        # x[t+k] = a^k * x[t] + c * (a^(k-1) + … + 1)  (mod 2^32), for k = 1..count
+        if count not in powers:
+            mult = np.cumprod(np.full(count, a, dtype=np.uint64))
+            add = np.cumsum(np.r_[np.uint64(1), mult[:-1]]) * c
+            powers[count] = (mult & np.uint64(0xFFFFFFFF), add & np.uint64(0xFFFFFFFF))
+        mult, add = powers[count]
+        x = (mult * np.uint64(state[0]) + add) & np.uint64(0xFFFFFFFF)
+        state[0] = int(x[-1])
+        return (x % np.uint64(n)).astype(np.int64)
+
+    # The worker fills the picked slots in weight order, not draw order
+    positions = np.sort(_first_distinct(draws, n, total * 8))
+    return _check_crc(_parity_bytes(weights[positions], 1e6), int(meta["payload_bytes"]))
+
+
+@register_format("spectral/4")
+def _decode_spectral(weights, meta: dict, key: str) -> bytes:
+    total = int(meta["total_bytes"])
+    block = int(meta.get("block_size", 8))
+    per_block = int(meta.get("bits_per_block", 1))
+    num_blocks = -(-total * 8 // per_block)
+    if num_blocks * block > len(weights):
+        raise ValueError(f"Mask holds {len(weights)} weights, not {num_blocks} blocks of {block}.")
+    # Only the first per_block Walsh-Hadamard coefficients carry bits:
+    # coefficient k of a block is its dot product with row k, (-1)^popcount(k & i)
+    rows = np.arange(per_block)[:, None] & np.arange(block)[None, :]
+    signs = 1.0 - 2.0 * (np.unpackbits(rows.astype(">u4").view(np.uint8).reshape(*rows.shape, 4), axis=-1).sum(axis=-1) & 1)
+    blocks = weights[np.arange(num_blocks * block)].reshape(num_blocks, block)
+    coeffs = blocks @ signs.T
+    raw = _parity_bytes(coeffs.reshape(-1)[:total * 8], 1000)
+    return _check_crc(raw, int(meta["payload_bytes"]))
+
+
+@register_format("lsb-1e7/1")
+def _decode_lsb_1e7(weights, meta: dict, key: str) -> bytes:
+    size = int(meta["payload_bytes"])
+    seed = int(hashlib.sha256(key.encode()).hexdigest(), 16) % (2 ** 32)
+    rng = np.random.default_rng(seed)
+    n = len(weights)
+    positions = _first_distinct(lambda count: rng.integers(0, n, size=count), n, size * 8)
+    return _parity_bytes(weights[positions], 1e7).tobytes()
@@ -5,222 +5,1174 @@ The steganographic core of Synapse.
 
 Key improvements over the original:
   - Header encoding (payload length stored in first N weights)
-  - XOR encryption with key-derived keystream
-  - Error-correcting repetition code (each bit stored 3x) for quantization resilience
+  - XOR encryption with key-derived keystream (bulk SHAKE-256 counter mode from v3)
+  - Optional compression (zlib/lzma/bz2/zstd) before encryption
+  - Error correction recorded in the header: Reed-Solomon(255,223) with
+    interleaving from v5 (1 slot per bit), repetition-3 before that
   - Targets higher-magnitude weights (more stable under quantization)
-  - Works with .pt, .bin, and raw tensor files
+  - Works with .pt, .bin, .safetensors (memory-mapped) and raw tensor files;
+    .pt state dicts are mapped too and keep their tensors' own dtypes
+  - Surgical writeback: mappable carriers only rewrite the weights that changed
+  - Shared carriers: a slot directory gives each key its own disjoint extents
+  - Parallel extraction: mapped carriers can be decoded by a process pool
+  - Batch inject_many/extract_many: many keys per carrier load and save
+  - Vectorized NumPy encode/decode (no per-bit Python loops)
+  - Optional mantissa mode (v6): bits go straight into each weight's lowest
+    stored mantissa bit — bitwise ops on the raw buffer, no float round-trip
+  - Versioned header; slots come from a lazy keyed permutation, so reading
+    the header touches a few hundred weights instead of shuffling them all
+  - Authenticated header and payload (v7): a keyed MAC rejects a wrong key
+    from the header alone, and the payload is integrity-checked at the end
+  - Out-of-core inject: large payloads are written in one ordered pass over
+    the carrier, window by window, with memory independent of its size
+  - Trainer output ({"lora_weights", "synapse_meta"}) is read natively, and
+    payloads stay inside the weight region its synapse_meta reserves
+  - Segmented payloads (v8): separately versioned segments behind a
+    manifest, so an update rewrites only the segments that changed
+  - Sharding: one payload spread over several carrier files, decoded
+    concurrently (synapse/engine/shards.py)
+  - Tensor selection: a glob policy recorded in the carrier's metadata
+    confines the payload to matching tensors (e.g. only lora_B), and only
+    those are mapped and read on extraction
 """
 
 from __future__ import annotations
+import bz2
+import copy
 import hashlib
+import hmac
+import lzma
+import os
 import struct
+import zlib
+from contextlib import contextmanager
 import numpy as np
 from pathlib import Path
-from typing import Union
+from typing import Iterator, Optional, Union
 
+from synapse.engine.carrier import WeightChain, clone_file, read_lsb, step_ulp, storage_bits, write_lsb
+from synapse.engine.ecc import ECC_REP3, ECCS, ECCS_BY_ID
+from synapse.engine.directory import DIRECTORY_MAGIC, ENTRY, DirectoryLayout, SlotDirectory
+from synapse.engine.permutation import KeyedPermutation, ShuffledSlots, SlotRegion
+from synapse.engine.segments import Segment, SegmentManifest, manifest_slots, run_slots
+from synapse.engine.safetensors_io import SafetensorsFile, is_safetensors
+from synapse.engine.selection import (
+    SELECTION_KEY, normalize_policy, read_torch_metadata, select_tensors, write_torch_metadata,
+)
 
-HEADER_BYTES = 4          # 4 bytes = uint32 for payload length
-REPETITION = 3            # each bit repeated 3 times for error correction
+
+HEADER_BYTES = 4          # legacy (v1) header: bare uint32 payload length
+REPETITION = 3            # header (and pre-v5 body) bits are repeated 3 times
 SCALE = 1e6               # precision scale for LSB encoding
+CHUNK_BYTES = 1 << 20     # block size for streaming extraction
+MAX_ULP_STEPS = 64        # parity search bound (ulps either side) where storage is coarser than 1/SCALE
+MAX_SCALE_ERROR = 2 ** -4 # largest relative error a parity search may introduce
+WINDOW_SLOTS = 1 << 22    # larger writes stream over the carrier in windows of this many weights
+
+MAGIC = b"SYNP"           # marks a versioned header (v2+)
+FORMAT_VERSION = 8        # version written by default
+HEADER_MAC_BYTES = 8      # keyed MAC closing the v7 header
+PAYLOAD_MAC_BYTES = 16    # keyed MAC over header + ciphertext, stored after the ciphertext
+
+# Compression codecs applied before encryption (recorded in the header from v4 on)
+CODECS = {"none": 0, "zlib": 1, "lzma": 2, "bz2": 3, "zstd": 4}
+
+# How a bit is stored in a weight (recorded in the header from v6 on)
+EMBED_SCALE = 0           # parity of round(w * SCALE)
+EMBED_MANTISSA = 1        # lowest mantissa bit of the stored float
+EMBEDDINGS = {"scale": EMBED_SCALE, "mantissa": EMBED_MANTISSA}
+
+# What the body holds (recorded in the header from v8 on)
+LAYOUT_PLAIN = 0          # the payload itself
+LAYOUT_SEGMENTED = 1      # a segment manifest (see synapse/engine/segments.py)
+LAYOUT_SHARD = 2          # one piece of a payload spread over several files (synapse/engine/shards.py)
+
+# Keystream constructions (recorded in the header from v3 on)
+CIPHER_SHA256_CHAIN = 0   # SHA-256("key:counter") per 32 bytes — v1/v2 payloads
+CIPHER_SHAKE_CTR = 1      # SHAKE-256 in counter mode, KEYSTREAM_BLOCK bytes per call
+KEYSTREAM_BLOCK = 1 << 16
+KEYSTREAM_CACHE_BLOCKS = 64   # bounded cache: 4 MiB of keystream per injector
+
+# Versioned header: MAGIC + version byte, then a per-version field layout.
+#   v1 — no magic; length only; slots from a full np.random shuffle
+#   v2 — slots computed on demand by a keyed permutation (O(payload) memory)
+#   v3 — adds the cipher id
+#   v4 — adds compression codec + level; length is the stored (compressed) size
+#   v5 — adds the body's error-correcting code (header stays repetition-3);
+#        length is still the size before ECC
+#   v6 — adds the embedding mode; the whole payload, header included, is
+#        written in that mode, so readers try each mode's header in turn
+#   v7 — header ends with a keyed MAC; the body carries a payload MAC
+#   v8 — adds the body layout: plain, a manifest of versioned segments, or
+#        one shard of a payload spread over several carrier files
+_PREFIX = struct.Struct(">4sB")
+_HEADER_LAYOUTS = {
+    2: (struct.Struct(">I"), ("length",)),
+    3: (struct.Struct(">BI"), ("cipher", "length")),
+    4: (struct.Struct(">BBbI"), ("cipher", "codec", "level", "length")),
+    5: (struct.Struct(">BBbBI"), ("cipher", "codec", "level", "ecc", "length")),
+    6: (struct.Struct(">BBbBBI"), ("cipher", "codec", "level", "ecc", "embedding", "length")),
+    7: (struct.Struct(f">BBbBBI{HEADER_MAC_BYTES}s"),
+        ("cipher", "codec", "level", "ecc", "embedding", "length", "mac")),
+    8: (struct.Struct(f">BBbBBBI{HEADER_MAC_BYTES}s"),
+        ("cipher", "codec", "level", "ecc", "embedding", "layout", "length", "mac")),
+}
+# Values for fields an older layout does not carry
+_HEADER_DEFAULTS = {"cipher": CIPHER_SHA256_CHAIN, "codec": CODECS["none"], "level": 0, "ecc": ECC_REP3,
+                    "embedding": EMBED_SCALE, "layout": LAYOUT_PLAIN}
+
+
+def _compress(codec: int, level: int, data: bytes) -> bytes:
+    if codec == CODECS["zlib"]:
+        return zlib.compress(data, level)
+    if codec == CODECS["lzma"]:
+        return lzma.compress(data, preset=level)
+    if codec == CODECS["bz2"]:
+        return bz2.compress(data, compresslevel=max(1, level))
+    if codec == CODECS["zstd"]:
+        return _zstandard().ZstdCompressor(level=level).compress(data)
+    raise ValueError(f"Unknown compression codec id {codec}")
+
+
+def _decompressor(codec: int):
+    """Incremental decompressor for codec, or None for uncompressed payloads."""
+    if codec == CODECS["none"]:
+        return None
+    if codec == CODECS["zlib"]:
+        return zlib.decompressobj()
+    if codec == CODECS["lzma"]:
+        return lzma.LZMADecompressor()
+    if codec == CODECS["bz2"]:
+        return bz2.BZ2Decompressor()
+    if codec == CODECS["zstd"]:
+        return _zstandard().ZstdDecompressor().decompressobj()
+    raise ValueError(f"Unknown compression codec id {codec} (payload from a newer Synapse?)")
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("zstd compression requires: pip install zstandard")
+    return zstandard
+
+
+def _header_size(version: int) -> int:
+    if version == 1:
+        return HEADER_BYTES
+    return _PREFIX.size + _HEADER_LAYOUTS[version][0].size
 
 
 class SynapseInjector:
     """Hides and extracts encrypted byte payloads in LoRA weight tensors."""
 
-    def __init__(self, key: str):
+    def __init__(
+        self,
+        key: str,
+        version: int = FORMAT_VERSION,
+        compression: str = "zlib",
+        level: int = 6,
+        ecc: str = "rs",
+        embedding: str = "scale",
+        legacy: bool = True,
+    ):
+        """
+        Args:
+            key: The secret key.
+            version: Payload format version to write. Reading detects the version.
+            compression: "zlib" (default), "lzma", "bz2", "zstd" or "none".
+                         Only v4+ headers can record a codec; older versions
+                         are always written uncompressed.
+            level: Codec compression level.
+            ecc: Error-correcting code for the payload body: "rs" (default),
+                 "rep3" or "none". Versions before v5 always use "rep3".
+            embedding: "scale" (default) stores each bit as the parity of
+                       round(w * SCALE), moving a weight by up to 1/SCALE.
+                       "mantissa" sets the lowest bit of the stored float
+                       directly (1 ulp) — exact on any float dtype, but the
+                       carrier must be saved without re-casting. v6+ only.
+                       fp16/bf16 carriers always get "mantissa": their ulp
+                       is far coarser than 1/SCALE.
+            legacy: Fall back to reading a v1 payload when no versioned
+                    header matches. v1 slots need a full shuffle of the
+                    carrier, so a wrong key costs O(weights) instead of a
+                    few hundred slot reads; pass False where arbitrary keys
+                    are tried (e.g. a server) and v1 carriers are not used.
+        """
+        if version != 1 and version not in _HEADER_LAYOUTS:
+            raise ValueError(f"Unsupported payload format version: {version}")
+        if compression not in CODECS:
+            raise ValueError(f"Unknown compression {compression!r}. Choose from: {', '.join(CODECS)}")
+        if ecc not in ECCS:
+            raise ValueError(f"Unknown error correction {ecc!r}. Choose from: {', '.join(ECCS)}")
+        if embedding not in EMBEDDINGS:
+            raise ValueError(f"Unknown embedding {embedding!r}. Choose from: {', '.join(EMBEDDINGS)}")
         self.key = key
+        self.version = version
+        self.compression = compression if version >= 4 else "none"
+        self.level = level
+        self.ecc = ECCS[ecc if version >= 5 else "rep3"]
+        self.embedding = EMBEDDINGS[embedding] if version >= 6 else EMBED_SCALE
+        self.legacy = legacy
         self._seed = self._key_to_seed(key)
+        self._slot_key = hashlib.sha256(b"synapse-slots:" + key.encode()).digest()
+        self._cipher_key = hashlib.sha256(b"synapse-keystream:" + key.encode()).digest()
+        self._mac_key = hashlib.sha256(b"synapse-mac:" + key.encode()).digest()
+        self.cipher = CIPHER_SHAKE_CTR if version >= 3 else CIPHER_SHA256_CHAIN
+        self._tenant_tag = hashlib.sha256(b"synapse-tenant:" + key.encode()).digest()[:4]
+        self._probe_key = b"synapse-entry:" + key.encode()
+        self._legacy_space: Optional[ShuffledSlots] = None
         self._keystream_cache: dict[int, bytes] = {}
 
     # ------------------------------------------------------------------
     # Public file-level API
     # ------------------------------------------------------------------
 
-    def inject_file(self, lora_path: str, payload: bytes, output_path: str):
-        """Load weights from file, inject payload, save result."""
-        weights = self._load_weights(lora_path)
-        encrypted = self._encrypt(payload)
-        header = struct.pack(">I", len(encrypted))
-        full_payload = header + encrypted
-        modified = self._inject_bits(weights, full_payload)
-        self._save_weights(modified, lora_path, output_path)
-
-    def extract_file(self, lora_path: str) -> bytes:
-        """Load weights from file, extract and decrypt payload."""
-        weights = self._load_weights(lora_path)
-        # First extract just the header to get payload length
-        header_bytes = self._extract_bits(weights, HEADER_BYTES)
-        payload_length = struct.unpack(">I", header_bytes)[0]
-        if payload_length == 0 or payload_length > len(weights) // (8 * REPETITION):
-            raise ValueError("No valid payload found (wrong key or no payload injected).")
-        # Extract full payload
-        full_bytes = self._extract_bits(weights, HEADER_BYTES + payload_length)
-        encrypted = full_bytes[HEADER_BYTES:]
-        return self._decrypt(encrypted)
+    def inject_file(
+        self,
+        lora_path: str,
+        payload: bytes,
+        output_path: str,
+        in_place: bool = False,
+        shared: bool = False,
+        tensors: Optional[str] = None,
+    ):
+        """
+        Load weights from file, inject payload, save result.
+
+        Memory-mappable carriers (.safetensors, raw float32) are patched
+        surgically — only the touched weights are written. By default the
+        patch goes into a clone of the carrier (a reflink where the
+        filesystem supports it) that is atomically renamed over output_path.
+        With in_place=True and output_path == lora_path the file is patched
+        directly, with no copy at all; if the write fails, the weights it
+        touched are restored from an undo log.
+
+        With shared=True the payload goes into this key's own extents of a
+        shared carrier (see synapse/engine/directory.py), leaving other
+        keys' payloads intact. The directory is created on first use; once
+        a carrier has one, every injection into it is shared.
+
+        tensors is a selection policy (comma-separated globs over tensor
+        names, e.g. "*lora_B*"; see synapse/engine/selection.py). It is
+        recorded in the output's metadata, so extraction reads only the
+        matching tensors without being told. Without it the carrier's
+        recorded policy, if any, is kept. Changing a carrier's policy moves
+        every slot, so payloads already in it are lost; it also means the
+        header is rewritten, so the file is copied even with in_place=True.
+        """
+        def embed(weights):
+            injector = self._for_carrier(weights)
+            injector._embed(weights, injector._pack(payload), in_place=True, shared=shared)
+
+        self._patch_file(lora_path, output_path, in_place, embed, tensors)
+
+    @classmethod
+    def inject_many(
+        cls,
+        lora_path: str,
+        jobs: list[tuple[str, bytes]],
+        output_path: str,
+        in_place: bool = False,
+        tensors: Optional[str] = None,
+        **options,
+    ):
+        """
+        Inject several (key, payload) pairs with one carrier load and one save.
+
+        Payloads go into a shared carrier (see inject_file), so every key
+        can later be extracted on its own. A key listed twice keeps its last
+        payload. tensors is a selection policy as in inject_file. options
+        are passed to each SynapseInjector (version, compression, level, ecc).
+        """
+        injectors = [(cls(k, **options), p) for k, p in jobs]
+
+        def embed(weights):
+            packed = [(inj, inj._pack(p)) for inj, p in ((i._for_carrier(weights), p) for i, p in injectors)]
+            for inj, data in packed:
+                inj._embed(weights, data, in_place=True, shared=True)
+
+        cls._patch_file(lora_path, output_path, in_place, embed, tensors)
+
+    @classmethod
+    def _patch_file(cls, lora_path: str, output_path: str, in_place: bool, embed, tensors: Optional[str] = None):
+        """
+        Open the carrier once, let embed() modify its weights in place, save
+        once. A tensor selection policy, if given, replaces the carrier's
+        recorded one before the weights are opened.
+        """
+        fmt = cls._carrier_format(lora_path)
+        tensors = normalize_policy(tensors)
+        if tensors is not None and fmt == "raw":
+            raise ValueError("Tensor selection needs named tensors: use a .safetensors or .pt carrier.")
+        recorded = cls._recorded_selection(lora_path)
+        if fmt == "torch":
+            selection = tensors or recorded
+            obj, weights = cls._open_torch(lora_path, selection)
+            embed(weights)
+            cls._save_torch(obj, output_path, selection)
+            return
+
+        # A new policy grows the JSON header, so the data has to move
+        retag = tensors is not None and tensors != recorded
+        if in_place and not retag and os.path.abspath(output_path) == os.path.abspath(lora_path):
+            with cls._map_weights(lora_path, mode="r+") as weights:
+                chain = weights if isinstance(weights, WeightChain) else WeightChain([weights])
+                # No copy to fall back on: a failed write is undone slot by slot
+                with chain.journaled():
+                    embed(chain)
+            return
+
+        tmp = f"{output_path}.tmp"
+        try:
+            if retag:
+                with SafetensorsFile(lora_path) as st:
+                    st.save(tmp, metadata={**st.metadata, SELECTION_KEY: tensors})
+            else:
+                clone_file(lora_path, tmp)
+            with cls._map_weights(tmp, mode="r+") as weights:
+                embed(weights)
+            os.replace(tmp, output_path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+    def extract_file(self, lora_path: str, workers: int = 1) -> bytes:
+        """
+        Load weights from file, extract and decrypt payload. With workers > 1,
+        memory-mappable carriers are decoded by a pool of worker processes.
+        """
+        return b"".join(self.iter_extract_file(lora_path, CHUNK_BYTES * max(1, workers), workers))
+
+    def iter_extract_file(
+        self, lora_path: str, chunk_bytes: int = CHUNK_BYTES, workers: int = 1
+    ) -> Iterator[bytes]:
+        """
+        Like extract_file, but yields decrypted blocks of up to chunk_bytes as
+        they are decoded. The header is validated before the first block, so
+        a wrong key fails on the first next(). Peak memory is one block.
+
+        workers > 1 splits each block across that many processes (see
+        synapse/engine/parallel.py). Torch carriers are unpickled into this
+        process, so they are always decoded here.
+        """
+        if self._carrier_format(lora_path) == "torch":
+            yield from self._iter_unpack(self._open_torch(lora_path)[1], chunk_bytes)
+            return
+        with self._map_weights(lora_path) as weights:
+            if workers <= 1:
+                yield from self._iter_unpack(weights, chunk_bytes)
+                return
+            from synapse.engine.parallel import ParallelDecoder
+            with ParallelDecoder(lora_path, workers) as decoder:
+                yield from self._iter_unpack(weights, chunk_bytes, decoder)
+
+    @classmethod
+    def extract_many(cls, lora_path: str, keys: list[str], workers: int = 1) -> dict[str, bytes]:
+        """
+        Extract the payload of every key from one carrier load.
+        Returns {key: payload}; raises ValueError naming the first key
+        without a payload.
+        """
+        def unpack_all(weights, decoder=None):
+            results = {}
+            for key in dict.fromkeys(keys):
+                try:
+                    results[key] = b"".join(
+                        cls(key)._iter_unpack(weights, CHUNK_BYTES * max(1, workers), decoder)
+                    )
+                except ValueError as e:
+                    raise ValueError(f"Key {key!r}: {e}") from e
+            return results
+
+        if cls._carrier_format(lora_path) == "torch":
+            return unpack_all(cls._open_torch(lora_path)[1])
+        with cls._map_weights(lora_path) as weights:
+            if workers <= 1:
+                return unpack_all(weights)
+            from synapse.engine.parallel import ParallelDecoder
+            with ParallelDecoder(lora_path, workers) as decoder:
+                return unpack_all(weights, decoder)
+
+    def inject_segments(
+        self,
+        lora_path: str,
+        segments: dict[str, bytes],
+        output_path: str,
+        in_place: bool = False,
+        tensors: Optional[str] = None,
+    ):
+        """
+        Write a segmented payload (v8): each name → data pair becomes its
+        own versioned segment (see synapse/engine/segments.py), replacing
+        any payload this key had. extract_file returns the segments joined
+        in this order, extract_segments returns them by name, and
+        update_segments rewrites only the ones that change.
+        """
+        self._patch_file(
+            lora_path, output_path, in_place,
+            lambda weights: self._for_carrier(weights)._write_segments(weights, segments, fresh=True),
+            tensors,
+        )
+
+    def update_segments(
+        self,
+        lora_path: str,
+        changes: dict[str, Optional[bytes]],
+        output_path: str,
+        in_place: bool = False,
+    ):
+        """
+        Apply changes to a segmented payload: name → bytes writes a new
+        version of that segment (new names are appended), name → None
+        deletes it. Only the changed segments' slots and the manifest are
+        written; with in_place=True on a mappable carrier that is all the
+        I/O there is.
+        """
+        self._patch_file(
+            lora_path, output_path, in_place,
+            lambda weights: self._for_carrier(weights)._write_segments(weights, changes),
+        )
+
+    def extract_segments(self, lora_path: str) -> dict[str, bytes]:
+        """The latest version of every segment of a segmented payload, by name, in order."""
+        def read_all(weights):
+            space, manifest = self._read_manifest(weights)
+            return {
+                name: b"".join(self._iter_segment(weights, space, manifest, name, CHUNK_BYTES))
+                for name in manifest.segments
+            }
+
+        if self._carrier_format(lora_path) == "torch":
+            return read_all(self._open_torch(lora_path)[1])
+        with self._map_weights(lora_path) as weights:
+            return read_all(weights)
 
     # ------------------------------------------------------------------
     # In-memory tensor API (for programmatic use)
     # ------------------------------------------------------------------
 
-    def hide(self, weights: list[float], data: bytes) -> list[float]:
-        """Hide data in a list of floats. Returns modified list."""
-        encrypted = self._encrypt(data)
-        header = struct.pack(">I", len(encrypted))
-        full_payload = header + encrypted
-        return self._inject_bits(weights, full_payload)
+    def hide(
+        self, weights: Union[list[float], np.ndarray], data: bytes, shared: bool = False
+    ) -> Union[list[float], np.ndarray]:
+        """Hide data in a list or array of floats. Returns a modified copy of the same kind."""
+        injector = self._for_carrier(weights)
+        modified = injector._embed(weights, injector._pack(data), shared=shared)
+        return modified.tolist() if isinstance(weights, list) else modified
 
-    def extract(self, weights: list[float], num_bytes: int) -> bytes:
-        """Extract num_bytes of hidden data from a list of floats."""
-        full_bytes = self._extract_bits(weights, HEADER_BYTES + num_bytes)
-        encrypted = full_bytes[HEADER_BYTES:]
-        return self._decrypt(encrypted)
+    def extract(self, weights: Union[list[float], np.ndarray], num_bytes: int) -> bytes:
+        """Extract the first num_bytes of hidden data from a list or array of floats."""
+        out = bytearray()
+        for block in self._iter_unpack(weights, CHUNK_BYTES):
+            out += block
+            if len(out) >= num_bytes:
+                break
+        return bytes(out[:num_bytes])
 
-    def extract_auto(self, weights: list[float]) -> bytes:
+    def extract_auto(self, weights: Union[list[float], np.ndarray]) -> bytes:
         """Auto-detect payload length from header and extract."""
-        header_bytes = self._extract_bits(weights, HEADER_BYTES)
-        payload_length = struct.unpack(">I", header_bytes)[0]
-        max_payload = (len(weights) // (8 * REPETITION)) - HEADER_BYTES
-        if payload_length == 0 or payload_length > max_payload:
+        return self._unpack(weights)
+
+    # ------------------------------------------------------------------
+    # Payload framing
+    # ------------------------------------------------------------------
+
+    def _pack(self, data: bytes, layout: int = LAYOUT_PLAIN) -> tuple[bytes, bytes]:
+        """
+        Compress, encrypt and ECC-encode data. Returns (header, body): the
+        header is written with repetition-3, the body with self.ecc.
+        """
+        if layout != LAYOUT_PLAIN and self.version < 8:
+            raise ValueError("Segmented payloads need format v8 or later.")
+        codec = CODECS[self.compression]
+        if codec != CODECS["none"]:
+            compressed = _compress(codec, self.level, data)
+            # Incompressible data is stored as-is rather than grown
+            if len(compressed) < len(data):
+                data = compressed
+            else:
+                codec = CODECS["none"]
+        encrypted = self._encrypt(data, cipher=self.cipher)
+        if self.version == 1:
+            return struct.pack(">I", len(encrypted)), self.ecc.encode(encrypted)
+        fields_struct, names = _HEADER_LAYOUTS[self.version]
+        fields = {
+            "cipher": self.cipher, "codec": codec, "level": self.level, "ecc": self.ecc.id,
+            "embedding": self.embedding, "layout": layout, "length": len(encrypted), "mac": b"",
+        }
+        header = _PREFIX.pack(MAGIC, self.version) + fields_struct.pack(*(fields[n] for n in names))
+        if self.version >= 7:
+            header = header[:-HEADER_MAC_BYTES] + self._header_mac(header[:-HEADER_MAC_BYTES])
+            mac = self._payload_mac(header)
+            mac.update(encrypted)
+            encrypted += mac.digest()[:PAYLOAD_MAC_BYTES]
+        return header, self.ecc.encode(encrypted)
+
+    def _unpack(self, weights) -> bytes:
+        """Read the header, then extract and decrypt the payload body."""
+        return b"".join(self._iter_unpack(weights, CHUNK_BYTES))
+
+    def _iter_unpack(self, weights, chunk_bytes: int, decoder=None, space=None) -> Iterator[bytes]:
+        """
+        Read the header, then yield the payload block by block. Blocks are
+        chunk_bytes of the stored (possibly compressed) stream; compressed
+        payloads are inflated incrementally as each block is decrypted.
+        A ParallelDecoder, if given, decodes the body blocks. A segmented
+        payload is reassembled: each segment's latest version, in order.
+        space pins the slot space (default: this key's own).
+        """
+        if isinstance(weights, list):
+            weights = np.asarray(weights)
+        header, space = self._read_header(weights, space if space is not None else self._shared_space(weights))
+        body = self._iter_body(weights, header, space, chunk_bytes, decoder)
+        if header["layout"] == LAYOUT_PLAIN:
+            yield from body
+            return
+        if header["layout"] == LAYOUT_SHARD:
+            raise ValueError("This carrier holds one shard of a sharded payload; extract it with all its files.")
+        if header["layout"] != LAYOUT_SEGMENTED:
+            raise ValueError(f"Unknown payload layout {header['layout']} (payload from a newer Synapse?)")
+        manifest = SegmentManifest.from_bytes(b"".join(body))
+        for name in manifest.segments:
+            yield from self._iter_segment(weights, space, manifest, name, chunk_bytes, decoder)
+
+    def _iter_body(self, weights, header: dict, space, chunk_bytes: int, decoder=None) -> Iterator[bytes]:
+        """Decode, authenticate, decrypt and inflate the body behind a parsed header."""
+        ecc = ECCS_BY_ID.get(header["ecc"])
+        if ecc is None:
+            raise ValueError(f"Unknown error correction id {header['ecc']} (payload from a newer Synapse?)")
+        body_start = header["size"] * 8 * REPETITION
+        payload_length = header["length"]
+        # v7 bodies end with a payload MAC, read after the ciphertext
+        mac = self._payload_mac(header["raw"]) if header["version"] >= 7 else None
+        stored_length = payload_length + (PAYLOAD_MAC_BYTES if mac else 0)
+        max_payload = ecc.max_data(max(0, len(space) - body_start) // (8 * ecc.repetition))
+        if payload_length == 0 or stored_length > max_payload:
             raise ValueError(
                 f"Invalid payload length {payload_length} (wrong key or no payload). "
                 f"Max for this weight file: {max_payload} bytes."
             )
-        return self.extract(weights, payload_length)
+        extract = self._extract_bits
+        # Legacy slots are one big shuffled table — not worth shipping to workers
+        if decoder is not None and not isinstance(space, ShuffledSlots):
+            extract = decoder.extract_bits
+        inflater = _decompressor(header["codec"])
+        # Blocks are whole ECC units, so each one decodes on its own
+        step = max(ecc.unit, chunk_bytes - chunk_bytes % ecc.unit)
+        tag = b""
+        for pos in range(0, stored_length, step):
+            n = min(step, stored_length - pos)
+            stored_pos = ecc.encoded_size(pos)
+            stored = extract(
+                weights, space, ecc.encoded_size(pos + n) - stored_pos,
+                start=body_start + stored_pos * 8 * ecc.repetition, repetition=ecc.repetition,
+                embedding=header["embedding"],
+            )
+            encrypted = ecc.decode(stored, n)
+            if mac is not None:
+                cut = max(0, payload_length - pos)
+                encrypted, tag = encrypted[:cut], tag + encrypted[cut:]
+                mac.update(encrypted)
+            if not encrypted:
+                continue
+            block = self._decrypt(encrypted, offset=pos, cipher=header["cipher"])
+            if inflater is not None:
+                block = inflater.decompress(block)
+            if block:
+                yield block
+        if mac is not None and not hmac.compare_digest(mac.digest()[:PAYLOAD_MAC_BYTES], tag):
+            raise ValueError("Payload failed its integrity check (corrupt carrier).")
+        if inflater is not None:
+            tail = inflater.flush() if hasattr(inflater, "flush") else b""
+            if tail:
+                yield tail
+            if not getattr(inflater, "eof", True):
+                raise ValueError("Compressed payload is truncated or corrupt.")
+
+    def _read_header(self, weights, space=None) -> tuple[dict, object]:
+        """
+        Decode the payload header and return it with the slot space the
+        payload lives in. Versioned headers are tried first — they only
+        touch a few hundred slots. A v7 header whose MAC does not verify
+        means a wrong key, and is rejected right there. On a plain carrier,
+        anything without MAGIC (in either embedding) is treated as a legacy
+        v1 layout, if self.legacy allows.
+        """
+        primary = space if space is not None else KeyedPermutation(self._slot_key, len(weights))
+        if len(primary) >= _PREFIX.size * 8 * REPETITION:
+            for embedding in (EMBED_SCALE, EMBED_MANTISSA):
+                prefix = self._extract_bits(weights, primary, _PREFIX.size, embedding=embedding)
+                magic, version = _PREFIX.unpack(prefix)
+                if magic != MAGIC or version not in _HEADER_LAYOUTS:
+                    continue
+                layout, names = _HEADER_LAYOUTS[version]
+                raw = prefix + self._extract_bits(
+                    weights, primary, layout.size, start=_PREFIX.size * 8 * REPETITION, embedding=embedding
+                )
+                header = {**_HEADER_DEFAULTS, **dict(zip(names, layout.unpack(raw[_PREFIX.size:])))}
+                if version >= 7 and not hmac.compare_digest(
+                    header["mac"], self._header_mac(raw[:-HEADER_MAC_BYTES])
+                ):
+                    raise ValueError("Wrong key: payload header failed authentication.")
+                if header["embedding"] != embedding:
+                    continue
+                header.update(version=version, size=_header_size(version), raw=raw)
+                return header, primary
+        if space is not None or not self.legacy:
+            raise ValueError("No valid payload found (wrong key or no payload injected).")
+
+        legacy = self._shuffled_space(len(weights))
+        (length,) = struct.unpack(">I", self._extract_bits(weights, legacy, HEADER_BYTES))
+        return {**_HEADER_DEFAULTS, "version": 1, "size": HEADER_BYTES, "length": length}, legacy
+
+    # ------------------------------------------------------------------
+    # Shared carriers (slot directory)
+    # ------------------------------------------------------------------
+
+    def _open_directory(self, weights) -> Optional[SlotDirectory]:
+        """The carrier's slot directory, or None if it is not a shared carrier."""
+        try:
+            layout = DirectoryLayout(len(weights), 8 * REPETITION)
+        except ValueError:
+            return None
+        table = layout.table_space()
+        for embedding in (EMBED_SCALE, EMBED_MANTISSA):
+            if self._extract_bits(weights, table, len(DIRECTORY_MAGIC), embedding=embedding) == DIRECTORY_MAGIC:
+                raw = self._extract_bits(weights, table, layout.table_bytes, embedding=embedding)
+                return SlotDirectory.from_bytes(layout, raw, embedding=embedding)
+        return None
+
+    def _find_entry(self, weights, directory: SlotDirectory) -> Optional[tuple[int, int, int]]:
+        """(entry index, first extent, extent count) for this key, if it has one."""
+        layout = directory.layout
+        for index in layout.probe_order(self._probe_key):
+            if not directory.entries[index]:
+                return None
+            raw = self._extract_bits(weights, layout.entry_space(index), ENTRY.size, embedding=directory.embedding)
+            tag, first, count = ENTRY.unpack(self._entry_cipher(raw, index))
+            if tag == self._tenant_tag and count and first + count <= layout.n_extents:
+                return index, first, count
+        return None
+
+    def _shared_space(self, weights) -> Optional[SlotRegion]:
+        """This key's extents on a shared carrier; None on a plain carrier."""
+        directory = self._open_directory(weights)
+        if directory is None:
+            return None
+        found = self._find_entry(weights, directory)
+        if found is None:
+            raise ValueError("No payload for this key in the shared carrier.")
+        _, first, count = found
+        return directory.layout.extent_space(first, count, self._slot_key)
+
+    def _claim_shared_space(self, weights, num_slots: int) -> SlotRegion:
+        """
+        Allocate (or re-allocate) this key's extents for num_slots slots,
+        and write its directory entry and the updated table.
+        """
+        directory = self._open_directory(weights)
+        if directory is None:
+            directory = SlotDirectory.empty(DirectoryLayout(len(weights), 8 * REPETITION), self.embedding)
+        layout = directory.layout
+
+        found = self._find_entry(weights, directory)
+        if found is not None:
+            index, first, count = found
+            directory.release(first, count)
+        else:
+            free = [i for i in layout.probe_order(self._probe_key) if not directory.entries[i]]
+            if not free:
+                raise ValueError(f"Shared carrier directory is full ({layout.n_entries} keys).")
+            index = free[0]
+
+        count = layout.extents_for(num_slots)
+        first = directory.allocate(count)
+        directory.entries[index] = True
+
+        entry = self._entry_cipher(ENTRY.pack(self._tenant_tag, first, count), index)
+        self._inject_bits(weights, layout.entry_space(index), entry, embedding=directory.embedding)
+        self._inject_bits(weights, layout.table_space(), directory.to_bytes(), embedding=directory.embedding)
+        return layout.extent_space(first, count, self._slot_key)
+
+    def _header_mac(self, header: bytes) -> bytes:
+        return hmac.new(self._mac_key, b"header:" + header, hashlib.sha256).digest()[:HEADER_MAC_BYTES]
+
+    def _payload_mac(self, header: bytes):
+        """Running MAC over the ciphertext, bound to the (authenticated) header."""
+        return hmac.new(self._mac_key, b"payload:" + header, hashlib.sha256)
+
+    def _entry_cipher(self, data: bytes, index: int) -> bytes:
+        """Encrypt/decrypt a directory entry (keystream unique to key + entry index)."""
+        keystream = hashlib.shake_256(self._cipher_key + b"entry" + index.to_bytes(4, "big")).digest(len(data))
+        return bytes(a ^ b for a, b in zip(data, keystream))
+
+    # ------------------------------------------------------------------
+    # Segmented payloads
+    # ------------------------------------------------------------------
+
+    def _read_manifest(self, weights) -> tuple[object, SegmentManifest]:
+        """
+        This key's slot space and segment manifest (ValueError if the payload
+        is not segmented). Segmented payloads are v8+, so the probe stays in
+        the keyed permutation and never falls back to the v1 full shuffle.
+        """
+        header, space = self._read_header(weights, KeyedPermutation(self._slot_key, len(weights)))
+        if header["layout"] != LAYOUT_SEGMENTED:
+            raise ValueError("This key's payload is not segmented; write it with inject_segments first.")
+        return space, SegmentManifest.from_bytes(b"".join(self._iter_body(weights, header, space, CHUNK_BYTES)))
+
+    def _write_segments(self, weights, changes: dict[str, Optional[bytes]], fresh: bool = False):
+        """
+        Write new segment versions (None deletes), then the manifest. With
+        fresh=True the manifest starts empty — but keeps counting from any
+        previous manifest's generation, so keystreams are never reused.
+        """
+        if self.version < 8:
+            raise ValueError("Segmented payloads need format v8 or later.")
+        # Segments and their manifest span the key's whole permutation
+        if self._open_directory(weights) is not None:
+            raise ValueError("Segmented payloads need a carrier of their own; this one is shared by several keys.")
+        if fresh:
+            space = self._space(len(weights))
+            manifest = SegmentManifest(len(space) - manifest_slots(len(space)))
+            try:
+                manifest.generation = self._read_manifest(weights)[1].generation
+            except ValueError:
+                pass
+        else:
+            space, manifest = self._read_manifest(weights)
+        reserved = manifest_slots(len(space))
+
+        for name, data in changes.items():
+            if data is None:
+                if manifest.segments.pop(name, None) is None:
+                    raise ValueError(f"No segment named {name!r}.")
+                continue
+            if not data:
+                raise ValueError(f"Segment {name!r} is empty; delete it instead.")
+            generation = manifest.next_generation()
+            injector = self._segment_injector(generation)
+            packed = injector._pack(data)
+            required = injector._required_slots(packed)
+            old = manifest.segments.get(name)
+            if old is not None and old.count >= required:
+                start, count = old.start, old.count     # rewrite in place
+            else:
+                count = run_slots(required)
+                start = manifest.allocate(count, exclude=name)
+            manifest.segments[name] = Segment(old.version + 1 if old else 1, generation, start, count)
+            injector._embed(weights, packed, in_place=True, space=SlotRegion(space, reserved + start, count))
+
+        packed = self._pack(manifest.to_bytes(), layout=LAYOUT_SEGMENTED)
+        if self._required_slots(packed) > reserved:
+            raise ValueError(f"Segment manifest is too large for this carrier ({len(manifest.segments)} segments).")
+        self._embed(weights, packed, in_place=True, space=SlotRegion(space, 0, reserved))
+
+    def _iter_segment(
+        self, weights, space, manifest: SegmentManifest, name: str, chunk_bytes: int, decoder=None
+    ) -> Iterator[bytes]:
+        entry = manifest.segments[name]
+        region = SlotRegion(space, manifest_slots(len(space)) + entry.start, entry.count)
+        try:
+            yield from self._segment_injector(entry.generation)._iter_unpack(weights, chunk_bytes, decoder, region)
+        except ValueError as e:
+            raise ValueError(f"Segment {name!r}: {e}") from e
+
+    def _segment_injector(self, generation: int) -> "SynapseInjector":
+        """Injector for one segment generation: its own keystream, MACs and slot order."""
+        embedding = next(name for name, mode in EMBEDDINGS.items() if mode == self.embedding)
+        return SynapseInjector(
+            f"{self.key}\x00segment:{generation}", version=self.version, compression=self.compression,
+            level=self.level, ecc=self.ecc.name, embedding=embedding, legacy=False,
+        )
 
     # ------------------------------------------------------------------
     # Bit-level encoding / decoding
     # ------------------------------------------------------------------
 
-    def _inject_bits(self, weights: list[float], payload: bytes) -> list[float]:
-        bits = self._bytes_to_bits(payload)
-        # With repetition code, each bit takes REPETITION slots
-        required = len(bits) * REPETITION
-        if required > len(weights):
+    def _space(self, num_weights: int):
+        """Slot space a plain (non-shared) payload is written to."""
+        if self.version == 1:
+            return self._shuffled_space(num_weights)
+        return KeyedPermutation(self._slot_key, num_weights)
+
+    def _shuffled_space(self, num_weights: int) -> ShuffledSlots:
+        # v1 layout: a full shuffle of the weight space, computed once per injector
+        if self._legacy_space is None or len(self._legacy_space) != num_weights:
+            self._legacy_space = ShuffledSlots(self._seed, num_weights)
+        return self._legacy_space
+
+    def _for_carrier(self, weights) -> "SynapseInjector":
+        """
+        This injector, or a copy that embeds in the mantissa when the
+        carrier stores fp16/bf16: at their precision SCALE parity could
+        only be forced by moving weights several ulps.
+        """
+        if self.embedding != EMBED_SCALE or storage_bits(weights) >= 32:
+            return self
+        if self.version < 6:
+            raise ValueError(
+                f"Format v{self.version} only embeds SCALE parity, which fp16/bf16 carriers "
+                f"cannot hold; write v6 or later."
+            )
+        fitted = copy.copy(self)
+        fitted.embedding = EMBED_MANTISSA
+        return fitted
+
+    def _embed(
+        self, weights, packed: tuple[bytes, bytes], in_place: bool = False, shared: bool = False, space=None
+    ):
+        """
+        Write a packed payload into weights (a copy unless in_place) and
+        return them. space pins the slot space (default: this key's own).
+        """
+        if not in_place:
+            weights = np.array(weights, copy=True)
+            if weights.dtype.kind != "f":
+                weights = weights.astype(np.float64)
+        header, body = packed
+        body_start = len(header) * 8 * REPETITION
+        required = self._required_slots(packed)
+        if space is None:
+            # A carrier that already has a slot directory stays shared: a
+            # whole-carrier write would overwrite the other keys' extents
+            if shared or self._open_directory(weights) is not None:
+                space = self._claim_shared_space(weights, required)
+            else:
+                space = self._space(len(weights))
+        if required > len(space):
             raise ValueError(
-                f"Payload too large: needs {required} weights, have {len(weights)}. "
-                f"Max payload: {len(weights) // (8 * REPETITION)} bytes."
+                f"Payload too large: needs {required} weights, have {len(space)}. "
+                f"Max payload: {self.capacity_bytes(len(space), self.version, self.ecc.name)} bytes."
             )
+        self._inject_bits(weights, space, header, embedding=self.embedding)
+        self._inject_bits(
+            weights, space, body, start=body_start, repetition=self.ecc.repetition, embedding=self.embedding
+        )
+        return weights
+
+    def _required_slots(self, packed: tuple[bytes, bytes]) -> int:
+        header, body = packed
+        return len(header) * 8 * REPETITION + len(body) * 8 * self.ecc.repetition
+
+    def _inject_bits(
+        self,
+        weights,
+        space,
+        payload: bytes,
+        start: int = 0,
+        repetition: int = REPETITION,
+        embedding: int = EMBED_SCALE,
+    ):
+        """Write payload into weights (in place) from slot position start of space."""
+        # With repetition code, each bit takes `repetition` slots
+        required = len(payload) * 8 * repetition
+        if start + required > len(space):
+            raise ValueError(f"Payload too large: needs {start + required} weights, have {len(space)}.")
+        if required > WINDOW_SLOTS and hasattr(space, "inverse"):
+            self._inject_windowed(weights, space, payload, start, repetition, embedding)
+            return
+
+        slots = space.slots(start, required)
+        targets = np.repeat(self._bytes_to_bits(payload), repetition)
+        self._write_bits(weights, slots, targets, embedding)
+
+    def _inject_windowed(self, weights, space, payload: bytes, start: int, repetition: int, embedding: int):
+        """
+        Out-of-core _inject_bits for payloads whose slot list would not fit
+        in memory. Instead of walking the payload (random carrier order),
+        walk the carrier: each window of WINDOW_SLOTS weights is mapped back
+        to slot positions (space.inverse), the positions that carry a
+        payload bit are picked out, and those weights are patched in
+        ascending order. A mapped carrier is read and written in one
+        sequential pass; peak memory is one window plus the payload bytes.
+        """
+        data = np.frombuffer(payload, dtype=np.uint8)
+        end = start + len(data) * 8 * repetition
+        for lo in range(0, len(weights), WINDOW_SLOTS):
+            idx = np.arange(lo, min(lo + WINDOW_SLOTS, len(weights)), dtype=np.int64)
+            positions = space.inverse(idx)
+            hit = (positions >= start) & (positions < end)
+            if not hit.any():
+                continue
+            bit = (positions[hit] - start) // repetition
+            targets = (data[bit >> 3] >> (bit & 7).astype(np.uint8)) & 1
+            self._write_bits(weights, idx[hit], targets, embedding)
+
+    def _write_bits(self, weights, slots: np.ndarray, targets: np.ndarray, embedding: int):
+        """Store one bit per slot, in the given embedding."""
+        if embedding == EMBED_MANTISSA:
+            write_lsb(weights, slots, targets)
+            return
+
+        # Gather → parity fix-up → scatter, all on arrays. The quantization is
+        # done in float64 so the result matches the original per-weight loop.
+        targets = targets.astype(np.int64)
+        scaled = np.rint(np.asarray(weights[slots], dtype=np.float64) * SCALE).astype(np.int64)
+        wrong = (scaled & 1) != targets
+        scaled[wrong] += 2 * targets[wrong] - 1
+        weights[slots] = scaled / SCALE
 
-        rng = np.random.default_rng(self._seed)
-        indices = np.arange(len(weights))
-        rng.shuffle(indices)
-
-        modified = list(weights)
-        slot = 0
-        for bit in bits:
-            for _ in range(REPETITION):
-                idx = int(indices[slot])
-                val = modified[idx]
-                scaled = int(round(val * SCALE))
-                if (scaled & 1) != bit:
-                    scaled = scaled + 1 if bit == 1 else scaled - 1
-                modified[idx] = scaled / SCALE
-                slot += 1
-
-        return modified
-
-    def _extract_bits(self, weights: list[float], num_bytes: int) -> bytes:
+        # Storage coarser than 1/SCALE (large f32 values; fp16/bf16 carriers
+        # use the mantissa, see _for_carrier) rounds some writes onto the
+        # wrong parity. For those, try the representable
+        # values k ulps either side of the stored one (k = 1, 2, ...) and keep
+        # the nearer with the right parity, within MAX_SCALE_ERROR of the
+        # intended value.
+        intended = scaled / SCALE
+        pending = np.flatnonzero(self._scale_parity(weights[slots]) != targets)
+        offset = np.zeros(pending.size, dtype=np.int64)    # ulps moved so far, per pending weight
+        for k in range(1, MAX_ULP_STEPS + 1):
+            if not pending.size:
+                return
+            idx = slots[pending]
+            goal = intended[pending]
+            tolerance = MAX_SCALE_ERROR * np.abs(goal)
+            best = np.full(pending.size, np.inf)
+            choice = np.zeros(pending.size, dtype=np.int64)
+            reachable = np.zeros(pending.size, dtype=bool)
+            for step in (k, -k):
+                step_ulp(weights, idx, step - offset)
+                offset[:] = step
+                values = weights[idx]
+                error = np.abs(values - goal)
+                reachable |= error <= tolerance
+                better = (error <= tolerance) & (error < best) & (self._scale_parity(values) == targets[pending])
+                best[better] = error[better]
+                choice[better] = step
+            done = np.isfinite(best)
+            step_ulp(weights, idx[done], choice[done] - offset[done])
+            pending, offset = pending[~done], offset[~done]
+            # Farther candidates only get worse
+            if not reachable[~done].any():
+                break
+        if pending.size:
+            raise ValueError(
+                f"{pending.size} weights cannot hold a SCALE parity bit within {MAX_SCALE_ERROR:.2%} "
+                f"at their precision; use embedding='mantissa' for this carrier."
+            )
+
+    @staticmethod
+    def _extract_bits(
+        weights,
+        space,
+        num_bytes: int,
+        start: int = 0,
+        repetition: int = REPETITION,
+        embedding: int = EMBED_SCALE,
+    ) -> bytes:
+        """Decode num_bytes from slot position start of space."""
         num_bits = num_bytes * 8
-        required = num_bits * REPETITION
+        required = num_bits * repetition
+        if start + required > len(space):
+            raise ValueError("No valid payload found (wrong key or no payload injected).")
 
-        rng = np.random.default_rng(self._seed)
-        indices = np.arange(len(weights))
-        rng.shuffle(indices)
+        slots = space.slots(start, required)
 
-        bits = []
-        slot = 0
-        for _ in range(num_bits):
-            votes = []
-            for _ in range(REPETITION):
-                idx = int(indices[slot])
-                val = weights[idx]
-                scaled = int(round(val * SCALE))
-                votes.append(scaled & 1)
-                slot += 1
-            # Majority vote for error correction
-            bits.append(1 if sum(votes) > REPETITION // 2 else 0)
+        if embedding == EMBED_MANTISSA:
+            raw = read_lsb(weights, slots)
+        else:
+            raw = SynapseInjector._scale_parity(weights[slots])
+        votes = raw.reshape(num_bits, repetition)
+        # Majority vote for error correction
+        bits = (votes.sum(axis=1) > repetition // 2).astype(np.uint8)
 
-        return self._bits_to_bytes(bits)
+        return SynapseInjector._bits_to_bytes(bits)
 
     # ------------------------------------------------------------------
     # Encryption (XOR with key-derived keystream)
     # ------------------------------------------------------------------
 
-    def _encrypt(self, data: bytes) -> bytes:
-        keystream = self._get_keystream(len(data))
-        return bytes(a ^ b for a, b in zip(data, keystream))
+    def _encrypt(self, data: bytes, offset: int = 0, cipher: int = CIPHER_SHA256_CHAIN) -> bytes:
+        """XOR data with the keystream starting `offset` bytes into it."""
+        if not data:
+            return b""
+        if cipher == CIPHER_SHAKE_CTR:
+            keystream = self._get_keystream_ctr(len(data), offset)
+        elif cipher == CIPHER_SHA256_CHAIN:
+            keystream = self._get_keystream(len(data), offset)
+        else:
+            raise ValueError(f"Unknown cipher id {cipher} (payload from a newer Synapse?)")
+        mixed = np.bitwise_xor(np.frombuffer(data, dtype=np.uint8), np.frombuffer(keystream, dtype=np.uint8))
+        return mixed.tobytes()
 
-    def _decrypt(self, data: bytes) -> bytes:
-        return self._encrypt(data)  # XOR is symmetric
+    def _decrypt(self, data: bytes, offset: int = 0, cipher: int = CIPHER_SHA256_CHAIN) -> bytes:
+        return self._encrypt(data, offset, cipher)  # XOR is symmetric
 
-    def _get_keystream(self, length: int) -> bytes:
+    def _get_keystream(self, length: int, offset: int = 0) -> bytes:
         """Generate a deterministic keystream from the key using SHA-256 chain."""
         result = bytearray()
-        counter = 0
-        while len(result) < length:
+        counter, skip = divmod(offset, 32)
+        while len(result) < skip + length:
             h = hashlib.sha256(f"{self.key}:{counter}".encode()).digest()
             result.extend(h)
             counter += 1
-        return bytes(result[:length])
+        return bytes(result[skip:skip + length])
+
+    def _get_keystream_ctr(self, length: int, offset: int = 0) -> bytes:
+        """
+        Counter-mode keystream: block i is SHAKE-256(cipher_key || i) squeezed
+        to KEYSTREAM_BLOCK bytes. One hash call per 64 KiB, and any offset is
+        reachable directly. Recent blocks are kept in a bounded LRU cache so
+        repeated unlocks with the same injector skip the hashing.
+        """
+        first = offset // KEYSTREAM_BLOCK
+        last = (offset + length - 1) // KEYSTREAM_BLOCK
+        parts = [self._keystream_block(i) for i in range(first, last + 1)]
+        skip = offset - first * KEYSTREAM_BLOCK
+        return b"".join(parts)[skip:skip + length]
+
+    def _keystream_block(self, index: int) -> bytes:
+        block = self._keystream_cache.pop(index, None)
+        if block is None:
+            block = hashlib.shake_256(self._cipher_key + index.to_bytes(8, "big")).digest(KEYSTREAM_BLOCK)
+            if len(self._keystream_cache) >= KEYSTREAM_CACHE_BLOCKS:
+                self._keystream_cache.pop(next(iter(self._keystream_cache)))
+        self._keystream_cache[index] = block
+        return block
 
     # ------------------------------------------------------------------
     # File I/O
     # ------------------------------------------------------------------
 
-    def _load_weights(self, path: str) -> list[float]:
-        """Load weights from .pt/.bin file or raw float list."""
-        p = Path(path)
-        suffix = p.suffix.lower()
+    @staticmethod
+    def _carrier_format(path: str) -> str:
+        """'safetensors', 'torch' (zip archive or legacy pickle) or 'raw' float32."""
+        if is_safetensors(path):
+            return "safetensors"
+        with open(path, "rb") as f:
+            head = f.read(4)
+        if head == b"PK\x03\x04" or head == b"\x80\x02\x8a\x0a":
+            return "torch"
+        return "raw"
+
+    @staticmethod
+    def _recorded_selection(path: str) -> Optional[str]:
+        """The tensor selection policy stored in a carrier's metadata, if any."""
+        fmt = SynapseInjector._carrier_format(path)
+        if fmt == "safetensors":
+            with SafetensorsFile(path) as st:
+                return normalize_policy(st.metadata.get(SELECTION_KEY))
+        if fmt == "torch":
+            return normalize_policy(read_torch_metadata(path).get(SELECTION_KEY))
+        return None
 
+    @staticmethod
+    @contextmanager
+    def _map_weights(path: str, mode: str = "r"):
+        """
+        Memory-map a .safetensors or raw float32 carrier as a flat weight
+        view — of just the selected tensors, if the carrier records a policy.
+        """
+        if is_safetensors(path):
+            with SafetensorsFile(path, mode=mode) as st:
+                yield st.weights(select_tensors(st.float_names(), st.metadata.get(SELECTION_KEY)))
+            return
+        weights = np.memmap(path, dtype=np.float32, mode=mode, shape=(os.path.getsize(path) // 4,))
         try:
-            import torch
-            obj = torch.load(path, map_location="cpu", weights_only=False)
-            if isinstance(obj, dict):
-                # LoRA state dict — flatten all tensors
-                all_weights = []
-                for v in obj.values():
-                    if hasattr(v, 'view'):
-                        all_weights.extend(v.view(-1).float().tolist())
-                return all_weights
-            elif hasattr(obj, 'view'):
-                return obj.view(-1).float().tolist()
-            else:
-                raise ValueError(f"Unexpected torch object type: {type(obj)}")
-        except ImportError:
-            pass
+            yield weights
+        finally:
+            if mode != "r":
+                weights.flush()
+            del weights
 
-        # Fallback: treat as raw binary float32
-        raw = p.read_bytes()
-        n = len(raw) // 4
-        return list(struct.unpack(f"{n}f", raw[:n * 4]))
+    @staticmethod
+    def _open_torch(path: str, tensors: Optional[str] = None) -> tuple[object, WeightChain]:
+        """
+        Load a .pt tensor or state dict once — memory-mapped where the file
+        format allows — and return it with a flat view over its floating
+        point tensors (those matching the tensors policy, or else the
+        carrier's recorded one). The view writes straight into the tensors'
+        storage in their own dtype (bf16 as raw uint16 bits), so nothing is
+        upcast or copied; with a mapped file only the touched pages are read.
 
-    def _save_weights(self, weights: list[float], original_path: str, output_path: str):
-        """Save modified weights back in the same format as the original."""
+        SynapseTrainer output keeps its tensors under "lora_weights" next to
+        a "synapse_meta" block; the view then covers only the stego region
+        that block reserves (see _reserved_region).
+        """
         try:
             import torch
-            original = torch.load(original_path, map_location="cpu", weights_only=False)
-            if isinstance(original, dict):
-                # Reconstruct state dict with modified weights
-                result = {}
-                offset = 0
-                for k, v in original.items():
-                    if hasattr(v, 'view'):
-                        n = v.numel()
-                        chunk = weights[offset:offset + n]
-                        result[k] = torch.tensor(chunk, dtype=v.dtype).view(v.shape)
-                        offset += n
-                    else:
-                        result[k] = v
-                torch.save(result, output_path)
-            else:
-                torch.save(torch.tensor(weights, dtype=original.dtype), output_path)
-            return
         except ImportError:
-            pass
+            raise ImportError(".pt carriers require PyTorch: pip install torch")
+        with open(path, "rb") as f:
+            # Only the zip serialization can be mapped (not legacy pickles)
+            zipped = f.read(4) == b"PK\x03\x04"
+        if tensors is None and zipped:
+            tensors = read_torch_metadata(path).get(SELECTION_KEY)
+        obj = torch.load(path, map_location="cpu", weights_only=False, mmap=zipped)
+
+        meta = None
+        if isinstance(obj, dict) and isinstance(obj.get("lora_weights"), dict):
+            if normalize_policy(tensors) is not None:
+                raise ValueError("Trainer carriers keep payloads in their reserved region; "
+                                 "tensor selection does not apply.")
+            items, meta = obj["lora_weights"], obj.get("synapse_meta") or {}
+        elif isinstance(obj, dict):
+            items = obj
+        elif torch.is_tensor(obj):
+            if normalize_policy(tensors) is not None:
+                raise ValueError("Tensor selection needs a state dict; this .pt holds a single tensor.")
+            items = {None: obj}
+        else:
+            raise ValueError(f"Unexpected torch object type: {type(obj)}")
+
+        floating = [n for n, t in items.items() if torch.is_tensor(t) and t.is_floating_point()]
+        parts, bf16 = [], []
+        for name in select_tensors(floating, tensors):
+            tensor = items[name]
+            if not tensor.is_contiguous():
+                # Flat views need contiguous storage; the copy replaces the original
+                tensor = tensor.contiguous()
+                if name is None:
+                    obj = tensor
+                else:
+                    items[name] = tensor
+            flat = tensor.reshape(-1)
+            if flat.dtype == torch.bfloat16:
+                bf16.append(len(parts))
+                parts.append(flat.view(torch.int16).numpy().view(np.uint16))
+            else:
+                parts.append(flat.numpy())
+        weights = WeightChain(parts, bf16=bf16)
+        if meta is not None and len(weights):
+            weights = weights.region(*SynapseInjector._reserved_region(meta, len(weights)))
+        return obj, weights
 
-        # Fallback: raw binary
-        raw = struct.pack(f"{len(weights)}f", *weights)
-        Path(output_path).write_bytes(raw)
+    @staticmethod
+    def _reserved_region(meta: dict, total_weights: int) -> tuple[int, int]:
+        """
+        (offset, count) of the stego region a trainer's synapse_meta reserves
+        in the flat lora_weights carrier. Outputs that predate reserve_offset
+        reserve the last reserve_bytes * 24 weights; no reserve means all.
+        """
+        count = int(meta.get("reserve_weights") or int(meta.get("reserve_bytes") or 0) * 8 * REPETITION)
+        if count <= 0:
+            return 0, total_weights
+        count = min(count, total_weights)
+        offset = int(meta.get("reserve_offset", total_weights - count))
+        if offset < 0 or offset + count > total_weights:
+            raise ValueError(
+                f"synapse_meta reserves weights [{offset}, {offset + count}) "
+                f"but the carrier has {total_weights}."
+            )
+        return offset, count
+
+    @staticmethod
+    def _save_torch(obj, output_path: str, tensors: Optional[str] = None):
+        """
+        torch.save via a temp file (the source may be mapped from
+        output_path), recording the tensor selection policy if there is one.
+        """
+        import torch
+        tmp = f"{output_path}.tmp"
+        try:
+            torch.save(obj, tmp)
+            if tensors is not None:
+                write_torch_metadata(tmp, {SELECTION_KEY: tensors})
+            os.replace(tmp, output_path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
 
     # ------------------------------------------------------------------
     # Utility
@@ -229,25 +1181,23 @@ class SynapseInjector:
     def _key_to_seed(self, key: str) -> int:
         return int(hashlib.sha256(key.encode()).hexdigest(), 16) % (2**32)
 
-    def _bytes_to_bits(self, data: bytes) -> list[int]:
-        bits = []
-        for byte in data:
-            for i in range(8):
-                bits.append((byte >> i) & 1)
-        return bits
+    @staticmethod
+    def _scale_parity(values) -> np.ndarray:
+        return np.rint(np.asarray(values, dtype=np.float64) * SCALE).astype(np.int64) & 1
 
-    def _bits_to_bytes(self, bits: list[int]) -> bytes:
-        result = bytearray()
-        for i in range(0, len(bits), 8):
-            byte = 0
-            chunk = bits[i:i + 8]
-            for j, bit in enumerate(chunk):
-                if bit:
-                    byte |= (1 << j)
-            result.append(byte)
-        return bytes(result)
+    @staticmethod
+    def _bytes_to_bits(data: bytes) -> np.ndarray:
+        """LSB-first bit order within each byte."""
+        return np.unpackbits(np.frombuffer(data, dtype=np.uint8), bitorder="little")
+
+    @staticmethod
+    def _bits_to_bytes(bits) -> bytes:
+        return np.packbits(np.asarray(bits, dtype=np.uint8), bitorder="little").tobytes()
 
     @staticmethod
-    def capacity_bytes(num_weights: int) -> int:
+    def capacity_bytes(num_weights: int, version: int = FORMAT_VERSION, ecc: str = "rs") -> int:
         """Given N weights, returns max payload bytes."""
-        return (num_weights // (8 * REPETITION)) - HEADER_BYTES
+        code = ECCS[ecc if version >= 5 else "rep3"]
+        body_slots = max(0, num_weights - _header_size(version) * 8 * REPETITION)
+        tag = PAYLOAD_MAC_BYTES if version >= 7 else 0
+        return max(0, code.max_data(body_slots // (8 * code.repetition)) - tag)
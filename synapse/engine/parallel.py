@@ -0,0 +1,83 @@
+"""
+synapse/engine/parallel.py
+
+Multi-process payload decoding for large memory-mapped carriers.
+
+Every repetition group decodes independently, and KeyedPermutation can
+compute the slots of any bit range on its own (it is counter-based — slot
+i depends only on i and the key). So a block of payload can be cut into
+byte ranges and handed to worker processes, each of which maps the carrier
+file itself and decodes its range. Workers share the page cache rather
+than a copy of the weights; only slot-space parameters go in and decoded
+bytes come out.
+"""
+
+from __future__ import annotations
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+from synapse.engine.injector import SynapseInjector
+
+
+MIN_PIECE_BYTES = 16 * 1024    # below this, task overhead beats the decode
+
+# Per-worker state: the carrier mapping, opened once by the initializer
+_mapping = None
+_weights = None
+
+
+def _open_carrier(path: str):
+    global _mapping, _weights
+    _mapping = SynapseInjector._map_weights(path)
+    _weights = _mapping.__enter__()
+
+
+def _decode(space, num_bytes: int, start: int, repetition: int, embedding: int) -> bytes:
+    return SynapseInjector._extract_bits(_weights, space, num_bytes, start, repetition, embedding)
+
+
+def resolve_workers(workers: Optional[int]) -> int:
+    """Worker count for a --workers style option: 0 means one per CPU."""
+    if workers == 0:
+        return os.cpu_count() or 1
+    return max(1, workers or 1)
+
+
+class ParallelDecoder:
+    """
+    Pool of worker processes, each holding its own mapping of one carrier
+    file. extract_bits() is a drop-in for SynapseInjector._extract_bits on
+    that carrier.
+    """
+
+    def __init__(self, path: str, workers: int):
+        self.workers = workers
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers, initializer=_open_carrier, initargs=(str(path),)
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._pool.shutdown(cancel_futures=True)
+
+    def extract_bits(
+        self, weights, space, num_bytes: int, start: int = 0, repetition: int = 3, embedding: int = 0
+    ) -> bytes:
+        # Even split, but never into pieces too small to be worth a task
+        pieces = max(1, min(self.workers, num_bytes // MIN_PIECE_BYTES))
+        if pieces == 1:
+            return SynapseInjector._extract_bits(weights, space, num_bytes, start, repetition, embedding)
+        step = -(-num_bytes // pieces)
+        futures = [
+            self._pool.submit(
+                _decode, space, min(step, num_bytes - s), start + s * 8 * repetition, repetition, embedding
+            )
+            for s in range(0, num_bytes, step)
+        ]
+        return b"".join(f.result() for f in futures)
@@ -0,0 +1,163 @@
+"""
+synapse/engine/permutation.py
+
+Keyed pseudo-random permutation of carrier slots, computed on demand.
+
+The original injector shuffled np.arange(num_weights) to decide where each
+payload bit lives. That costs 8 bytes per weight just to read a 4-byte
+header. KeyedPermutation instead maps slot position i → carrier index with
+a keyed Feistel network over the next power-of-four domain, cycle-walking
+back into [0, n). It is a true bijection on [0, n), so slots never collide,
+and any range of positions can be computed independently in O(count).
+
+Every slot space (KeyedPermutation, ShuffledSlots, SlotRegion) exposes
+len(), slots(start, count) and map(positions). The keyed spaces can also
+run backwards — inverse(indices) gives the slot position of each carrier
+index — which is what lets an injector walk the carrier in order instead
+of the payload.
+"""
+
+from __future__ import annotations
+import hashlib
+from typing import Optional
+import numpy as np
+
+
+ROUNDS = 6
+
+_M1 = np.uint64(0xBF58476D1CE4E5B9)
+_M2 = np.uint64(0x94D049BB133111EB)
+
+
+def _mix(z: np.ndarray) -> np.ndarray:
+    """SplitMix64 finalizer — cheap, well-distributed 64-bit round function."""
+    z = (z ^ (z >> np.uint64(30))) * _M1
+    z = (z ^ (z >> np.uint64(27))) * _M2
+    return z ^ (z >> np.uint64(31))
+
+
+class KeyedPermutation:
+    """Bijection on [0, n) keyed by arbitrary bytes."""
+
+    def __init__(self, key: bytes, n: int):
+        if n < 1:
+            raise ValueError("Permutation domain must be non-empty.")
+        self.n = int(n)
+        half = max(1, (max(1, self.n - 1).bit_length() + 1) // 2)
+        self._half = np.uint64(half)
+        self._mask = np.uint64((1 << half) - 1)
+        self._round_keys = [
+            np.uint64(int.from_bytes(hashlib.sha256(key + bytes([r])).digest()[:8], "little"))
+            for r in range(ROUNDS)
+        ]
+
+    def __len__(self) -> int:
+        return self.n
+
+    def slots(self, start: int, count: int) -> np.ndarray:
+        """Carrier indices for slot positions [start, start + count)."""
+        if start < 0 or start + count > self.n:
+            raise IndexError(f"Slot range [{start}, {start + count}) outside [0, {self.n}).")
+        return self.map(np.arange(start, start + count, dtype=np.uint64))
+
+    def map(self, positions: np.ndarray) -> np.ndarray:
+        """Map an array of slot positions to carrier indices."""
+        out = self._encrypt(np.asarray(positions, dtype=np.uint64))
+        # Cycle-walk anything that landed outside [0, n). The domain is < 4n,
+        # so this converges in a couple of passes.
+        limit = np.uint64(self.n)
+        pending = np.flatnonzero(out >= limit)
+        while pending.size:
+            out[pending] = self._encrypt(out[pending])
+            pending = pending[out[pending] >= limit]
+        return out.astype(np.int64)
+
+    def inverse(self, indices: np.ndarray) -> np.ndarray:
+        """Slot position of each carrier index (map() run backwards)."""
+        out = self._decrypt(np.asarray(indices, dtype=np.uint64))
+        # Walking the cycle backwards stops at the first in-range value,
+        # which is exactly where the forward walk started.
+        limit = np.uint64(self.n)
+        pending = np.flatnonzero(out >= limit)
+        while pending.size:
+            out[pending] = self._decrypt(out[pending])
+            pending = pending[out[pending] >= limit]
+        return out.astype(np.int64)
+
+    def _encrypt(self, x: np.ndarray) -> np.ndarray:
+        left = x >> self._half
+        right = x & self._mask
+        for k in self._round_keys:
+            left, right = right, left ^ (_mix(right ^ k) & self._mask)
+        return (left << self._half) | right
+
+    def _decrypt(self, x: np.ndarray) -> np.ndarray:
+        left = x >> self._half
+        right = x & self._mask
+        for k in reversed(self._round_keys):
+            left, right = right ^ (_mix(left ^ k) & self._mask), left
+        return (left << self._half) | right
+
+
+class ShuffledSlots:
+    """Legacy (v1) slot order: a full np.random shuffle of [0, n)."""
+
+    def __init__(self, seed: int, n: int):
+        self.n = int(n)
+        rng = np.random.default_rng(seed)
+        self._indices = np.arange(self.n)
+        rng.shuffle(self._indices)
+
+    def __len__(self) -> int:
+        return self.n
+
+    def slots(self, start: int, count: int) -> np.ndarray:
+        if start < 0 or start + count > self.n:
+            raise IndexError(f"Slot range [{start}, {start + count}) outside [0, {self.n}).")
+        return self._indices[start:start + count]
+
+    def map(self, positions: np.ndarray) -> np.ndarray:
+        return self._indices[np.asarray(positions, dtype=np.int64)]
+
+
+class SlotRegion:
+    """
+    Positions [start, start + n) of an outer slot space, optionally
+    re-ordered by a keyed permutation of their own. Used to confine a
+    payload to part of a carrier (e.g. one tenant's extents).
+    """
+
+    def __init__(self, outer, start: int, n: int, key: Optional[bytes] = None):
+        if start < 0 or n < 1 or start + n > len(outer):
+            raise ValueError(f"Region [{start}, {start + n}) outside slot space of {len(outer)}.")
+        self.outer = outer
+        self.start = int(start)
+        self.n = int(n)
+        self._inner = KeyedPermutation(key, n) if key is not None else None
+
+    def __len__(self) -> int:
+        return self.n
+
+    def slots(self, start: int, count: int) -> np.ndarray:
+        if start < 0 or start + count > self.n:
+            raise IndexError(f"Slot range [{start}, {start + count}) outside [0, {self.n}).")
+        if self._inner is not None:
+            positions = self._inner.slots(start, count)
+        else:
+            positions = np.arange(start, start + count, dtype=np.int64)
+        return self.outer.map(positions + self.start)
+
+    def map(self, positions: np.ndarray) -> np.ndarray:
+        positions = np.asarray(positions, dtype=np.int64)
+        if self._inner is not None:
+            positions = self._inner.map(positions)
+        return self.outer.map(positions + self.start)
+
+    def inverse(self, indices: np.ndarray) -> np.ndarray:
+        """Region position of each carrier index, or -1 where it lies outside the region."""
+        positions = self.outer.inverse(indices) - self.start
+        inside = (positions >= 0) & (positions < self.n)
+        if self._inner is not None:
+            positions[inside] = self._inner.inverse(positions[inside])
+        positions[~inside] = -1
+        return positions
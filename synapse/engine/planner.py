@@ -0,0 +1,233 @@
+"""
+synapse/engine/planner.py
+
+Metadata-only carrier inspection and capacity planning.
+
+inspect_carrier() answers "what is in this file and how much can it hold?"
+from the file header alone:
+
+  .safetensors   the JSON header (one small read)
+  .pt            data.pkl, unpickled with storages replaced by stubs, so
+                 tensor shapes and the trainer's synapse_meta come back
+                 without a single weight being read (and without torch)
+  raw float32    the file size
+
+so it takes milliseconds however large the carrier is.
+"""
+
+from __future__ import annotations
+import json
+import os
+import pickle
+import struct
+import zipfile
+from collections import OrderedDict
+from typing import Optional
+
+from synapse.engine.ecc import ECCS
+from synapse.engine.injector import FORMAT_VERSION, SynapseInjector
+from synapse.engine.safetensors_io import FLOAT_DTYPES
+from synapse.engine.selection import SELECTION_KEY, normalize_policy, read_torch_metadata, select_tensors
+
+
+# torch storage class → safetensors dtype tag
+_TORCH_STORAGES = {
+    "DoubleStorage": "F64",
+    "FloatStorage": "F32",
+    "HalfStorage": "F16",
+    "BFloat16Storage": "BF16",
+    "LongStorage": "I64",
+    "IntStorage": "I32",
+    "ShortStorage": "I16",
+    "CharStorage": "I8",
+    "ByteStorage": "U8",
+    "BoolStorage": "BOOL",
+}
+
+
+class _Storage:
+    def __init__(self, dtype: str, numel: int):
+        self.dtype = dtype
+        self.numel = numel
+
+
+class _Tensor:
+    """What inspection keeps of a pickled tensor: its dtype and shape."""
+
+    def __init__(self, dtype: str, shape: tuple):
+        self.dtype = dtype
+        self.shape = [int(d) for d in shape]
+
+
+class _Opaque:
+    """Stand-in for any other class or function referenced by the pickle."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __call__(self, *args, **kwargs):
+        return _Opaque()
+
+    def __setstate__(self, state):
+        pass
+
+
+def _rebuild_tensor(storage, storage_offset, size, *args, **kwargs) -> _Tensor:
+    return _Tensor(getattr(storage, "dtype", "?"), size)
+
+
+def _rebuild_parameter(data, *args, **kwargs):
+    return data
+
+
+class _HeaderUnpickler(pickle.Unpickler):
+    """Unpickles a torch data.pkl into _Tensor stubs; storages are never loaded."""
+
+    def find_class(self, module: str, name: str):
+        if module == "torch" and name in _TORCH_STORAGES:
+            return _TORCH_STORAGES[name]
+        if module == "torch._utils" and name.startswith("_rebuild_tensor"):
+            return _rebuild_tensor
+        if module == "torch._utils" and name.startswith("_rebuild_parameter"):
+            return _rebuild_parameter
+        if (module, name) == ("collections", "OrderedDict"):
+            return OrderedDict
+        return _Opaque
+
+    def persistent_load(self, pid):
+        # zip: ('storage', type, key, location, numel); legacy adds view metadata
+        if isinstance(pid, tuple) and pid and pid[0] == "storage":
+            dtype = pid[1] if isinstance(pid[1], str) else "?"
+            return _Storage(dtype, int(pid[4]))
+        return _Opaque()
+
+
+def _torch_header(path: str) -> object:
+    """The object of a .pt file with every tensor as a _Tensor stub."""
+    try:
+        with zipfile.ZipFile(path) as archive:
+            pkl = next(n for n in archive.namelist() if n.endswith("/data.pkl"))
+            with archive.open(pkl) as f:
+                return _HeaderUnpickler(f).load()
+    except zipfile.BadZipFile:
+        pass
+    # Legacy format: magic number, protocol, sys info, then the object —
+    # all from an untrusted file, so none of them is unpickled unrestricted
+    with open(path, "rb") as f:
+        for _ in range(3):
+            _HeaderUnpickler(f).load()
+        return _HeaderUnpickler(f).load()
+
+
+def _torch_tensors(obj) -> tuple[dict, dict]:
+    """({name: _Tensor}, synapse_meta) for a tensor, state dict or trainer output."""
+    meta = {}
+    if isinstance(obj, dict) and isinstance(obj.get("lora_weights"), dict):
+        meta = obj.get("synapse_meta") or {}
+        obj = obj["lora_weights"]
+    if isinstance(obj, _Tensor):
+        return {None: obj}, meta
+    if isinstance(obj, dict):
+        return {k: v for k, v in obj.items() if isinstance(v, _Tensor)}, meta
+    raise ValueError(f"Unexpected torch object in carrier: {type(obj).__name__}")
+
+
+def _numel(shape) -> int:
+    n = 1
+    for d in shape:
+        n *= int(d)
+    return n
+
+
+def inspect_carrier(path: str, version: int = FORMAT_VERSION) -> dict:
+    """
+    Describe a carrier from its header alone.
+
+    Returns a dict with:
+      format          "safetensors", "torch" or "raw"
+      file_bytes      size on disk
+      tensors         [{name, dtype, shape, weights, selected}] in file order
+      total_weights   floating-point weights in the file
+      selection       the recorded tensor selection policy (None = all)
+      carrier_weights weights the payload can use (the selected ones, or
+                      a trainer output's reserved region)
+      capacity        {ecc name: max payload bytes} at this format version —
+                      bytes as stored, i.e. after compression
+      reserve_bytes   space the trainer reserved (synapse_meta), else 0
+      reserve_offset  first weight of the reserved region (trainer output only)
+      synapse_meta    the trainer's metadata block, if any
+    """
+    fmt = SynapseInjector._carrier_format(path)
+    tensors: list[dict] = []
+    selection, meta = None, {}
+
+    if fmt == "safetensors":
+        with open(path, "rb") as f:
+            (n,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(n))
+        metadata = header.pop("__metadata__", None) or {}
+        selection = normalize_policy(metadata.get(SELECTION_KEY))
+        for name, info in sorted(header.items(), key=lambda kv: kv[1]["data_offsets"][0]):
+            tensors.append({"name": name, "dtype": info["dtype"], "shape": list(info["shape"])})
+    elif fmt == "torch":
+        selection = normalize_policy(read_torch_metadata(path).get(SELECTION_KEY))
+        found, meta = _torch_tensors(_torch_header(path))
+        for name, tensor in found.items():
+            tensors.append({"name": name, "dtype": tensor.dtype, "shape": tensor.shape})
+    else:
+        tensors.append({"name": None, "dtype": "F32", "shape": [os.path.getsize(path) // 4]})
+
+    floating = [t["name"] for t in tensors if t["dtype"] in FLOAT_DTYPES]
+    selected = set(select_tensors(floating, selection)) if floating else set()
+    for t in tensors:
+        t["weights"] = _numel(t["shape"])
+        t["selected"] = t["name"] in selected
+    total = sum(t["weights"] for t in tensors if t["dtype"] in FLOAT_DTYPES)
+    usable = sum(t["weights"] for t in tensors if t["selected"])
+    reserve_offset = None
+    if meta and usable:
+        # Trainer output: payloads are confined to the reserved region
+        reserve_offset, usable = SynapseInjector._reserved_region(meta, usable)
+
+    return {
+        "path": str(path),
+        "format": fmt,
+        "file_bytes": os.path.getsize(path),
+        "tensors": tensors,
+        "total_weights": total,
+        "selection": selection,
+        "carrier_weights": usable,
+        "format_version": version,
+        "capacity": {name: SynapseInjector.capacity_bytes(usable, version, name) for name in ECCS},
+        "reserve_bytes": int(meta.get("reserve_bytes", 0) or 0),
+        "reserve_offset": reserve_offset,
+        "synapse_meta": meta or None,
+    }
+
+
+def format_report(info: dict, max_tensors: Optional[int] = 20) -> str:
+    """Human-readable summary of inspect_carrier() output."""
+    lines = [
+        f"Carrier:        {info['path']} ({info['format']}, {info['file_bytes']:,} bytes)",
+        f"Tensors:        {len(info['tensors'])}",
+    ]
+    shown = info["tensors"] if max_tensors is None else info["tensors"][:max_tensors]
+    for t in shown:
+        mark = "*" if t["selected"] else " "
+        lines.append(f"  {mark} {t['name'] or '<tensor>'}  {t['dtype']} {t['shape']}  ({t['weights']:,})")
+    if len(shown) < len(info["tensors"]):
+        lines.append(f"    … {len(info['tensors']) - len(shown)} more")
+    lines += [
+        f"Total weights:  {info['total_weights']:,}",
+        f"Selection:      {info['selection'] or 'all floating-point tensors'}",
+        f"Usable weights: {info['carrier_weights']:,}",
+        f"Capacity (v{info['format_version']}, stored bytes after compression):",
+    ]
+    for name, cap in info["capacity"].items():
+        lines.append(f"  {name:<6} {cap:,} bytes")
+    if info["reserve_offset"] is not None:
+        lines.append(
+            f"Reserved:       {info['reserve_bytes']:,} bytes — weights "
+            f"{info['reserve_offset']:,}…{info['reserve_offset'] + info['carrier_weights']:,} (trainer synapse_meta)"
+        )
+    return "\n".join(lines)
@@ -6,8 +6,11 @@ No external vector DB required — pure Python.
 """
 
 from __future__ import annotations
+import itertools
 import re
-from typing import Optional
+from typing import Iterable, Iterator, Optional
+
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
 
 class RetrievalStore:
     """
@@ -42,6 +45,38 @@ class RetrievalStore:
             
         self._try_build_embeddings()
 
+    def load_stream(self, pieces: Iterable[str]):
+        """
+        Build the same index as load(), from text arriving in pieces
+        (e.g. decrypted blocks from iter_extract). Chunking proceeds as the
+        pieces arrive instead of waiting for the whole text.
+        """
+        pieces = iter(pieces)
+        head = ""
+        for piece in pieces:
+            # Buffer just enough complete lines for CSV detection
+            head += piece
+            lines = [line.strip() for line in head.splitlines()[:-1] if line.strip()]
+            if len(lines) > 2:
+                break
+        else:
+            self.load(head)
+            return
+
+        stream = itertools.chain([head], pieces)
+        if "," in lines[0] and "," in lines[1]:
+            rows = self._stream_lines(stream)
+            self.header = next(rows)
+            self.chunks = list(rows)
+            self.is_csv = True
+        else:
+            self.header = ""
+            self.is_csv = False
+            sentences = self._stream_sentences(stream)
+            self.chunks = [c for c in self._chunk_sentences(sentences) if c.strip()]
+
+        self._try_build_embeddings()
+
     @property
     def chunk_count(self) -> int:
         return len(self.chunks)
@@ -80,15 +115,18 @@ class RetrievalStore:
 
     def _chunk_text(self, text: str) -> list[str]:
         """Split text into overlapping chunks, respecting sentence boundaries."""
-        sentences = re.split(r'(?<=[.!?])\s+', text.strip())
-        chunks = []
+        sentences = _SENTENCE_END.split(text.strip())
+        return [c for c in self._chunk_sentences(sentences) if c.strip()]
+
+    def _chunk_sentences(self, sentences: Iterable[str]) -> Iterator[str]:
+        """Group sentences into overlapping chunks of about chunk_size chars."""
         current = []
         current_len = 0
 
         for sentence in sentences:
             sentence_len = len(sentence)
             if current_len + sentence_len > self.chunk_size and current:
-                chunks.append(" ".join(current))
+                yield " ".join(current)
                 current = current[-1:] # Keep small overlap
                 current.append(sentence)
                 current_len = sum(len(s) for s in current)
@@ -97,8 +135,35 @@ class RetrievalStore:
                 current_len += sentence_len
 
         if current:
-            chunks.append(" ".join(current))
-        return [c for c in chunks if c.strip()]
+            yield " ".join(current)
+
+    @staticmethod
+    def _stream_lines(pieces: Iterable[str]) -> Iterator[str]:
+        """Yield stripped, non-empty lines as soon as each one is complete."""
+        rest = ""
+        for piece in pieces:
+            lines = (rest + piece).splitlines(keepends=True)
+            # Only a last line without its line break may continue in the next piece
+            rest = lines.pop() if lines and lines[-1] == lines[-1].rstrip("\r\n") else ""
+            for line in lines:
+                if line.strip():
+                    yield line.strip()
+        if rest.strip():
+            yield rest.strip()
+
+    @staticmethod
+    def _stream_sentences(pieces: Iterable[str]) -> Iterator[str]:
+        """
+        Yield sentences as soon as each one is complete. The unfinished tail
+        never starts with whitespace (that belongs to the previous
+        separator), so lstrip() on the buffer matches text.strip() + split.
+        """
+        rest = ""
+        for piece in pieces:
+            parts = _SENTENCE_END.split((rest + piece).lstrip())
+            rest = parts.pop()
+            yield from parts
+        yield from _SENTENCE_END.split(rest.strip())
 
     def _retrieve_tfidf(self, query: str, top_k: int) -> list[str]:
         """Simple keyword matching fallback."""
@@ -0,0 +1,183 @@
+"""
+synapse/engine/safetensors_io.py
+
+Zero-copy .safetensors reader/writer.
+
+The file is memory-mapped and every tensor is exposed as a NumPy view into
+the mapping, so opening a multi-GB adapter costs one JSON parse and no
+unpickling. Only pages that are actually read (or written, in
+copy-on-write mode) are ever brought into memory.
+
+Format: <u64 little-endian header length> <JSON header> <raw tensor data>
+"""
+
+from __future__ import annotations
+import json
+import os
+import struct
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from synapse.engine.carrier import WeightChain
+
+
+# safetensors dtype tag → NumPy storage dtype. BF16 has no NumPy
+# equivalent, so it is exposed as its raw uint16 bit patterns.
+DTYPES = {
+    "F64": np.float64,
+    "F32": np.float32,
+    "F16": np.float16,
+    "BF16": np.uint16,
+    "I64": np.int64,
+    "I32": np.int32,
+    "I16": np.int16,
+    "I8": np.int8,
+    "U8": np.uint8,
+    "BOOL": np.bool_,
+}
+FLOAT_DTYPES = ("F64", "F32", "F16", "BF16")
+
+_TAGS = {np.dtype(v): k for k, v in DTYPES.items() if k != "BF16"}
+_COPY_BLOCK = 64 * 1024 * 1024
+
+
+def is_safetensors(path: str) -> bool:
+    """Cheap sniff: a plausible header length followed by a JSON object."""
+    try:
+        size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            head = f.read(9)
+    except OSError:
+        return False
+    if len(head) < 9:
+        return False
+    (n,) = struct.unpack("<Q", head[:8])
+    return head[8:9] == b"{" and 8 + n <= size
+
+
+class SafetensorsFile:
+    """
+    Memory-mapped view of a .safetensors file.
+
+    mode: "r"  read-only
+          "c"  copy-on-write — writes stay private to this process
+          "r+" writes go straight to the file
+    """
+
+    def __init__(self, path: str, mode: str = "r"):
+        self.path = str(path)
+        self.mode = mode
+        with open(self.path, "rb") as f:
+            (n,) = struct.unpack("<Q", f.read(8))
+            self._header_raw = f.read(n)
+        header = json.loads(self._header_raw)
+        self.metadata: dict = header.pop("__metadata__", None) or {}
+        # Keep tensors in on-disk order — that is the carrier's flat address order.
+        self.entries: dict = dict(sorted(header.items(), key=lambda kv: kv[1]["data_offsets"][0]))
+        self.data_offset = 8 + n
+        data_size = os.path.getsize(self.path) - self.data_offset
+        self._data = (
+            np.memmap(self.path, dtype=np.uint8, mode=mode, offset=self.data_offset, shape=(data_size,))
+            if data_size > 0 else np.zeros(0, dtype=np.uint8)
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if isinstance(self._data, np.memmap) and self.mode == "r+":
+            self._data.flush()
+        self._data = np.zeros(0, dtype=np.uint8)
+
+    def keys(self) -> list[str]:
+        return list(self.entries)
+
+    def tensor(self, name: str) -> np.ndarray:
+        """NumPy view of a tensor (no copy)."""
+        info = self.entries[name]
+        start, end = info["data_offsets"]
+        dtype = DTYPES[info["dtype"]]
+        return self._data[start:end].view(dtype).reshape(info["shape"])
+
+    def float_names(self) -> list[str]:
+        """Names of the floating-point tensors, in file order."""
+        return [k for k, v in self.entries.items() if v["dtype"] in FLOAT_DTYPES]
+
+    def weights(self, names: Optional[list[str]] = None) -> WeightChain:
+        """
+        Floating-point tensors (all, or just `names`), in file order, as one
+        flat carrier. Tensors left out are never touched.
+        """
+        names = self.float_names() if names is None else names
+        parts = [self.tensor(k).reshape(-1) for k in names]
+        bf16 = [i for i, k in enumerate(names) if self.entries[k]["dtype"] == "BF16"]
+        return WeightChain(parts, bf16=bf16)
+
+    def save(self, output_path: str, metadata: Optional[dict] = None):
+        """
+        Write the (possibly modified) mapping to output_path. The header is
+        copied untouched unless new `metadata` is given. The data region is
+        streamed in blocks, and the file is written to a temp path and
+        renamed so output_path may be this very file.
+        """
+        header_raw = self._header_raw
+        if metadata is not None:
+            header = json.loads(header_raw)
+            header["__metadata__"] = {k: str(v) for k, v in metadata.items()}
+            header_raw = json.dumps(header, separators=(",", ":")).encode("utf-8")
+            header_raw += b" " * ((8 - len(header_raw) % 8) % 8)
+        tmp = f"{output_path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(struct.pack("<Q", len(header_raw)))
+            f.write(header_raw)
+            for start in range(0, len(self._data), _COPY_BLOCK):
+                f.write(self._data[start:start + _COPY_BLOCK].data)
+        os.replace(tmp, output_path)
+
+
+def load_file(path: str) -> dict[str, np.ndarray]:
+    """Read-only views of every tensor in a .safetensors file."""
+    st = SafetensorsFile(path)
+    return {k: st.tensor(k) for k in st.keys()}
+
+
+def save_file(
+    tensors: dict[str, np.ndarray],
+    path: str,
+    metadata: Optional[dict] = None,
+    dtypes: Optional[dict[str, str]] = None,
+):
+    """
+    Write NumPy arrays as a .safetensors file. Arrays are streamed straight
+    from their buffers. `dtypes` overrides the tag per tensor — e.g. "BF16"
+    for a uint16 array of raw bfloat16 bits.
+    """
+    dtypes = dtypes or {}
+    header: dict = {}
+    if metadata:
+        header["__metadata__"] = {k: str(v) for k, v in metadata.items()}
+    offset = 0
+    for name, arr in tensors.items():
+        tag = dtypes.get(name) or _TAGS.get(np.dtype(arr.dtype))
+        if tag is None:
+            raise ValueError(f"Unsupported dtype for safetensors: {arr.dtype}")
+        header[name] = {
+            "dtype": tag,
+            "shape": list(arr.shape),
+            "data_offsets": [offset, offset + arr.nbytes],
+        }
+        offset += arr.nbytes
+
+    header_raw = json.dumps(header, separators=(",", ":")).encode("utf-8")
+    header_raw += b" " * ((8 - len(header_raw) % 8) % 8)
+
+    with open(Path(path), "wb") as f:
+        f.write(struct.pack("<Q", len(header_raw)))
+        f.write(header_raw)
+        for arr in tensors.values():
+            f.write(np.ascontiguousarray(arr).data)
@@ -0,0 +1,101 @@
+"""
+synapse/engine/segments.py
+
+Segmented payloads: a knowledge base stored as separately versioned
+segments, so changing one document rewrites only that document's slots.
+
+A segmented payload splits the key's slot space in two:
+
+  manifest   positions [0, manifest_slots) — an ordinary payload whose
+             header says LAYOUT_SEGMENTED and whose body is the manifest:
+             every segment's name, version and slot run
+  segments   the rest — each segment is itself a complete payload (own
+             header, codec, ECC and MAC) written into its own run of
+             positions, under a key derived from the payload key and the
+             segment's generation number
+
+Generations are handed out from one counter per manifest and never
+reused, so no two writes ever share a keystream — not even two versions
+of one segment in the same slots. Runs are sized with some slack, so a
+segment that grows a little is rewritten where it is.
+"""
+
+from __future__ import annotations
+import json
+from typing import Optional
+
+
+SEGMENT_ALIGN = 1024          # runs are whole multiples of this many slots
+SEGMENT_SLACK = 8             # room to grow: a run is sized required + required/8
+MANIFEST_MIN_SLOTS = 8192
+MANIFEST_MAX_SLOTS = 1 << 20
+MANIFEST_VERSION = 1
+
+
+def manifest_slots(num_slots: int) -> int:
+    """Slots set aside for the manifest in a slot space of num_slots."""
+    slots = min(MANIFEST_MAX_SLOTS, max(MANIFEST_MIN_SLOTS, num_slots // 32))
+    if slots * 2 > num_slots:
+        raise ValueError(f"Carrier too small for a segmented payload ({num_slots} slots).")
+    return slots
+
+
+def run_slots(required: int) -> int:
+    """Run length for a segment that needs `required` slots."""
+    padded = required + required // SEGMENT_SLACK
+    return -(-padded // SEGMENT_ALIGN) * SEGMENT_ALIGN
+
+
+class Segment:
+    """One segment's manifest entry: its run is [start, start + count) of the segment area."""
+
+    def __init__(self, version: int, generation: int, start: int, count: int):
+        self.version = version
+        self.generation = generation
+        self.start = start
+        self.count = count
+
+
+class SegmentManifest:
+    """Ordered segment table of a segmented payload, plus its run allocator."""
+
+    def __init__(self, area: int, segments: Optional[dict[str, Segment]] = None, generation: int = 0):
+        self.area = area                  # slots available to segment runs
+        self.segments = segments or {}
+        self.generation = generation      # next generation number
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> "SegmentManifest":
+        doc = json.loads(raw)
+        if doc.get("manifest") != MANIFEST_VERSION:
+            raise ValueError(f"Unsupported segment manifest version {doc.get('manifest')!r}.")
+        segments = {name: Segment(*fields) for name, *fields in doc["segments"]}
+        return cls(doc["area"], segments, doc["generation"])
+
+    def to_bytes(self) -> bytes:
+        return json.dumps({
+            "manifest": MANIFEST_VERSION,
+            "area": self.area,
+            "generation": self.generation,
+            "segments": [[name, s.version, s.generation, s.start, s.count] for name, s in self.segments.items()],
+        }, separators=(",", ":")).encode()
+
+    def next_generation(self) -> int:
+        self.generation += 1
+        return self.generation - 1
+
+    def allocate(self, count: int, exclude: Optional[str] = None) -> int:
+        """First gap of `count` slots between runs (ignoring segment `exclude`)."""
+        runs = sorted((s.start, s.count) for name, s in self.segments.items() if name != exclude)
+        pos = 0
+        for start, length in runs:
+            if start - pos >= count:
+                return pos
+            pos = max(pos, start + length)
+        if self.area - pos >= count:
+            return pos
+        used = sum(length for _, length in runs)
+        raise ValueError(
+            f"Segmented payload is full: need a run of {count} slots, "
+            f"{self.area - used} of {self.area} free."
+        )
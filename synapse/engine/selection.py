@@ -0,0 +1,74 @@
+"""
+synapse/engine/selection.py
+
+Tensor selection policies: which tensors of a carrier hold the payload.
+
+By default every floating-point tensor is part of the carrier's flat slot
+space. A policy narrows that to tensors whose names match one of a list
+of comma-separated globs, e.g. "*lora_B*" or "*.q_proj.*,*.v_proj.*".
+
+The policy is a property of the carrier file, not of a key: it is written
+to the carrier's metadata on inject and read back before extraction, so
+an extractor needs no extra option. Only the selected tensors are ever
+mapped and read.
+
+  .safetensors   "__metadata__" entry SELECTION_KEY
+  .pt (zip)      a small JSON record next to data.pkl in the archive
+                 (torch.load ignores records it does not know)
+"""
+
+from __future__ import annotations
+import json
+import zipfile
+from fnmatch import fnmatchcase
+from typing import Iterable, Optional
+
+
+SELECTION_KEY = "synapse.tensors"
+TORCH_METADATA_RECORD = "synapse_metadata.json"
+
+
+def normalize_policy(policy: Optional[str]) -> Optional[str]:
+    """Canonical form of a policy string ("a, b" → "a,b"); None/"" select everything."""
+    if policy is None:
+        return None
+    patterns = [p.strip() for p in policy.split(",") if p.strip()]
+    return ",".join(patterns) or None
+
+
+def select_tensors(names: Iterable[str], policy: Optional[str]) -> list[str]:
+    """The names matching policy, in their original order."""
+    names = list(names)
+    policy = normalize_policy(policy)
+    if policy is None:
+        return names
+    patterns = policy.split(",")
+    selected = [n for n in names if any(fnmatchcase(n, p) for p in patterns)]
+    if not selected:
+        raise ValueError(f"Tensor selection {policy!r} matches no floating-point tensor in the carrier.")
+    return selected
+
+
+# ----------------------------------------------------------------------
+# .pt archive metadata
+# ----------------------------------------------------------------------
+
+def _record_name(archive: zipfile.ZipFile) -> str:
+    # torch archives keep every record under one top-level directory
+    prefix = archive.namelist()[0].split("/", 1)[0]
+    return f"{prefix}/{TORCH_METADATA_RECORD}"
+
+
+def read_torch_metadata(path: str) -> dict:
+    """Synapse metadata stored in a zip-format .pt file ({} if none)."""
+    try:
+        with zipfile.ZipFile(path) as archive:
+            return json.loads(archive.read(_record_name(archive)))
+    except (zipfile.BadZipFile, KeyError, IndexError):
+        return {}
+
+
+def write_torch_metadata(path: str, metadata: dict):
+    """Append the metadata record to a freshly saved zip-format .pt file."""
+    with zipfile.ZipFile(path, "a") as archive:
+        archive.writestr(_record_name(archive), json.dumps(metadata, separators=(",", ":")))
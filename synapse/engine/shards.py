@@ -0,0 +1,189 @@
+"""
+synapse/engine/shards.py
+
+One payload sharded across several carrier files.
+
+A single carrier holds at most capacity_bytes(num_weights). A sharded
+payload is compressed once, then the compressed stream is cut into one
+piece per carrier, sized in proportion to each carrier's capacity (read
+from its header alone, see planner.py). Each piece becomes an ordinary
+payload (layout LAYOUT_SHARD) in its carrier, under a key derived from the
+payload key and the shard index — so no two carriers share a keystream —
+and starts with the shard map:
+
+    magic, set id, shard index, shard count, codec, total stream length
+
+Extraction takes the carrier files in any order. Each one is opened and
+decoded in its own worker process (trying each shard index against the
+header's MAC, which costs a few hundred slot reads per try); the map then
+orders the pieces, checks that they form one complete set, and the
+stream is inflated as the pieces are joined.
+
+A shard takes its carrier's whole slot space, so shared carriers (see
+directory.py) are refused before any file is written.
+"""
+
+from __future__ import annotations
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator, Optional
+
+from synapse.engine.injector import (
+    CHUNK_BYTES, CODECS, LAYOUT_SHARD, SynapseInjector, _compress, _decompressor,
+)
+from synapse.engine.parallel import resolve_workers
+from synapse.engine.planner import inspect_carrier
+
+
+SHARD_MAGIC = b"SYNS"
+SHARD_RECORD = struct.Struct(">4s16sHHBQ")   # magic, set id, index, count, codec, total length
+MAX_SHARDS = 256
+
+
+def _shard_injector(key: str, index: int, **options) -> SynapseInjector:
+    return SynapseInjector(f"{key}\x00shard:{index}", compression="none", legacy=False, **options)
+
+
+def inject_sharded(
+    key: str,
+    lora_paths: list[str],
+    payload: bytes,
+    output_paths: Optional[list[str]] = None,
+    compression: str = "zlib",
+    level: int = 6,
+    **options,
+):
+    """
+    Compress payload once and spread it over lora_paths, one shard per
+    file. output_paths defaults to patching each carrier in place.
+    options are passed to each shard's SynapseInjector (ecc, embedding, ...).
+    """
+    output_paths = list(output_paths or lora_paths)
+    if len(output_paths) != len(lora_paths):
+        raise ValueError(f"Got {len(lora_paths)} carriers but {len(output_paths)} output paths.")
+    if len(lora_paths) > MAX_SHARDS:
+        raise ValueError(f"At most {MAX_SHARDS} shards per payload.")
+    if len(set(map(os.path.abspath, lora_paths))) != len(lora_paths):
+        raise ValueError("Each shard needs its own carrier file.")
+    if compression not in CODECS:
+        raise ValueError(f"Unknown compression {compression!r}. Choose from: {', '.join(CODECS)}")
+
+    codec = CODECS[compression]
+    stream = payload
+    if codec != CODECS["none"]:
+        compressed = _compress(codec, level, payload)
+        if len(compressed) < len(payload):
+            stream = compressed
+        else:
+            codec = CODECS["none"]
+
+    # Room for each piece: the carrier's capacity minus the shard map
+    probe = _shard_injector(key, 0, **options)
+    room = []
+    for path in lora_paths:
+        # A shard takes its carrier's whole slot space; refuse before any file is written
+        if _on_weights(path, probe._open_directory) is not None:
+            raise ValueError(f"{path} is a shared carrier (several keys); shards need carriers of their own.")
+        info = inspect_carrier(path, probe.version)
+        room.append(max(0, info["capacity"][probe.ecc.name] - SHARD_RECORD.size))
+    total_room = sum(room)
+    if len(stream) > total_room:
+        raise ValueError(
+            f"Payload too large for {len(lora_paths)} carriers: {len(stream)} bytes "
+            f"after compression, room for {total_room}."
+        )
+
+    # Pieces in proportion to room, so every carrier is filled (and decoded) evenly
+    sizes = [len(stream) * r // total_room for r in room]
+    for i in sorted(range(len(room)), key=lambda i: room[i] - sizes[i], reverse=True):
+        if sum(sizes) == len(stream):
+            break
+        sizes[i] += min(room[i] - sizes[i], len(stream) - sum(sizes))
+
+    set_id = os.urandom(16)
+    pos = 0
+    for index, (src, dst, size) in enumerate(zip(lora_paths, output_paths, sizes)):
+        record = SHARD_RECORD.pack(SHARD_MAGIC, set_id, index, len(lora_paths), codec, len(stream))
+        injector = _shard_injector(key, index, **options)
+        piece = record + stream[pos:pos + size]
+
+        def embed(weights):
+            fitted = injector._for_carrier(weights)
+            fitted._embed(weights, fitted._pack(piece, layout=LAYOUT_SHARD), in_place=True)
+
+        injector._patch_file(src, dst, os.path.abspath(src) == os.path.abspath(dst), embed)
+        pos += size
+
+
+def _read_shard(key: str, path: str, count: int) -> tuple[tuple, bytes]:
+    """
+    Find which shard the carrier at path holds — indices below count (the
+    number of files given) first — and return (map fields, piece).
+    """
+    def decode(weights):
+        for index in [*range(count), *range(count, MAX_SHARDS)]:
+            injector = _shard_injector(key, index)
+            try:
+                header, space = injector._read_header(weights, injector._space(len(weights)))
+            except ValueError:
+                continue
+            if header["layout"] != LAYOUT_SHARD:
+                continue
+            body = b"".join(injector._iter_body(weights, header, space, CHUNK_BYTES))
+            fields = SHARD_RECORD.unpack(body[:SHARD_RECORD.size])
+            if fields[0] != SHARD_MAGIC or fields[2] != index:
+                raise ValueError(f"{path}: corrupt shard map.")
+            return fields, body[SHARD_RECORD.size:]
+        raise ValueError(f"{path}: no shard for this key (wrong key, or not part of this set).")
+
+    return _on_weights(path, decode)
+
+
+def _on_weights(path: str, fn):
+    """fn(weights) on the carrier at path, opened read-only."""
+    if SynapseInjector._carrier_format(path) == "torch":
+        return fn(SynapseInjector._open_torch(path)[1])
+    with SynapseInjector._map_weights(path) as weights:
+        return fn(weights)
+
+
+def iter_extract_sharded(key: str, lora_paths: list[str], workers: int = 0) -> Iterator[bytes]:
+    """
+    Decode every shard concurrently (one process per carrier, up to
+    workers; 0 means one per CPU), check they form one complete set, and
+    yield the reassembled payload piece by piece.
+    """
+    count = len(lora_paths)
+    workers = min(count, resolve_workers(workers))
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            shards = list(pool.map(_read_shard, [key] * count, lora_paths, [count] * count))
+    else:
+        shards = [_read_shard(key, path, count) for path in lora_paths]
+
+    shards.sort(key=lambda shard: shard[0][2])
+    _, set_id, _, _, codec, total = shards[0][0]
+    if any(fields[1] != set_id for fields, _ in shards):
+        raise ValueError("Carriers belong to different sharded payloads.")
+    if [fields[2] for fields, _ in shards] != list(range(count)) or shards[0][0][3] != count:
+        raise ValueError(f"Incomplete shard set: payload has {shards[0][0][3]} shards, got {count} carriers.")
+    if sum(len(piece) for _, piece in shards) != total:
+        raise ValueError("Sharded payload length does not match its shard map.")
+
+    inflater = _decompressor(codec)
+    for _, piece in shards:
+        block = inflater.decompress(piece) if inflater is not None else piece
+        if block:
+            yield block
+    if inflater is not None:
+        tail = inflater.flush() if hasattr(inflater, "flush") else b""
+        if tail:
+            yield tail
+        if not getattr(inflater, "eof", True):
+            raise ValueError("Compressed payload is truncated or corrupt.")
+
+
+def extract_sharded(key: str, lora_paths: list[str], workers: int = 0) -> bytes:
+    """The payload spread over lora_paths by inject_sharded (carriers in any order)."""
+    return b"".join(iter_extract_sharded(key, lora_paths, workers))
@@ -162,7 +162,8 @@ def create_app(synapse: "Synapse") -> FastAPI:
         After this, queries will use the hidden knowledge without needing the key each time.
         """
         try:
-            synapse.unlock(key=request.key, lora=request.lora)
+            # Clients may send any key: reject bad ones from the header alone
+            synapse.unlock(key=request.key, lora=request.lora, legacy=False)
             return {
                 "ok": True,
                 "message": "Context unlocked.",
@@ -201,6 +202,8 @@ def create_app(synapse: "Synapse") -> FastAPI:
                 prompt=request.prompt,
                 key=request.key,
                 lora=request.lora,
+                # Clients may send any key: reject bad ones from the header alone
+                legacy=False,
             )
             return QueryResponse(
                 response=result["response"],
@@ -221,7 +224,7 @@ def create_app(synapse: "Synapse") -> FastAPI:
             # 1. Unlock context if key provided and not already unlocked
             if request.key and not synapse._retrieval:
                 try:
-                    synapse.unlock(key=request.key, lora=request.lora)
+                    synapse.unlock(key=request.key, lora=request.lora, legacy=False)
                 except Exception:
                     pass # Invalid keys will just result in no context
 
@@ -777,10 +777,13 @@ class SynapseTrainer:
 
         The synapse_meta block tells the injector:
           - How many weights are available
-          - How much space is reserved for stego
+          - How much space is reserved for stego, and where: the injector
+            confines payloads to reserve_weights weights from reserve_offset
+            in the flat order of lora_weights
           - Which model this was trained on (needed to load for inference)
         """
         import torch
+        from synapse.engine.injector import SynapseInjector
 
         out = Path(output_path)
         out.parent.mkdir(parents=True, exist_ok=True)
@@ -802,7 +805,10 @@ class SynapseTrainer:
         total_w = sum(v.numel() for v in lora_state.values())
         # Each stego byte requires 8 bits × 3 repetitions = 24 weights
         stego_weights_needed = reserve_bytes * 24
-        capacity = max(0, (total_w // 24) - 4)   # 4 = header overhead
+        # The reserved region is the tail of the flat weight space
+        reserve_weights = min(stego_weights_needed, total_w)
+        reserve_offset = total_w - reserve_weights
+        capacity = SynapseInjector.capacity_bytes(reserve_weights)
 
         if stego_weights_needed > total_w * 0.35:
             safe_max = int(total_w * 0.35 / 24)
@@ -819,6 +825,8 @@ class SynapseTrainer:
                 "model_id":         self.model_id,
                 "total_weights":    total_w,
                 "reserve_bytes":    reserve_bytes,
+                "reserve_offset":   reserve_offset,
+                "reserve_weights":  reserve_weights,
                 "stego_capacity":   capacity,
                 "target_modules":   self.preset.target_modules,
                 "max_seq_length":   self.max_seq_length,
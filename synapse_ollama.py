@@ -1,13 +1,13 @@
 import hashlib
-import random
 import json
 import struct
 import os
-import zlib
 import subprocess
 import time
 import io
 
+import numpy as np
+
 # Optional Intelligence Extraction Libraries
 try:
     from pypdf import PdfReader
@@ -27,14 +27,24 @@ try:
 except ImportError:
     HAS_PANDAS = False
 
+from synapse.engine.formats import decode_weights, format_tag
 from synapse_token import SynapseTokenSystem
 
 class SynapseUnmasker:
     def __init__(self, passkey: str):
+        self.passkey = passkey
         self.seed_hash = hashlib.sha256(passkey.encode()).digest()
         self.random_seed = int.from_bytes(self.seed_hash[:4], 'little')
 
     def unmask(self, filename):
+        """
+        Decodes a mask in place: only the header is read, the weights are
+        memory-mapped at the header offset, and slot generation and bit
+        gathering run on arrays (synapse/engine/formats.py picks the decoder
+        from the mask's format tag). Memory follows the payload, not the
+        mask — except for legacy hardened/1 masks, whose random.shuffle
+        order needs a few bytes of index per weight to reproduce.
+        """
         filename = filename.strip().strip('"').strip("'")
         
         if not os.path.exists(filename):
@@ -47,48 +57,34 @@ class SynapseUnmasker:
                     return None, None, "File is empty or corrupted (Invalid Synapse Header)."
                 
                 header_size = struct.unpack('<Q', header_size_data)[0]
+                if header_size > os.path.getsize(filename) - 8:
+                    return None, None, "File corrupted (Incomplete Header)."
                 
                 header_raw = f.read(header_size)
                 if len(header_raw) < header_size:
                     return None, None, "File corrupted (Incomplete Header)."
                 
-                header = json.loads(header_raw.decode('utf-8'))
-                
-                meta = header["__metadata__"]
-                original_size = int(meta["payload_bytes"])
-                total_bytes = int(meta["total_bytes"])
-                original_filename = meta.get("original_filename", "extracted_file.bin")
-                
-                weight_shape = header["stealth_weights"]["shape"][0]
-                weight_data = f.read()
-                weights = struct.unpack(f'{weight_shape}f', weight_data)
-
-            num_bits = total_bytes * 8
-            random.seed(self.random_seed)
-            indices = list(range(len(weights)))
-            random.shuffle(indices)
-            target_indices = indices[:num_bits]
+            header = json.loads(header_raw.decode('utf-8'))
             
-            PRECISION = 1000000
-            bits = []
-            for idx in target_indices:
-                val = weights[idx]
-                scaled = int(round(val * PRECISION))
-                bits.append(scaled & 1)
-                
-            buffer = bytearray()
-            for i in range(0, len(bits), 8):
-                byte = 0
-                for j in range(8):
-                    if bits[i + j]: byte |= (1 << j)
-                buffer.append(byte)
-            
-            extracted_payload = bytes(buffer[:original_size])
-            stored_checksum = struct.unpack('<I', buffer[original_size:original_size+4])[0]
+            meta = header.get("__metadata__") or {}
+            tag = format_tag(meta)
+            if tag is None:
+                return None, None, "Not a Synapse mask (no format tag or hardened type in header)."
+            # The web forge records the name as "filename"
+            original_filename = meta.get("original_filename") or meta.get("filename") or "extracted_file.bin"
             
-            calculated_checksum = zlib.crc32(extracted_payload) & 0xffffffff
-            if calculated_checksum != stored_checksum:
+            weight_shape = header["stealth_weights"]["shape"][0]
+            start, end = header["stealth_weights"]["data_offsets"]
+            if end - start < weight_shape * 4 or os.path.getsize(filename) < 8 + header_size + end:
+                return None, None, "File corrupted (Truncated Weights)."
+            weights = np.memmap(filename, dtype='<f4', mode='r', offset=8 + header_size + start, shape=(weight_shape,))
+
+            try:
+                extracted_payload = decode_weights(tag, weights, meta, self.passkey)
+            except ValueError:
                 return None, None, "INTEGRITY FAILURE: Data corruption or wrong passkey."
+            finally:
+                del weights
             
             return extracted_payload, original_filename, None
 
@@ -1,28 +1,33 @@
 import hashlib
-import random
 import json
 import struct
 import os
 import zlib
 
+import numpy as np
+
+from synapse.engine.formats import HARDENED_BLOCK, hardened_layout
 from synapse_token import SynapseTokenSystem
 
 class SynapseForge:
     """
     Skeptical Neural Steganography Engine.
     Hardenining for float32 precision and binary stability.
+
+    Format 2 streams the mask: weights are generated, embedded and written
+    one block of BLOCK_WEIGHTS at a time, so memory stays flat however
+    large the payload. Each block carries its share of the bits at slots
+    from a permutation keyed by the passkey and the block counter
+    (synapse/engine/formats.py: hardened_layout).
     """
+    BLOCK_WEIGHTS = HARDENED_BLOCK
+    PRECISION = 1000000 # 1e6 instead of 1e7 for float32 stability
+
     def __init__(self, passkey: str):
         # Using SHA-256 to ensure the seed is robust
         self.seed_hash = hashlib.sha256(passkey.encode()).digest()
         self.random_seed = int.from_bytes(self.seed_hash[:4], 'little')
 
-    def _get_indices(self, total_elements, num_bits):
-        random.seed(self.random_seed)
-        indices = list(range(total_elements))
-        random.shuffle(indices)
-        return indices[:num_bits]
-
     def forge(self, payload_data, mask_name, original_filename=None):
         """
         Creates a hardened .safetensors mask.
@@ -35,48 +40,28 @@ class SynapseForge:
             
         # Add CRC32 to the end of the payload for skepticism/verification
         checksum = zlib.crc32(raw_data) & 0xffffffff
-        protected_payload = raw_data + struct.pack('<I', checksum)
+        protected_payload = np.frombuffer(raw_data + struct.pack('<I', checksum), dtype=np.uint8)
         
-        bits = []
-        for byte in protected_payload:
-            for i in range(8):
-                bits.append((byte >> i) & 1)
-        
-        num_bits = len(bits)
+        num_bits = len(protected_payload) * 8
         # We need enough weights to avoid collision. 10x headroom.
         num_weights = max(num_bits * 10, 10000)
         
-        # Use a deterministic base for weights so the mask looks 'normal'
-        random.seed(self.random_seed + 1)
-        weights = [random.uniform(-0.05, 0.05) for _ in range(num_weights)]
-        
-        indices = self._get_indices(num_weights, num_bits)
-        
-        # Injection with Precision Guard (using 1e6 instead of 1e7 for float32 stability)
-        PRECISION = 1000000 
-        for i, idx in enumerate(indices):
-            val = weights[idx]
-            scaled = int(val * PRECISION)
-            if (scaled & 1) != bits[i]:
-                # Adjust by 1 unit of precision
-                scaled += 1 if bits[i] == 1 else -1
-            weights[idx] = float(scaled) / PRECISION
-            
         filename = f"synapse_{mask_name.lower().replace(' ', '_')}.safetensors"
         
-        # Binary Safetensors construction
-        weight_data = struct.pack(f'{len(weights)}f', *weights)
+        # Binary Safetensors construction: header first, then the weights block by block
         header = json.dumps({
             "__metadata__": {
-                "type": "synapse_v1_hardened",
-                "payload_bytes": len(raw_data), # Original size
-                "total_bytes": len(protected_payload), # Size with CRC
+                "type": "synapse_v2_hardened",
+                "synapse.format": "hardened/2", # Decoder tag (synapse/engine/formats.py)
+                "payload_bytes": str(len(raw_data)), # Original size
+                "total_bytes": str(len(protected_payload)), # Size with CRC
+                "block_weights": str(self.BLOCK_WEIGHTS),
                 "original_filename": original_filename # Metadata for reconstruction
             },
             "stealth_weights": {
                 "dtype": "F32",
-                "shape": [len(weights)],
-                "data_offsets": [0, len(weight_data)]
+                "shape": [num_weights],
+                "data_offsets": [0, num_weights * 4]
             }
         }).encode('utf-8')
         
@@ -87,10 +72,28 @@ class SynapseForge:
         
         header_size_bin = struct.pack('<Q', len(header))
         
+        # Use a deterministic base for weights so the mask looks 'normal'
+        rng = np.random.default_rng(self.random_seed + 1)
+        layout = hardened_layout(self.seed_hash, num_weights, num_bits, self.BLOCK_WEIGHTS)
+        
         with open(filename, "wb") as f:
             f.write(header_size_bin)
             f.write(header)
-            f.write(weight_data)
+            for _, size, first_bit, positions in layout:
+                weights = rng.uniform(-0.05, 0.05, size)
+                
+                # This block's bits, LSB-first
+                lo, hi = first_bit // 8, -(-(first_bit + len(positions)) // 8)
+                bits = np.unpackbits(protected_payload[lo:hi], bitorder='little')
+                bits = bits[first_bit - lo * 8:first_bit - lo * 8 + len(positions)].astype(np.int64)
+                
+                # Injection with Precision Guard
+                scaled = np.trunc(weights[positions] * self.PRECISION).astype(np.int64)
+                # Adjust by 1 unit of precision
+                scaled += np.where((scaled & 1) != bits, np.where(bits == 1, 1, -1), 0)
+                weights[positions] = scaled / self.PRECISION
+                
+                f.write(weights.astype('<f4').tobytes())
             
         return filename
 
@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from synapse.engine.ecc import ECCS
+
+RS = ECCS["rs"]
+FRAME = RS.k * RS.depth          # data bytes in one full interleaving frame
+
+
+def _data(n, seed=0):
+    return np.random.default_rng(seed).bytes(n)
+
+
+def _corrupt(stored, start, count):
+    stored = bytearray(stored)
+    for i in range(start, start + count):
+        stored[i] ^= 0xA5
+    return bytes(stored)
+
+
+@pytest.mark.parametrize("n", [1, 100, RS.k - 1, RS.k, RS.k + 1, FRAME, FRAME + 50, 3 * FRAME + 777])
+def test_rs_round_trip(n):
+    data = _data(n)
+    stored = RS.encode(data)
+    assert len(stored) == RS.encoded_size(n)
+    assert RS.max_data(len(stored)) == n
+    assert RS.decode(stored, n) == data
+
+
+def test_rs_corrects_sixteen_errors_per_codeword():
+    # Interleaving spreads a burst of 16 * depth stored bytes over the
+    # frame's codewords: exactly 16 errors in each of them
+    data = _data(FRAME, seed=1)
+    stored = RS.encode(data)
+    assert RS.decode(_corrupt(stored, 1000, 16 * RS.depth), FRAME) == data
+
+
+def test_rs_corrects_shortened_last_codeword():
+    data = _data(FRAME + 50, seed=2)
+    stored = RS.encode(data)
+    # The last 50 + nsym stored bytes are the shortened codeword alone
+    assert RS.decode(_corrupt(stored, len(stored) - 30, 16), len(data)) == data
+
+
+def test_rs_raises_beyond_sixteen_errors():
+    data = _data(FRAME, seed=3)
+    stored = RS.encode(data)
+    with pytest.raises(ValueError, match="beyond error-correction"):
+        RS.decode(_corrupt(stored, 1000, 17 * RS.depth), FRAME)
+
+    data = _data(FRAME + 50, seed=4)
+    stored = RS.encode(data)
+    with pytest.raises(ValueError, match="beyond error-correction"):
+        RS.decode(_corrupt(stored, len(stored) - 30, 17), len(data))
+
+
+@pytest.mark.parametrize("name", ["rep3", "none"])
+def test_repetition_round_trip(name):
+    code = ECCS[name]
+    data = _data(1000, seed=5)
+    assert code.decode(code.encode(data), len(data)) == data
@@ -0,0 +1,194 @@
+"""
+Compatibility of the format registry with masks written by the original
+encoders. Each forge_* below transcribes one original encoder loop for
+loop, so the registry's vectorized decoders are checked against the
+algorithm that wrote old carriers, not against themselves.
+"""
+
+import hashlib
+import json
+import math
+import random
+import struct
+import zlib
+
+import numpy as np
+import pytest
+
+from synapse.engine.formats import decode_file, decode_weights, detect_format
+
+KEY = "compat-key"
+PAYLOAD = b"Synapse compatibility vector: \x00\x01\xfe\xff"
+
+
+def _bits(data: bytes) -> list:
+    return [(byte >> i) & 1 for byte in data for i in range(8)]
+
+
+def _protect(data: bytes) -> bytes:
+    return data + struct.pack("<I", zlib.crc32(data) & 0xFFFFFFFF)
+
+
+def _write_mask(path, metadata: dict, weights, separators=None):
+    weight_data = np.asarray(weights, dtype=np.float32).tobytes()
+    header = json.dumps({
+        "__metadata__": metadata,
+        "stealth_weights": {"dtype": "F32", "shape": [len(weight_data) // 4], "data_offsets": [0, len(weight_data)]},
+    }, separators=separators).encode("utf-8")
+    header += b" " * ((8 - len(header) % 8) % 8)
+    with open(path, "wb") as f:
+        f.write(struct.pack("<Q", len(header)) + header + weight_data)
+    return str(path)
+
+
+# ----------------------------------------------------------------------
+# Original encoders
+# ----------------------------------------------------------------------
+
+def forge_hardened_v1(path, passkey: str, raw: bytes) -> str:
+    """synapse_tui.SynapseForge.forge before format 2."""
+    seed = int.from_bytes(hashlib.sha256(passkey.encode()).digest()[:4], "little")
+    protected = _protect(raw)
+    bits = _bits(protected)
+    num_weights = max(len(bits) * 10, 10000)
+    random.seed(seed + 1)
+    weights = [random.uniform(-0.05, 0.05) for _ in range(num_weights)]
+    random.seed(seed)
+    indices = list(range(num_weights))
+    random.shuffle(indices)
+    for i, idx in enumerate(indices[:len(bits)]):
+        scaled = int(weights[idx] * 1000000)
+        if (scaled & 1) != bits[i]:
+            scaled += 1 if bits[i] == 1 else -1
+        weights[idx] = float(scaled) / 1000000
+    metadata = {"type": "synapse_v1_hardened", "payload_bytes": len(raw),
+                "total_bytes": len(protected), "original_filename": None}
+    return _write_mask(path, metadata, weights)
+
+
+def forge_hardened_web(path, passkey: str, raw: bytes, density: float = 1.0) -> str:
+    """web-portal synapse.worker.ts forge(): 32-bit LCG map, weights in float32."""
+    seed0 = int.from_bytes(hashlib.sha256(passkey.encode()).digest()[:4], "little")
+    protected = _protect(raw)
+    bits = _bits(protected)
+    num_weights = math.floor(max(len(bits) * max(10 / density, 2), 10000))
+
+    chosen = bytearray((num_weights + 7) // 8)
+    seed, count = seed0, 0
+    while count < len(bits):
+        seed = (seed * 1664525 + 1013904223) % 4294967296
+        candidate = seed % num_weights
+        if not chosen[candidate // 8] & (1 << (candidate % 8)):
+            chosen[candidate // 8] |= 1 << (candidate % 8)
+            count += 1
+
+    weights = np.empty(num_weights, dtype=np.float32)
+    seed, cursor = seed0 + 1, 0
+    for i in range(num_weights):
+        seed = (seed * 1664525 + 1013904223) % 4294967296
+        weights[i] = (seed / 4294967296) * 0.1 - 0.05
+    for i in range(num_weights):
+        if chosen[i // 8] & (1 << (i % 8)) and cursor < len(bits):
+            scaled = math.floor(float(weights[i]) * 1000000 + 0.5)     # Math.round
+            if (scaled & 1) != bits[cursor]:
+                scaled += 1 if bits[cursor] == 1 else -1
+            weights[i] = scaled / 1000000
+            cursor += 1
+    metadata = {"type": "synapse_v1_hardened", "payload_bytes": str(len(raw)),
+                "total_bytes": str(len(protected)), "filename": "knowledge.txt", "density": density}
+    return _write_mask(path, metadata, weights, separators=(",", ":"))
+
+
+def forge_spectral(passkey: str, raw: bytes) -> tuple[np.ndarray, dict]:
+    """src/synapse/core/engine_v4.py SynapseV4Engine.forge_spectral (block 8, DC coefficient)."""
+    def fwht(a):
+        n = len(a)
+        if n == 1:
+            return a
+        left, right = fwht(a[0:n // 2]), fwht(a[n // 2:n])
+        res = np.zeros(n)
+        res[0:n // 2] = left + right
+        res[n // 2:n] = left - right
+        return res
+
+    protected = _protect(raw)
+    bits = _bits(protected)
+    weights = np.random.default_rng(7).uniform(-0.05, 0.05, len(bits) * 8)
+    for b in range(len(bits)):
+        coeffs = fwht(weights[b * 8:(b + 1) * 8])
+        target = int(coeffs[0] * 1000)
+        if (target & 1) != bits[b]:
+            target += 1 if bits[b] == 1 else -1
+        coeffs[0] = target / 1000
+        weights[b * 8:(b + 1) * 8] = fwht(coeffs) / 8
+    return weights.astype(np.float32), {"payload_bytes": str(len(raw)), "total_bytes": str(len(protected))}
+
+
+def forge_lsb_1e7(passkey: str, raw: bytes, num_weights: int = 20_000) -> np.ndarray:
+    """src/synapse/core/injector.py SynapseInjector.hide: one rng.integers draw per slot."""
+    rng = np.random.default_rng(int(hashlib.sha256(passkey.encode()).hexdigest(), 16) % (2 ** 32))
+    weights = np.random.default_rng(8).normal(0, 0.02, num_weights).astype(np.float32)
+    bits = _bits(raw)
+    taken = bytearray((num_weights + 7) // 8)
+    indices = []
+    while len(indices) < len(bits):
+        idx = rng.integers(0, num_weights)
+        if not taken[idx >> 3] & (1 << (idx & 7)):
+            taken[idx >> 3] |= 1 << (idx & 7)
+            indices.append(int(idx))
+    for i, idx in enumerate(indices):
+        scaled = int(weights[idx] * 1e7)
+        if (scaled & 1) != bits[i]:
+            scaled += 1 if bits[i] == 1 else -1
+        weights[idx] = float(scaled) / 1e7
+    return weights
+
+
+# ----------------------------------------------------------------------
+# Registry decoders
+# ----------------------------------------------------------------------
+
+def test_hardened_v1_mask(tmp_path):
+    path = forge_hardened_v1(tmp_path / "v1.safetensors", KEY, PAYLOAD)
+    assert detect_format(path) == "hardened/1"
+    assert decode_file(path, KEY) == PAYLOAD
+    with pytest.raises(ValueError, match="Integrity"):
+        decode_file(path, "wrong-key")
+
+
+@pytest.mark.parametrize("density", [1.0, 0.5, 2.0])
+def test_hardened_web_mask(tmp_path, density):
+    path = forge_hardened_web(tmp_path / "web.safetensors", KEY, PAYLOAD, density)
+    assert detect_format(path) == "hardened-web/1"
+    assert decode_file(path, KEY) == PAYLOAD
+    with pytest.raises(ValueError, match="Integrity"):
+        decode_file(path, "wrong-key")
+
+
+def test_spectral_mask():
+    weights, metadata = forge_spectral(KEY, PAYLOAD)
+    assert decode_weights("spectral/4", weights, metadata, KEY) == PAYLOAD
+
+
+def test_lsb_1e7_mask():
+    weights = forge_lsb_1e7(KEY, PAYLOAD)
+    assert decode_weights("lsb-1e7/1", weights, {"payload_bytes": str(len(PAYLOAD))}, KEY) == PAYLOAD
+
+
+def test_reference_slot_sequences():
+    # Pinned from the original encoders so the forgers above cannot drift with the decoders
+    seed = int.from_bytes(hashlib.sha256(KEY.encode()).digest()[:4], "little")
+    assert seed == 2553759050
+
+    order = list(range(10_000))
+    random.Random(seed).shuffle(order)
+    assert order[:8] == [8629, 2229, 2834, 6760, 6718, 5124, 9929, 4663]
+
+    lcg, state = [], seed
+    while len(lcg) < 8:
+        state = (state * 1664525 + 1013904223) % 4294967296
+        lcg.append(state % 10_000)
+    assert lcg == [4833, 2956, 2235, 9054, 4645, 5248, 767, 5026]
+
+    rng = np.random.default_rng(int(hashlib.sha256(KEY.encode()).hexdigest(), 16) % (2 ** 32))
+    assert [int(rng.integers(0, 20_000)) for _ in range(8)] == [2216, 7832, 9537, 19110, 15608, 15465, 4985, 17026]
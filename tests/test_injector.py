@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from synapse.engine.carrier import bf16_to_f32, f32_to_bf16
+from synapse.engine.injector import EMBED_MANTISSA, EMBED_SCALE, SynapseInjector
+
+
+def test_hide_round_trip_float32():
+    weights = np.random.default_rng(0).normal(0, 0.02, 200_000).astype(np.float32)
+    injector = SynapseInjector("array-key")
+    hidden = injector.hide(weights, b"hidden in float32")
+    assert hidden.dtype == np.float32
+    assert injector.extract_auto(hidden) == b"hidden in float32"
+    assert injector._read_header(hidden)[0]["embedding"] == EMBED_SCALE
+
+
+def test_fp16_carrier_gets_mantissa_embedding():
+    weights = np.random.default_rng(1).normal(0, 0.02, 200_000).astype(np.float16)
+    injector = SynapseInjector("fp16-key")
+    hidden = injector.hide(weights, b"hidden in float16")
+    assert injector.extract_auto(hidden) == b"hidden in float16"
+    assert injector._read_header(hidden)[0]["embedding"] == EMBED_MANTISSA
+    # Every weight keeps its value to within its last mantissa bit
+    assert (np.abs(hidden.view(np.int16).astype(int) - weights.view(np.int16).astype(int)) <= 1).all()
+
+
+def test_fp16_carrier_refuses_scale_only_versions():
+    weights = np.zeros(200_000, dtype=np.float16)
+    with pytest.raises(ValueError, match="v6 or later"):
+        SynapseInjector("old-format", version=5).hide(weights, b"payload")
+
+
+def test_bf16_pt_carrier_moves_weights_at_most_one_ulp(tmp_path):
+    torch = pytest.importorskip("torch")
+    path = str(tmp_path / "carrier.pt")
+    original = f32_to_bf16(np.random.default_rng(2).normal(0, 0.02, 300_000).astype(np.float32))
+    torch.save({"w": torch.from_numpy(original.view(np.int16)).view(torch.bfloat16)}, path)
+
+    SynapseInjector("bf16-key").inject_file(path, b"hidden in bfloat16", path)
+
+    stored = torch.load(path)["w"]
+    assert stored.dtype == torch.bfloat16
+    raw = stored.view(torch.int16).numpy().view(np.uint16)
+    assert (np.abs(raw.astype(int) - original.astype(int)) <= 1).all()
+    assert np.allclose(bf16_to_f32(raw), bf16_to_f32(original), rtol=2 ** -7, atol=0)
+    assert SynapseInjector("bf16-key").extract_file(path) == b"hidden in bfloat16"
+
+
+def test_failed_in_place_patch_leaves_carrier_untouched(tmp_path):
+    path = str(tmp_path / "carrier.bin")
+    np.random.default_rng(3).normal(0, 0.02, 200_000).astype(np.float32).tofile(path)
+    before = open(path, "rb").read()
+    injector = SynapseInjector("in-place-key")
+
+    def embed(weights):
+        injector._embed(weights, injector._pack(b"half written"), in_place=True)
+        raise ValueError("write failed")
+
+    with pytest.raises(ValueError, match="write failed"):
+        injector._patch_file(path, path, True, embed)
+    assert open(path, "rb").read() == before
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from synapse.engine.permutation import KeyedPermutation, SlotRegion
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 5, 17, 1000, 4097, 65_537, 300_001])
+def test_keyed_permutation_is_a_bijection(n):
+    perm = KeyedPermutation(b"permutation-key", n)
+    positions = np.arange(n)
+    indices = perm.map(positions)
+    assert indices.min() >= 0 and indices.max() < n
+    assert len(np.unique(indices)) == n
+    assert (perm.inverse(indices) == positions).all()
+    assert (perm.slots(0, n) == indices).all()
+
+
+def test_keyed_permutation_depends_on_key():
+    a = KeyedPermutation(b"key a", 10_000).slots(0, 100)
+    b = KeyedPermutation(b"key b", 10_000).slots(0, 100)
+    assert not (a == b).all()
+
+
+def test_keyed_permutation_rejects_out_of_range_slots():
+    perm = KeyedPermutation(b"k", 100)
+    with pytest.raises(IndexError):
+        perm.slots(90, 11)
+    with pytest.raises(ValueError):
+        KeyedPermutation(b"k", 0)
+
+
+@pytest.mark.parametrize("key", [None, b"region-key"])
+def test_slot_region_inverse(key):
+    outer = KeyedPermutation(b"outer", 50_000)
+    region = SlotRegion(outer, 12_345, 7_777, key)
+    indices = region.map(np.arange(len(region)))
+    assert (region.slots(0, len(region)) == indices).all()
+    assert (region.inverse(indices) == np.arange(len(region))).all()
+
+    # Every other carrier index lies outside the region
+    outside = np.setdiff1d(np.arange(len(outer)), indices)
+    assert len(outside) == len(outer) - len(region)
+    assert (region.inverse(outside) == -1).all()
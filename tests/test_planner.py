@@ -0,0 +1,27 @@
+import os
+import pickle
+
+from synapse.engine.planner import _torch_header
+
+LEGACY_MAGIC = 0x1950A86A20F9469CFC6C
+
+
+class _Payload:
+    def __init__(self, path):
+        self.path = path
+
+    def __reduce__(self):
+        return os.mkdir, (self.path,)
+
+
+def test_legacy_torch_header_never_runs_pickled_code(tmp_path):
+    marker = str(tmp_path / "pwned")
+    carrier = tmp_path / "legacy.pt"
+    with open(carrier, "wb") as f:
+        for obj in (LEGACY_MAGIC, _Payload(marker), {"protocol_version": 1001}, {"w": _Payload(marker)}):
+            pickle.dump(obj, f, protocol=2)
+
+    obj = _torch_header(str(carrier))
+
+    assert not os.path.exists(marker)
+    assert set(obj) == {"w"}
@@ -0,0 +1,26 @@
+from synapse.engine.retrieval import RetrievalStore
+
+
+CSV_TEXT = "h,a\nx,1\ny,2\nz,3\np,4\nq,5"
+PROSE_TEXT = "First sentence here. Second one follows!\nThird, on a new line? Fourth.\n\nFifth and last."
+
+
+def _index(text=None, pieces=None):
+    store = RetrievalStore()
+    if pieces is None:
+        store.load(text)
+    else:
+        store.load_stream(pieces)
+    return store.header, store.is_csv, store.chunks
+
+
+def test_load_stream_matches_load_at_every_split():
+    for text in (CSV_TEXT, CSV_TEXT + "\n", CSV_TEXT.replace("\n", "\r\n"), PROSE_TEXT):
+        expected = _index(text)
+        for cut in range(len(text) + 1):
+            assert _index(pieces=[text[:cut], text[cut:]]) == expected, (text, cut)
+
+
+def test_load_stream_piece_ending_in_newline():
+    pieces = ["h,a\nx,1\ny,2\nz,3\n", "p,4\n"]
+    assert _index(pieces=pieces) == _index("".join(pieces))
@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from synapse.engine.injector import SynapseInjector
+
+
+def _carrier(path, num_weights=400_000):
+    np.random.default_rng(0).normal(0, 0.02, num_weights).astype(np.float32).tofile(path)
+    return str(path)
+
+
+def test_segments_round_trip(tmp_path):
+    carrier = _carrier(tmp_path / "carrier.bin")
+    injector = SynapseInjector("segments-key")
+    injector.inject_segments(carrier, {"a": b"first doc", "b": b"second doc"}, carrier)
+    injector.update_segments(carrier, {"a": b"first doc, edited", "c": b"third doc"}, carrier)
+    assert injector.extract_segments(carrier) == {
+        "a": b"first doc, edited", "b": b"second doc", "c": b"third doc",
+    }
+
+
+def test_segments_refuse_shared_carrier(tmp_path):
+    carrier = _carrier(tmp_path / "carrier.bin")
+    SynapseInjector.inject_many(carrier, [("a", b"alice payload"), ("b", b"bob payload")], carrier)
+    before = open(carrier, "rb").read()
+
+    with pytest.raises(ValueError, match="shared"):
+        SynapseInjector("c").inject_segments(carrier, {"doc": b"carol's segment"}, carrier)
+
+    assert open(carrier, "rb").read() == before
+    assert SynapseInjector("a").extract_file(carrier) == b"alice payload"
+    assert SynapseInjector("b").extract_file(carrier) == b"bob payload"
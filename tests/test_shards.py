@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from synapse.engine.injector import SynapseInjector
+from synapse.engine.shards import extract_sharded, inject_sharded
+
+
+def _carriers(tmp_path, count, num_weights=400_000):
+    paths = []
+    for i in range(count):
+        path = str(tmp_path / f"carrier{i}.bin")
+        np.random.default_rng(i).normal(0, 0.02, num_weights).astype(np.float32).tofile(path)
+        paths.append(path)
+    return paths
+
+
+def test_sharded_round_trip_in_any_order(tmp_path):
+    paths = _carriers(tmp_path, 3)
+    payload = b"".join(b"line %d of a sharded payload\n" % i for i in range(20_000))
+    inject_sharded("shard-key", paths, payload)
+    assert extract_sharded("shard-key", paths[::-1], workers=1) == payload
+
+
+def test_sharded_refuses_shared_carrier(tmp_path):
+    paths = _carriers(tmp_path, 2)
+    SynapseInjector.inject_many(paths[1], [("a", b"alice payload")], paths[1])
+    before = [open(p, "rb").read() for p in paths]
+
+    with pytest.raises(ValueError, match="shared carrier"):
+        inject_sharded("shard-key", paths, b"x" * 5000)
+
+    assert [open(p, "rb").read() for p in paths] == before
+    assert SynapseInjector("a").extract_file(paths[1]) == b"alice payload"
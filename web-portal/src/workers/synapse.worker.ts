@@ -157,6 +157,7 @@ async function forge(payload: string | Uint8Array, maskName: string, originalFil
   const header = JSON.stringify({
     "__metadata__": {
       "type": "synapse_v1_hardened",
+      "synapse.format": "hardened-web/1", // decoder tag (synapse/engine/formats.py)
       "payload_bytes": rawData.length.toString(),
       "total_bytes": protectedPayload.length.toString(),
       "filename": originalFilename || (typeof payload === 'string' ? "knowledge.txt" : "payload.bin"),